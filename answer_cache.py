@@ -0,0 +1,53 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from query_log import normalize_query
+
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '600'))
+
+
+def answer_key(query, symptoms=None):
+    """Normalized query plus a digest of the symptom context, so personalised answers aren't shared"""
+    digest = hashlib.sha1((symptoms or '').encode('utf-8')).hexdigest()[:12] if symptoms else ''
+    return f"{normalize_query(query)}|{digest}"
+
+
+class AnswerCache:
+    """Thread-safe LRU of chatbot answers with a time-to-live"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = ANSWER_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = ANSWER_CACHE_TTL_SECONDS if ttl is None else ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query, symptoms=None):
+        """Cached answer, or None when missing or expired"""
+        key = answer_key(query, symptoms)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, answer = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return answer
+
+    def put(self, query, symptoms, answer):
+        if not answer or not answer.strip() or self.max_entries <= 0:
+            return
+        key = answer_key(query, symptoms)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
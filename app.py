@@ -2,6 +2,7 @@ import os
 import csv
 import requests
 import ipaddress
+import time
 import warnings
 import logging
 
@@ -21,10 +22,26 @@ except Exception:
     except Exception:
         pass
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, g
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import deferred, load_only, undefer_group
 from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeout
+from query_log import QUERY_LOG_PATH, normalize_query
+import metrics
+import profiling
+import session_store
+import passwords
+import rate_limit
+import triage
+import llm_worker
+import faq_fastpath
+import router
+import answer_cache
+import singleflight
+import materialize_answers
+import symptom_index
+from metrics import stage
 
 try:
     from evaluate_different_modules import process_query5,process_query2,process_query4,process_query,process_query3
@@ -95,54 +112,146 @@ else:
         app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{sqlite_path}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
+# Cookie sessions by default; SESSION_BACKEND=memory|sqlite keeps session data server-side
+session_store.init_session_backend(app)
 # Configure allowed IP addresses/CIDR ranges and optional bypass
 ALLOWED_IPS = os.getenv('ALLOWED_IPS', '127.0.0.1/32').split(',')
 DISABLE_IP_FILTER = os.getenv('DISABLE_IP_FILTER', 'false').lower() in {'1','true','yes'}
 
-def is_ip_allowed(ip_address):
+def is_ip_allowed(ip_address, allowed_ranges=None):
     """Check if the IP address is in the allowed list"""
     try:
         client_ip = ipaddress.ip_address(ip_address)
-        for allowed_range in ALLOWED_IPS:
+        for allowed_range in (ALLOWED_IPS if allowed_ranges is None else allowed_ranges):
             if client_ip in ipaddress.ip_network(allowed_range, strict=False):
                 return True
         return False
     except ValueError:
         return False
 
-@app.before_request
-def limit_remote_addr():
-    """Middleware to check IP address before processing requests"""
-    if DISABLE_IP_FILTER:
-        return
+def get_client_ip():
     # Get client IP (handle proxy headers if behind load balancer)
     client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
     if client_ip:
         # If behind proxy, get the first IP
         client_ip = client_ip.split(',')[0].strip()
-    
-    # Skip IP check for health/static endpoints (optional)
-    if request.endpoint in ['health', 'status', 'static']:
+    return client_ip
+
+
+@app.before_request
+def start_request_timer():
+    metrics.start_request()
+
+
+@app.before_request
+def limit_remote_addr():
+    """Middleware to check IP address before processing requests"""
+    if DISABLE_IP_FILTER:
         return
-    
-    if not is_ip_allowed(client_ip):
+    with stage('ip_filter'):
+        client_ip = get_client_ip()
+
+        # Skip IP check for health/static endpoints (optional)
+        if request.endpoint in ['health', 'status', 'static']:
+            return
+
+        allowed = is_ip_allowed(client_ip)
+    if not allowed:
         abort(403)  # Forbidden
 
 
+# Token buckets per client IP and per user on the expensive POST routes (RATE_LIMITS)
+RATE_LIMITER = rate_limit.create_limiter(app.instance_path)
+
+
+def _login_failure_key():
+    email = request.form.get('email', '').strip().lower()
+    return f"{email}|{get_client_ip()}" if email else None
+
+
+@app.before_request
+def apply_rate_limit():
+    if request.method != 'POST' or request.endpoint not in RATE_LIMITER.limits:
+        return
+    with stage('rate_limit'):
+        keys = [f"ip:{get_client_ip()}", f"user:{session['user_id']}" if 'user_id' in session else None]
+        retry_after = RATE_LIMITER.check(request.endpoint, keys)
+        if retry_after is None and request.endpoint == 'login':
+            # Too many failed guesses at this account from this client; other clients,
+            # including the account owner, can still log in
+            retry_after = RATE_LIMITER.check('login_failed', [_login_failure_key()], consume=False)
+    if retry_after is not None:
+        g.retry_after = retry_after
+        abort(429)
+
+
+@app.before_request
+def start_profiler():
+    """Profile this request only when an admin asks for it (see profiling.py)"""
+    if profiling.wants_profile(request.headers, get_client_ip(), is_ip_allowed):
+        g.profile_session = profiling.start_profile()
+
+
+@app.after_request
+def stop_profiler(response):
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        directory = profiling.PROFILE_DIR or os.path.join(app.instance_path, 'profiles')
+        name = profiling.finish_profile(profile_session, directory, request.endpoint or 'unknown')
+        if name:
+            response.headers['X-Profile-File'] = name
+    return response
+
+
+@app.teardown_request
+def release_profiler(exc):
+    # after_request hooks are skipped when an earlier one raises; stop the
+    # profiler here too, or the cProfile lock stays held for good
+    profile_session = g.pop('profile_session', None)
+    if profile_session is not None:
+        profile_session.stop()
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Simple health check endpoint"""
     return jsonify(status="ok"), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms in Prometheus text format (IP allowlist applies)"""
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 # -------------------- Helpers & Decorators --------------------
 from functools import wraps
 
-def get_current_user():
+def get_current_user(full=False):
+    """Return the logged-in user.
+
+    By default this is a slim (id, name, email) projection cached in the
+    session for USER_CONTEXT_TTL seconds; pass full=True for the complete
+    row including the profile columns.
+    """
     uid = session.get('user_id')
     if not uid:
         return None
-    return User.query.get(uid)
+    if full:
+        user = db.session.get(User, uid, options=[undefer_group('profile')])
+        if user:
+            session_store.cache_user_context(session, user)
+        return user
+    ctx = session_store.cached_user_context(session, uid)
+    if ctx is None:
+        user = (db.session.query(User.id, User.name, User.email)
+                .filter(User.id == uid)
+                .first())
+        if not user:
+            return None
+        session_store.cache_user_context(session, user)
+        ctx = session_store.UserContext(user.id, user.name, user.email)
+    return ctx
 
 def login_required_page(view_func):
     @wraps(view_func)
@@ -161,6 +270,24 @@ def login_required_json(view_func):
         return view_func(*args, **kwargs)
     return wrapper
 
+def staff_required_json(view_func):
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({"success": False, "message": "Please log in"}), 401
+        user = get_current_user()
+        if user is None or (user.email or '').lower() not in STAFF_EMAILS:
+            return jsonify({"success": False, "message": "Staff only"}), 403
+        return view_func(*args, **kwargs)
+    return wrapper
+
+def _is_id(value):
+    # bool is an int subclass; True must not address consultation 1
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _clamp(value, low, high):
+    return max(low, min(value, high))
+
 def safe_commit(success_message: str | None = None, error_message: str | None = None) -> bool:
     try:
         db.session.commit()
@@ -174,8 +301,10 @@ def safe_commit(success_message: str | None = None, error_message: str | None =
             flash(error_message, 'error')
         return False
 
-def safe_commit_json() -> tuple[bool, str | None]:
+def safe_commit_json(write=None) -> tuple[bool, str | None]:
     try:
+        if write is not None:
+            write()
         db.session.commit()
         return True, None
     except Exception as e:
@@ -192,6 +321,11 @@ def add_security_headers(response):
     return response
 
 
+@app.after_request
+def add_server_timing(response):
+    return metrics.finish_request(response)
+
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -202,31 +336,110 @@ class User(db.Model):
     age = db.Column(db.Integer, nullable=True)
     gender = db.Column(db.String(10), nullable=True)
     blood_group = db.Column(db.String(5), nullable=True)
-    medical_history = db.Column(db.Text, nullable=True)
-    allergies = db.Column(db.Text, nullable=True)
+    # Large free-text columns are only fetched by pages that render them
+    medical_history = deferred(db.Column(db.Text, nullable=True), group='profile')
+    allergies = deferred(db.Column(db.Text, nullable=True), group='profile')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Consultation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    symptoms = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, reviewed, completed
-    doctor_notes = db.Column(db.Text, nullable=True)  # Doctor's response/advice
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    symptoms = deferred(db.Column(db.Text, nullable=False), group='details')
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, reviewed, completed
+    doctor_notes = deferred(db.Column(db.Text, nullable=True), group='details')  # Doctor's response/advice
     priority = db.Column(db.String(10), default='normal')  # low, normal, high, urgent
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user = db.relationship('User', backref=db.backref('consultations', lazy=True))
 
 
+CONSULTATION_STATUSES = ('pending', 'reviewed', 'completed')
+CONSULTATION_PRIORITIES = triage.PRIORITIES
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '500'))
+# Accounts allowed to list every patient's consultations and bulk-edit them (doctors/admins)
+STAFF_EMAILS = {e.strip().lower() for e in os.getenv('STAFF_EMAILS', '').split(',') if e.strip()}
+
+# List-view projections: only the columns each listing renders
+CONSULTATION_LIST_COLUMNS = (Consultation.id, Consultation.user_id, Consultation.status,
+                             Consultation.priority, Consultation.created_at, Consultation.updated_at)
+DASHBOARD_CONSULTATION_COLUMNS = (Consultation.id, Consultation.status, Consultation.created_at,
+                                  Consultation.symptoms, Consultation.doctor_notes)
+
+
+FASTPATH_TOTAL = metrics.Counter('docify_faq_fastpath_total',
+                                 'Chatbot queries answered directly from faq.txt (hit) or passed on (miss)', ['result'])
+
+# Answers precomputed offline for the most frequent logged questions (materialize_answers.py)
+MATERIALIZED_ANSWERS = materialize_answers.load_answers()
+MATERIALIZED_TOTAL = metrics.Counter('docify_materialized_answers_total',
+                                     'Chatbot queries served from precomputed answers (hit) or not (miss)', ['result'])
+
+# Gemini calls run on a shared asyncio worker so slow round trips don't pile up in web threads
+LLM_WORKER = llm_worker.LLMWorker()
+
+# Per-request budget for remote LLM engines; past it /chatbot answers locally instead of waiting
+CHATBOT_DEADLINE_SECONDS = float(os.getenv('CHATBOT_DEADLINE_SECONDS', '8'))
+# Remote answers that arrive after their request gave up, served to the next identical query
+LATE_ANSWERS = answer_cache.AnswerCache()
+# Identical queries arriving together share one routed answer instead of one provider call each
+INFLIGHT = singleflight.SingleFlight()
+DEADLINE_TOTAL = metrics.Counter('docify_chatbot_deadline_total',
+                                 'Remote LLM calls by outcome: in_time, missed, skipped (budget spent), '
+                                 'late_stored and late_served', ['outcome'])
+
+
+
+
+def _retriever_ready():
+    if not ADVANCED_MODULES_AVAILABLE:
+        return False
+    import evaluate_different_modules
+    return getattr(evaluate_different_modules, 'retriever', None) is not None
+
+
+# Engines look their function up at call time so tests and load_test.py can patch the module globals
+ROUTER = router.QueryRouter([
+    router.Engine('faq_fallback', lambda q, s: get_simple_faq_response(q), cost=0, latency_ms=1,
+                  available=lambda: FAQ_AVAILABLE, stage_name='faq_fallback'),
+    router.Engine('retrieval', lambda q, s: process_query(q, s), cost=0.1, latency_ms=50,
+                  available=_retriever_ready, stage_name='retrieval'),
+    router.Engine('ollama', lambda q, s: process_query2(q, s), cost=1, latency_ms=3000,
+                  available=lambda: ADVANCED_MODULES_AVAILABLE, offload=True, stage_name='llm_wait'),
+    router.Engine('lora_t5', lambda q, s: process_query4(q, s), cost=1, latency_ms=1500,
+                  available=lambda: ADVANCED_MODULES_AVAILABLE, offload=True, stage_name='llm_wait'),
+    router.Engine('falcon', lambda q, s: process_query3(q, s), cost=5, latency_ms=20000,
+                  available=lambda: ADVANCED_MODULES_AVAILABLE, offload=True, stage_name='llm_wait'),
+    router.Engine('gemini', lambda q, s: process_query5(q, s), cost=3, latency_ms=1200,
+                  available=lambda: ADVANCED_MODULES_AVAILABLE, offload=True, stage_name='llm_wait'),
+])
+
+
+# Pending consultations ordered by priority then age; kept in step by the routes below
+TRIAGE = triage.TriageQueue()
+
+
+def rebuild_triage_queue():
+    TRIAGE.rebuild(db.session.query(Consultation.id, Consultation.priority, Consultation.created_at)
+                   .filter(Consultation.status == 'pending'))
+
+
+def sync_triage(consultation_id, priority, created_at, status):
+    TRIAGE.upsert(consultation_id, priority, created_at, status)
+
+
 # Initialize Database
 with app.app_context():
     db.create_all()
+    # create_all() skips tables that already exist; add indexes introduced later
+    for index in Consultation.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    rebuild_triage_queue()
 
 
 # Export User Details to CSV
 def export_users_to_csv():
-    users = User.query.all()
+    users = User.query.options(load_only(User.id, User.name, User.phone, User.email)).all()
     with open('users.csv', 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['id', 'name', 'phone', 'email']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -254,13 +467,19 @@ def register():
         phone = request.form['phone']
         email = request.form['email']
         password = request.form['password']
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
 
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
             flash('Email already registered.', 'error')
             return redirect(url_for('register'))
 
+        try:
+            with stage('password_hash'):
+                hashed_password = passwords.hash_password(password)
+        except passwords.PasswordHasherBusy:
+            g.retry_after = passwords.PASSWORD_HASH_RETRY_AFTER
+            abort(503)
+
         new_user = User(name=name, phone=phone, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -277,11 +496,30 @@ def login():
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        try:
+            with stage('password_verify'):
+                valid = bool(user) and passwords.verify_password(user.password, password)
+        except passwords.PasswordHasherBusy:
+            g.retry_after = passwords.PASSWORD_HASH_RETRY_AFTER
+            abort(503)
+
+        if valid:
+            if passwords.needs_rehash(user.password):
+                # Hash parameters changed since this password was stored; upgrade it now
+                # while we have the plaintext
+                try:
+                    user.password = passwords.hash_password(password)
+                    safe_commit()
+                except passwords.PasswordHasherBusy:
+                    pass
+            if hasattr(session, 'regenerate'):
+                session.regenerate()
             session['user_id'] = user.id
+            session_store.cache_user_context(session, user)
             flash('Login successful!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            RATE_LIMITER.check('login_failed', [_login_failure_key()])
             flash('Invalid email or password.', 'error')
             return redirect(url_for('login'))
     return render_template('login.html')
@@ -290,6 +528,7 @@ def login():
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
+    session_store.clear_user_context(session)
     flash('Logged out successfully.', 'success')
     return redirect(url_for('home'))
 
@@ -302,18 +541,27 @@ def dashboard():
     # Check if user exists
     if not user:
         session.pop('user_id', None)
+        session_store.clear_user_context(session)
         flash('User not found. Please log in again.', 'error')
         return redirect(url_for('login'))
     
     if request.method == 'POST':
         symptoms = request.form['symptoms']
-        consultation = Consultation(user_id=user.id, symptoms=symptoms)
+        consultation = Consultation(user_id=user.id, symptoms=symptoms, priority=triage.auto_priority(symptoms))
         db.session.add(consultation)
         if safe_commit('Consultation form submitted successfully!'):
+            sync_triage(consultation.id, consultation.priority, consultation.created_at, consultation.status)
+            with stage('symptom_match'):
+                likely = symptom_index.suggest(symptoms, limit=1)
+            if likely:
+                flash(f"Your symptoms resemble {likely[0]['condition']}; "
+                      f"{symptom_index.specialist_phrase(likely[0]['specialists'])} can help. "
+                      "A doctor will review your form.", 'info')
             return redirect(url_for('dashboard'))
         return redirect(url_for('dashboard'))
 
     consultations = (Consultation.query
+                     .options(load_only(*DASHBOARD_CONSULTATION_COLUMNS))
                      .filter_by(user_id=user.id)
                      .order_by(Consultation.created_at.desc())
                      .all())
@@ -323,15 +571,17 @@ def dashboard():
 @app.route('/update_consultation/<int:id>', methods=['GET', 'POST'])
 @login_required_page
 def update_consultation(id):
-    consultation = Consultation.query.get_or_404(id)
+    consultation = Consultation.query.options(undefer_group('details')).get_or_404(id)
     if consultation.user_id != session['user_id']:
         flash('Unauthorized access.', 'error')
         return redirect(url_for('dashboard'))
 
     if request.method == 'POST':
         consultation.symptoms = request.form['symptoms']
+        consultation.priority = triage.auto_priority(consultation.symptoms, consultation.priority)
         consultation.updated_at = datetime.utcnow()
         if safe_commit('Consultation updated successfully!'):
+            sync_triage(consultation.id, consultation.priority, consultation.created_at, consultation.status)
             return redirect(url_for('dashboard'))
         return redirect(url_for('dashboard'))
 
@@ -354,6 +604,7 @@ def delete_consultation(id):
     db.session.delete(consultation)
     ok, err = safe_commit_json()
     if ok:
+        TRIAGE.discard(id)
         return jsonify({"success": True, "message": "Consultation deleted successfully"})
     return jsonify({"success": False, "message": f"Delete failed: {err}"}), 500
 
@@ -362,7 +613,8 @@ def delete_consultation(id):
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required_page
 def profile():
-    user = get_current_user()
+    # The only page that renders medical history/allergies loads the full row
+    user = get_current_user(full=True)
     if not user:
         session.clear()
         flash('User not found. Please log in again.', 'error')
@@ -378,6 +630,7 @@ def profile():
         user.allergies = request.form.get('allergies')
         
         if safe_commit('Profile updated successfully!'):
+            session_store.cache_user_context(session, user)
             return redirect(url_for('profile'))
         return redirect(url_for('profile'))
     
@@ -400,16 +653,150 @@ def update_status(id):
         consultation.doctor_notes = doctor_notes
     
     consultation.updated_at = datetime.utcnow()
+    queue_entry = (consultation.id, consultation.priority, consultation.created_at, consultation.status)
     ok, err = safe_commit_json()
     if ok:
+        sync_triage(*queue_entry)
         return jsonify({"success": True, "message": "Status updated successfully"})
     return jsonify({"success": False, "message": f"Update failed: {err}"}), 500
 
 
+def _consultation_summary(c):
+    return {
+        "id": c.id,
+        "user_id": c.user_id,
+        "status": c.status,
+        "priority": c.priority,
+        "created_at": c.created_at.isoformat() if c.created_at else None,
+        "updated_at": c.updated_at.isoformat() if c.updated_at else None,
+    }
+
+
+# Work queue for doctors: filter by status/priority, most urgent first, oldest first within a priority
+@app.route('/consultations/queue', methods=['GET'])
+@staff_required_json
+def consultation_queue():
+    statuses = [v for v in request.args.get('status', 'pending').split(',') if v]
+    priorities = [v for v in request.args.get('priority', '').split(',') if v]
+    # SQLite treats a negative LIMIT as no limit
+    limit = _clamp(request.args.get('limit', 100, type=int), 1, BULK_MAX_ITEMS)
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    priority_rank = db.case(triage.PRIORITY_RANK, value=Consultation.priority, else_=len(CONSULTATION_PRIORITIES))
+    query = Consultation.query.options(load_only(*CONSULTATION_LIST_COLUMNS)).filter(
+        Consultation.status.in_(statuses))
+    if priorities:
+        query = query.filter(Consultation.priority.in_(priorities))
+    rows = query.order_by(priority_rank, Consultation.created_at, Consultation.id).offset(offset).limit(limit).all()
+    return jsonify({"success": True, "count": len(rows), "consultations": [_consultation_summary(c) for c in rows]})
+
+
+# Next consultations to review, served from the in-process triage heap
+@app.route('/consultations/next', methods=['GET'])
+@staff_required_json
+def next_consultations():
+    n = _clamp(request.args.get('n', 10, type=int), 1, BULK_MAX_ITEMS)
+    if TRIAGE.is_stale():
+        with stage('triage_rebuild'):
+            rebuild_triage_queue()
+    items = [{"id": cid, "priority": priority, "created_at": created_at.isoformat() if created_at else None}
+             for cid, priority, created_at in TRIAGE.next(n)]
+    return jsonify({"success": True, "pending": len(TRIAGE), "consultations": items})
+
+
+# Update status/notes/priority of many consultations in one transaction
+@app.route('/consultations/bulk_update', methods=['POST'])
+@staff_required_json
+def bulk_update_consultations():
+    data = request.get_json(silent=True)
+    items = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Expected a non-empty 'updates' list"}), 400
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"At most {BULK_MAX_ITEMS} updates per request"}), 400
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not _is_id(item.get('id')):
+            return jsonify({"success": False, "message": f"updates[{index}]: 'id' must be an integer"}), 400
+
+    ids = {item['id'] for item in items}
+    with stage('bulk_lookup'):
+        existing = {row.id for row in db.session.query(Consultation.id).filter(Consultation.id.in_(ids))}
+
+    now = datetime.utcnow()
+    results, mappings = [], {}
+    for item in items:
+        item_id = item['id']
+        if item_id not in existing:
+            results.append({"id": item_id, "success": False, "message": "Not found"})
+            continue
+        status, priority = item.get('status'), item.get('priority')
+        if status is not None and status not in CONSULTATION_STATUSES:
+            results.append({"id": item_id, "success": False, "message": f"Invalid status: {status}"})
+            continue
+        if priority is not None and priority not in CONSULTATION_PRIORITIES:
+            results.append({"id": item_id, "success": False, "message": f"Invalid priority: {priority}"})
+            continue
+        notes = item.get('doctor_notes')
+        if notes is not None and not isinstance(notes, str):
+            results.append({"id": item_id, "success": False, "message": "'doctor_notes' must be a string"})
+            continue
+        # Later entries for the same id win, as if the updates were applied one by one
+        mapping = mappings.setdefault(item_id, {"id": item_id})
+        if status:
+            mapping["status"] = status
+        if priority:
+            mapping["priority"] = priority
+        if notes:
+            mapping["doctor_notes"] = notes
+        mapping["updated_at"] = now
+        results.append({"id": item_id, "success": True})
+
+    if mappings:
+        with stage('bulk_write'):
+            ok, err = safe_commit_json(
+                lambda: db.session.bulk_update_mappings(Consultation, list(mappings.values())))
+        if not ok:
+            return jsonify({"success": False, "message": f"Update failed: {err}"}), 500
+        for row in db.session.query(Consultation.id, Consultation.priority, Consultation.created_at,
+                                    Consultation.status).filter(Consultation.id.in_(mappings)):
+            sync_triage(*row)
+    updated = sum(1 for r in results if r["success"])
+    return jsonify({"success": updated == len(results), "updated": updated, "results": results})
+
+
+def _store_late_answer(query, symptoms):
+    def store(answer):
+        LATE_ANSWERS.put(query, symptoms, answer)
+        DEADLINE_TOTAL.inc(outcome='late_stored')
+    return store
+
+
+def _llm_caller(deadline):
+    """Router hook that runs remote engines on the LLM worker within the request's deadline"""
+    def call(fn, query, symptoms):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            DEADLINE_TOTAL.inc(outcome='skipped')
+            return None
+        try:
+            response = LLM_WORKER.call(fn, query, symptoms, timeout=min(remaining, llm_worker.LLM_TIMEOUT_SECONDS),
+                                       on_late=_store_late_answer(query, symptoms))
+            DEADLINE_TOTAL.inc(outcome='in_time')
+            return response
+        except llm_worker.LLMWorkerBusy:
+            logger.warning("LLM worker saturated; trying the next engine")
+        except FutureTimeout:
+            DEADLINE_TOTAL.inc(outcome='missed')
+            logger.warning("LLM call missed the request deadline; answering locally")
+        return None
+    return call
+
+
 # Updated Chatbot Route
 @app.route('/chatbot', methods=['POST'])
 def chatbot():
 
+    deadline = time.monotonic() + CHATBOT_DEADLINE_SECONDS
     data = request.json
     query = data.get('message')
     logger.info("chatbot query received")
@@ -417,50 +804,77 @@ def chatbot():
         return jsonify({"reply": "Please provide a message."}), 400
     try:
         # Append user message for analysis (UTF-8)
-        with open("query_dataset.csv", "a", encoding='utf-8', newline='') as file:
+        with stage('query_log'), open(QUERY_LOG_PATH, "a", encoding='utf-8', newline='') as file:
             # Replace newlines to keep one line per entry
             safe_query = (query or "").replace('\r', ' ').replace('\n', ' ').strip()
             file.write(safe_query + "\n")
     except Exception as e:
         logger.warning(f"Could not append to query_dataset.csv: {e}")
+    # Questions that closely match a stored FAQ entry get its answer directly, with no LLM call
+    with stage('faq_fastpath'):
+        direct, faq_score = faq_fastpath.match(query)
+    FASTPATH_TOTAL.inc(result='hit' if direct else 'miss')
+    if direct:
+        return jsonify({"reply": direct})
+    if MATERIALIZED_ANSWERS:
+        with stage('materialized'):
+            canned = MATERIALIZED_ANSWERS.get(normalize_query(query))
+        MATERIALIZED_TOTAL.inc(result='hit' if canned else 'miss')
+        if canned:
+            reply = jsonify({"reply": canned})
+            reply.headers['X-Docify-Route'] = "materialized/cache"
+            return reply
+
     # Get latest symptoms from user's consultations
-    if 'user_id' in session:
-        latest_consultation = Consultation.query.filter_by(user_id=session['user_id']).order_by(
-            Consultation.created_at.desc()).first()
-        symptoms = latest_consultation.symptoms if latest_consultation else None
-    else:
-        symptoms = None
+    with stage('consultation_lookup'):
+        if 'user_id' in session:
+            latest_consultation = (db.session.query(Consultation.symptoms)
+                                   .filter_by(user_id=session['user_id'])
+                                   .order_by(Consultation.created_at.desc())
+                                   .first())
+            symptoms = latest_consultation.symptoms if latest_consultation else None
+        else:
+            symptoms = None
 
 
     try:
-        # Try advanced chatbot function first
-        if ADVANCED_MODULES_AVAILABLE:
-            response = process_query5(query, symptoms)
-            logger.info("chatbot response generated")
-            
-            # Check if response is valid
-            if response and response.strip():
-                return jsonify({"reply": response})
-        
-        # Fall back to simple FAQ responses
-        if FAQ_AVAILABLE:
-            response = get_simple_faq_response(query)
-            return jsonify({"reply": response})
-        else:
-            # Last resort fallback
-            return jsonify({"reply": "I'm sorry, I couldn't generate a response. Please try asking about Docify Online services."})
-            
+        # A remote answer that came in after an earlier identical request had already given up
+        late = LATE_ANSWERS.get(query, symptoms)
+        if late:
+            DEADLINE_TOTAL.inc(outcome='late_served')
+            reply = jsonify({"reply": late})
+            reply.headers['X-Docify-Route'] = "late/cache"
+            return reply
+
+        # Cheapest engine that is good enough for the query's intent; the FAQ fallback comes last
+        def answer():
+            return ROUTER.route(query, symptoms, intent=router.classify(query, faq_score), call=_llm_caller(deadline))
+
+        try:
+            # Waiters give the leader the rest of the deadline plus time for its local fallback
+            (response, intent, engine), shared = INFLIGHT.do(
+                answer_cache.answer_key(query, symptoms), answer,
+                timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+        except singleflight.SingleFlightTimeout:
+            (response, intent, engine), shared = answer(), False
+        logger.info(f"chatbot response routed: intent={intent} engine={engine} shared={shared}")
+        if response:
+            body = {"reply": response}
+            if intent == 'symptom':
+                # Likely conditions and the specialists who treat them, for the UI to suggest
+                with stage('symptom_match'):
+                    body["conditions"] = symptom_index.suggest(query)
+            reply = jsonify(body)
+            reply.headers['X-Docify-Route'] = f"{intent}/{engine}"
+            if shared:
+                reply.headers['X-Docify-Coalesced'] = '1'
+            return reply
+        # Last resort fallback
+        return jsonify({"reply": "I'm sorry, I couldn't generate a response. Please try asking about Docify Online services."})
+
     except Exception as e:
         logger.exception(f"Error in chatbot endpoint: {e}")
-        
-        # Try FAQ fallback
-        if FAQ_AVAILABLE:
-            try:
-                response = get_simple_faq_response(query)
-                return jsonify({"reply": response})
-            except Exception as e2:
-                print(f"Error in FAQ fallback: {e2}")
-        
+
         # Final fallback response
         fallback_response = """
         Welcome to Docify Online! I'm here to help you with:
@@ -487,6 +901,24 @@ def not_found(e):
         return render_template('error_404.html'), 404
     return jsonify(error='Not Found'), 404
 
+@app.errorhandler(429)
+def too_many_requests(e):
+    if request.accept_mimetypes.accept_html and not request.is_json:
+        response = app.make_response((render_template('error_429.html'), 429))
+    else:
+        response = app.make_response((jsonify(error='Too Many Requests'), 429))
+    response.headers['Retry-After'] = str(g.get('retry_after', 60))
+    return response
+
+@app.errorhandler(503)
+def service_unavailable(e):
+    if request.accept_mimetypes.accept_html and not request.is_json:
+        response = app.make_response((render_template('error_503.html'), 503))
+    else:
+        response = app.make_response((jsonify(error='Service Unavailable'), 503))
+    response.headers['Retry-After'] = str(g.get('retry_after', 60))
+    return response
+
 @app.errorhandler(500)
 def server_error(e):
     if request.accept_mimetypes.accept_html and not request.is_json:
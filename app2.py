@@ -2,10 +2,10 @@ import os
 import csv
 import requests
 import logging
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import passwords
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-fallback-secret-key')
@@ -76,12 +76,15 @@ def register():
         phone = request.form['phone']
         email = request.form['email']
         password = request.form['password']
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
 
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
             flash('Email already registered.', 'error')
             return redirect(url_for('register'))
+        try:
+            hashed_password = passwords.hash_password(password)
+        except passwords.PasswordHasherBusy:
+            abort(503)
 
         new_user = User(name=name, phone=phone, email=email, password=hashed_password)
         db.session.add(new_user)
@@ -99,7 +102,11 @@ def login():
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = bool(user) and passwords.verify_password(user.password, password)
+        except passwords.PasswordHasherBusy:
+            abort(503)
+        if valid:
             session['user_id'] = user.id
             flash('Login successful!', 'success')
             return redirect(url_for('dashboard'))
@@ -196,5 +203,16 @@ def chatbot():
         return jsonify({"reply": "Error connecting to chatbot service."}), 502
 
 
+@app.errorhandler(503)
+def service_unavailable(e):
+    # Raised when the password hashing pool is saturated; the client may retry shortly
+    if request.accept_mimetypes.accept_html and not request.is_json:
+        response = app.make_response((render_template('error_503.html'), 503))
+    else:
+        response = app.make_response((jsonify(error='Service Unavailable'), 503))
+    response.headers['Retry-After'] = str(passwords.PASSWORD_HASH_RETRY_AFTER)
+    return response
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for Docify's hot paths.
+Each subcommand prints a JSON result so runs can be diffed between commits.
+Run: python benchmarks.py <subcommand> --help
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+from query_log import read_queries
+
+
+class FakeEmbeddings:
+    """Deterministic stand-in for MiniLM with a fixed per-call cost, for offline runs"""
+
+    model_name = "fake-minilm"
+
+    def __init__(self, dims=384, latency_ms=5.0):
+        self.dims = dims
+        self.latency = latency_ms / 1000.0
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [digest[i % len(digest)] / 255.0 for i in range(self.dims)]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def _load_embedder(args):
+    if args.fake:
+        return FakeEmbeddings(latency_ms=args.fake_ms)
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_kwargs={"device": "cpu"}
+    )
+
+
+def bench_embedding_cache(args):
+    from embedding_cache import CachedQueryEmbeddings
+
+    queries, _ = read_queries(args.queries)
+    if args.limit:
+        queries = queries[:args.limit]
+    if not queries:
+        raise SystemExit(f"No queries found in {args.queries}")
+    embedder = _load_embedder(args)
+
+    start = time.perf_counter()
+    for query in queries:
+        embedder.embed_query(query)
+    uncached = time.perf_counter() - start
+
+    cached_embedder = CachedQueryEmbeddings(embedder, max_entries=args.cache_size)
+    start = time.perf_counter()
+    for query in queries:
+        cached_embedder.embed_query(query)
+    cached = time.perf_counter() - start
+
+    return {
+        "benchmark": "embedding-cache",
+        "queries": len(queries),
+        "distinct_queries": len(set(queries)),
+        "uncached_seconds": round(uncached, 4),
+        "cached_seconds": round(cached, 4),
+        "speedup": round(uncached / cached, 2) if cached else None,
+        "cache": cached_embedder.stats(),
+    }
+
+
+def _loaded_bytes(rows):
+    """Approximate payload size of what the ORM actually pulled from the database"""
+    total = 0
+    for row in rows:
+        values = row._mapping.values() if hasattr(row, '_mapping') else [
+            v for k, v in vars(row).items() if not k.startswith('_sa_')]
+        total += sum(len(str(v)) for v in values if v is not None)
+    return total
+
+
+def _time_query(session, build_query, repeat):
+    best, rows = None, None
+    for _ in range(repeat):
+        # Start from an empty identity map so every run materializes the rows
+        session.expunge_all()
+        start = time.perf_counter()
+        rows = build_query(session).all()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def bench_db_projection(args):
+    """Compare full-row loads with the deferred/projection queries used by list views"""
+    import tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session, load_only, undefer_group
+    from app import db, User, Consultation, CONSULTATION_LIST_COLUMNS, DASHBOARD_CONSULTATION_COLUMNS
+
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'bench.db')}")
+    db.metadata.create_all(engine)
+    history = "Previous conditions and treatments. " * (args.text_kb * 28)
+    symptoms = "Persistent headache, mild fever and fatigue. " * (args.text_kb * 22)
+    with Session(engine) as s:
+        for u in range(args.users):
+            user = User(name=f"User {u}", phone="9999999999", email=f"user{u}@example.com",
+                        password="x" * 100, medical_history=history, allergies=history)
+            s.add(user)
+            s.flush()
+            for c in range(args.consultations):
+                s.add(Consultation(user_id=user.id, symptoms=symptoms, doctor_notes=symptoms,
+                                   status="pending" if c % 3 else "reviewed"))
+        s.commit()
+
+    cases = {
+        "consultation_list": (
+            lambda s: s.query(Consultation).options(undefer_group('details')),
+            lambda s: s.query(Consultation).options(load_only(*CONSULTATION_LIST_COLUMNS)),
+        ),
+        "dashboard": (
+            lambda s: s.query(Consultation).options(undefer_group('details')).filter_by(user_id=1),
+            lambda s: s.query(Consultation).options(load_only(*DASHBOARD_CONSULTATION_COLUMNS)).filter_by(user_id=1),
+        ),
+        "user_export": (
+            lambda s: s.query(User).options(undefer_group('profile')),
+            lambda s: s.query(User).options(load_only(User.id, User.name, User.phone, User.email)),
+        ),
+        "current_user": (
+            lambda s: s.query(User).options(undefer_group('profile')).filter_by(id=1),
+            lambda s: s.query(User.id, User.name, User.email).filter_by(id=1),
+        ),
+    }
+    results = {}
+    for name, (full_query, slim_query) in cases.items():
+        with Session(engine) as s:
+            full_time, full_rows = _time_query(s, full_query, args.repeat)
+            slim_time, slim_rows = _time_query(s, slim_query, args.repeat)
+            full_bytes, slim_bytes = _loaded_bytes(full_rows), _loaded_bytes(slim_rows)
+        results[name] = {
+            "rows": len(full_rows),
+            "full_bytes": full_bytes,
+            "projected_bytes": slim_bytes,
+            "bytes_saved_pct": round(100.0 * (1 - slim_bytes / full_bytes), 1) if full_bytes else 0.0,
+            "full_ms": round(full_time * 1000, 3),
+            "projected_ms": round(slim_time * 1000, 3),
+        }
+    engine.dispose()
+    tmp.cleanup()
+    return {
+        "benchmark": "db-projection",
+        "users": args.users,
+        "consultations_per_user": args.consultations,
+        "text_kb": args.text_kb,
+        "results": results,
+    }
+
+
+def bench_password_hash(args):
+    """Logins/sec (one verify each) for several hash methods and pool sizes"""
+    from passwords import PasswordHasher
+
+    cores = os.cpu_count() or 1
+    results = []
+    for method in args.methods:
+        for workers in args.workers or sorted({1, cores}):
+            hasher = PasswordHasher(method=method, workers=workers, pool=args.pool, queue_size=args.logins)
+            stored = hasher.hash("correct horse battery staple")
+            start = time.perf_counter()
+            futures = [hasher.submit_verify(stored, "correct horse battery staple") for _ in range(args.logins)]
+            assert all(f.result() for f in futures)
+            elapsed = time.perf_counter() - start
+            hasher.shutdown()
+            results.append({
+                "method": hasher.current_prefix(),
+                "workers": workers,
+                "logins_per_second": round(args.logins / elapsed, 2),
+                "logins_per_second_per_core": round(args.logins / elapsed / min(workers, cores), 2),
+                "ms_per_login": round(elapsed * 1000 / args.logins * workers, 2),
+            })
+    return {"benchmark": "password-hash", "pool": args.pool, "cpu_count": cores, "results": results}
+
+
+def bench_bulk_update(args):
+    """N round trips to /update_status/<id> vs one /consultations/bulk_update, via the test client"""
+    import tempfile
+    tmp = tempfile.TemporaryDirectory()
+    # app.py binds its database at import time; point it at a scratch file first
+    os.environ['SQLITE_PATH'] = os.path.join(tmp.name, 'bench.db')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    import app as app_module
+    from app import app, db, User, Consultation
+
+    app_module.STAFF_EMAILS = {"bench@example.com"}
+    with app.app_context():
+        user = User(name="Bench Doctor", phone="9999999999", email="bench@example.com", password="x")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add_all(Consultation(user_id=user.id, symptoms="Fever and cough") for _ in range(2 * args.items))
+        db.session.commit()
+        ids = [row.id for row in db.session.query(Consultation.id).order_by(Consultation.id)]
+        uid = user.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = uid
+
+    per_item_ids, bulk_ids = ids[:args.items], ids[args.items:]
+    start = time.perf_counter()
+    for cid in per_item_ids:
+        client.post(f"/update_status/{cid}", json={"status": "reviewed", "doctor_notes": "Rest and fluids"})
+    per_item = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resp = client.post("/consultations/bulk_update", json={"updates": [
+        {"id": cid, "status": "reviewed", "doctor_notes": "Rest and fluids"} for cid in bulk_ids]})
+    bulk = time.perf_counter() - start
+    assert resp.get_json()["updated"] == len(bulk_ids)
+
+    start = time.perf_counter()
+    client.get(f"/consultations/queue?status=reviewed&limit={args.items}")
+    queue = time.perf_counter() - start
+    tmp.cleanup()
+    return {
+        "benchmark": "bulk-update",
+        "items": args.items,
+        "per_item_ms": round(per_item * 1000, 2),
+        "bulk_ms": round(bulk * 1000, 2),
+        "speedup": round(per_item / bulk, 2) if bulk else None,
+        "queue_fetch_ms": round(queue * 1000, 2),
+    }
+
+
+def _tree_rss_kb(pid):
+    """Resident memory of a process and its children (Linux /proc), in KiB"""
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total or None
+
+
+def _hammer(send, requests_total, concurrency):
+    from concurrent.futures import ThreadPoolExecutor
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        statuses = list(pool.map(lambda _: send(), range(requests_total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_second": round(requests_total / elapsed, 1),
+        "errors": sum(1 for s in statuses if s is None or s >= 400),
+    }
+
+
+def bench_gunicorn_profiles(args):
+    """Start gunicorn once per GUNICORN_PROFILE and measure req/s and memory on three routes"""
+    import subprocess
+    import tempfile
+    import threading
+    import requests
+
+    app_spec = f"load_test:fake_llm_app({args.fake_llm_ms})" if args.fake_llm_ms else "app:app"
+    results = []
+    for profile in args.profiles:
+        tmp = tempfile.TemporaryDirectory()
+        env = dict(os.environ, GUNICORN_PROFILE=profile, GUNICORN_BIND=f"127.0.0.1:{args.port}",
+                   GUNICORN_ACCESSLOG="", SQLITE_PATH=os.path.join(tmp.name, "bench.db"),
+                   QUERY_LOG_PATH=os.devnull, RATE_LIMIT_ENABLED="false",
+                   PASSWORD_HASH_METHOD=args.hash_method)
+        if args.workers:
+            env["GUNICORN_WORKERS"] = str(args.workers)
+        server = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py", app_spec], env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{args.port}"
+        try:
+            for _ in range(300):
+                try:
+                    if requests.get(base + "/health", timeout=1).ok:
+                        break
+                except requests.RequestException:
+                    time.sleep(0.1)
+            else:
+                raise SystemExit(f"gunicorn ({profile}) did not come up")
+            requests.post(base + "/register", data={"name": "Bench", "phone": "1", "email": "b@example.com",
+                                                    "password": "BenchPass!1"}, timeout=30)
+            local = threading.local()
+
+            def session():
+                if not hasattr(local, "s"):
+                    local.s = requests.Session()
+                return local.s
+
+            def call(method, path, **kwargs):
+                def send():
+                    try:
+                        resp = session().request(method, base + path, allow_redirects=False, timeout=60, **kwargs)
+                        return resp.status_code
+                    except requests.RequestException:
+                        return None
+                return send
+
+            idle_rss = _tree_rss_kb(server.pid)
+            routes = {
+                "/health": call("GET", "/health"),
+                "/login": call("POST", "/login", data={"email": "b@example.com", "password": "BenchPass!1"}),
+                "/chatbot": call("POST", "/chatbot", json={"message": "How do I get a medical certificate?"}),
+            }
+            row = {"profile": profile, "idle_rss_mb": round(idle_rss / 1024, 1) if idle_rss else None}
+            for route, send in routes.items():
+                count = args.login_requests if route == "/login" else args.requests
+                row[route] = _hammer(send, count, args.concurrency)
+            loaded_rss = _tree_rss_kb(server.pid)
+            row["loaded_rss_mb"] = round(loaded_rss / 1024, 1) if loaded_rss else None
+            results.append(row)
+        finally:
+            server.terminate()
+            server.wait(30)
+            tmp.cleanup()
+    return {
+        "benchmark": "gunicorn-profiles",
+        "cpu_count": os.cpu_count(),
+        "app": app_spec,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+
+def bench_chatbot_burst(args):
+    """A burst of identical /chatbot questions: provider calls with and without single-flight coalescing"""
+    import threading
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    import app as app_module
+    from load_test import AppTarget
+
+    calls = []
+    lock = threading.Lock()
+
+    def fake_gemini(query, symptoms=None):
+        with lock:
+            calls.append(query)
+        time.sleep(args.llm_ms / 1000.0)
+        return "fake answer"
+
+    target = AppTarget()
+    app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE = fake_gemini, True
+    results = {}
+    for label, enabled in (("independent", False), ("coalesced", True)):
+        app_module.INFLIGHT.enabled = enabled
+        calls.clear()
+        start = time.perf_counter()
+        stats = _hammer(lambda: target.send(args.message), args.requests, args.concurrency)
+        results[label] = dict(stats, provider_calls=len(calls), seconds=round(time.perf_counter() - start, 3))
+    return {"benchmark": "chatbot-burst", "requests": args.requests, "concurrency": args.concurrency,
+            "llm_ms": args.llm_ms, **results}
+
+
+def bench_sparse_retriever(args):
+    """BM25 retriever build time, per-query latency and recall on the labelled fast-path queries"""
+    from faq_fastpath import read_labels
+    from query_log import normalize_query
+    import sparse_retriever
+
+    start = time.perf_counter()
+    retriever = sparse_retriever.BM25Retriever.from_faq_file(args.faq, k=3)
+    build = time.perf_counter() - start
+
+    labels = [(q, expected) for q, expected in read_labels(args.labels) if expected]
+    hits = {1: 0, 3: 0}
+    for query, expected in labels:
+        questions = [normalize_query(d.metadata.get("question", "")) for d in retriever.invoke(query)]
+        for k in hits:
+            hits[k] += normalize_query(expected) in questions[:k]
+    queries = [q for q, _ in read_labels(args.labels)]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            retriever.invoke(query)
+    per_query = (time.perf_counter() - start) / (args.repeat * len(queries))
+    return {
+        "benchmark": "sparse-retriever",
+        "chunks": len(retriever.documents),
+        "terms": len(retriever.postings),
+        "build_ms": round(build * 1000, 2),
+        "query_us": round(per_query * 1e6, 1),
+        "labelled_queries": len(labels),
+        "recall_at_1": round(hits[1] / len(labels), 3) if labels else None,
+        "recall_at_3": round(hits[3] / len(labels), 3) if labels else None,
+    }
+
+
+def _typos(word):
+    """Deterministic one-edit misspellings: deletion, transposition, doubling and substitution"""
+    mid = len(word) // 2
+    return [word[:mid] + word[mid + 1:], word[:mid] + word[mid + 1] + word[mid] + word[mid + 2:],
+            word + word[-1], word[:mid] + ('a' if word[mid] != 'a' else 'e') + word[mid + 1:]]
+
+
+def bench_spell_correct(args):
+    """SymSpell build cost, memory, per-word latency, how often fallback typos are repaired and real words changed"""
+    import tracemalloc
+    import spell_correct
+    import evaluate_different_modules as edm
+    from faq_fastpath import FAQ_PATH
+    from symptom_index import DISEASES_PATH
+
+    paths = [FAQ_PATH, DISEASES_PATH]
+    start = time.perf_counter()
+    corrector = spell_correct.SpellCorrector.from_files(paths, edm.FALLBACK_KEYWORDS)
+    build = time.perf_counter() - start
+    tracemalloc.start()
+    traced = spell_correct.SpellCorrector.from_files(paths, edm.FALLBACK_KEYWORDS)
+    memory = tracemalloc.get_traced_memory()[0]
+    del traced
+    tracemalloc.stop()
+
+    generic = edm.get_simple_faq_response("no keyword here")
+    # Keywords that pick a branch on their own ("morning" only counts as "good morning")
+    keywords = [w for w in edm.FALLBACK_KEYWORDS if len(w) >= 4 and edm.get_simple_faq_response(w) != generic]
+    cases = [(typo, word) for word in keywords for typo in _typos(word)]
+    start = time.perf_counter()
+    fixed = sum(corrector.correct_word(typo) == word for typo, word in cases)
+    uncached = (time.perf_counter() - start) / len(cases)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for typo, _word in cases:
+            corrector.correct_word(typo)
+    cached = (time.perf_counter() - start) / (args.repeat * len(cases))
+
+    edm.SPELL_CORRECT_ENABLED = False
+    missed_before = sum(edm.get_simple_faq_response(typo) == generic for typo, _ in cases)
+    edm.SPELL_CORRECT_ENABLED = True
+    missed_after = sum(edm.get_simple_faq_response(typo) == generic for typo, _ in cases)
+
+    # False corrections: hold every 10th listed word out of the word list and count the ones rewritten
+    words = sorted(spell_correct.read_words(spell_correct.SPELL_WORDS_PATH))
+    held_out = set(words[::10])
+    partial = spell_correct.SpellCorrector.from_texts([], edm.FALLBACK_KEYWORDS, set(words) - held_out)
+    rewritten = sorted(w for w in held_out if partial.correct_word(w) != w)
+    return {
+        "benchmark": "spell-correct",
+        "targets": len(corrector.counts),
+        "known_words": len(corrector.known),
+        "index_keys": len(corrector.index),
+        "build_ms": round(build * 1000, 2),
+        "index_mb": round(memory / 1e6, 2),
+        "word_us_uncached": round(uncached * 1e6, 1),
+        "word_us_cached": round(cached * 1e6, 2),
+        "typos": len(cases),
+        "corrected": round(fixed / len(cases), 3),
+        "generic_answers_without_correction": missed_before,
+        "generic_answers_with_correction": missed_after,
+        "held_out_words": len(held_out),
+        "held_out_rewritten": len(rewritten),
+        "held_out_rewritten_examples": rewritten[:10],
+    }
+
+
+def bench_ollama_client(args):
+    """Per-call Ollama clients vs the shared keep-alive client, and streaming time to first token"""
+    import load_test
+    import ollama_client
+    from router import classify
+
+    messages = ["hello", "how do I book a consultation", "what is the capital of France",
+                "I have a fever, headache and body ache since yesterday"]
+    results = {}
+    for label in ("per_call", "shared"):
+        fake = load_test.FakeOllama(load_ms=args.load_ms, token_ms=args.token_ms, tokens=args.tokens)
+        url = fake.start()
+        shared = ollama_client.OllamaClient(base_url=url)
+        latencies = []
+        for i in range(args.requests):
+            message = messages[i % len(messages)]
+            start = time.perf_counter()
+            if label == "per_call":
+                # The old path: a fresh wrapper per call, default generation length, model unloaded between idle calls
+                client = ollama_client.OllamaClient(base_url=url, keep_alive="0")
+                client.generate(message)
+                client.close()
+            else:
+                shared.generate(message, num_predict=ollama_client.num_predict_for(classify(message)))
+            latencies.append((time.perf_counter() - start) * 1000)
+        if label == "shared":
+            first, start = None, time.perf_counter()
+            for _ in shared.stream(messages[-1], num_predict=ollama_client.num_predict_for("symptom")):
+                first = first or (time.perf_counter() - start) * 1000
+            results["stream_first_token_ms"] = round(first, 1)
+            results["stream_total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        shared.close()
+        fake.stop()
+        results[label] = {
+            "mean_ms": round(sum(latencies) / len(latencies), 1),
+            "p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 1),
+            "model_loads": fake.loads,
+            "connections": fake.connections,
+            "generated_tokens": sum(r.get("options", {}).get("num_predict", args.tokens) for r in fake.requests),
+        }
+    return {"benchmark": "ollama-client", "requests": args.requests, "load_ms": args.load_ms,
+            "token_ms": args.token_ms, **results}
+
+
+def bench_system_prompt(args):
+    """Prompt tokens evaluated and latency per request: Modelfile SYSTEM vs compiled, with and without prefix reuse"""
+    import load_test
+    import ollama_client
+    import prompt_compiler
+    from context_builder import build_context, count_tokens
+    from sparse_retriever import BM25Retriever
+
+    with open(prompt_compiler.MODELFILE_PATH, encoding='utf-8') as file:
+        full = prompt_compiler.read_system(file.read())
+    compiled = prompt_compiler.compile_system(full, has_context=True)
+    retriever = BM25Retriever.from_faq_file(args.faq, k=3)
+    queries = ["how do I get a medical certificate", "what is the consultation fee", "is my data kept private",
+               "can I consult for my mother", "I have fever and a sore throat", "how long until a doctor replies"]
+    # process_query2's prompt before (query first) and after (constant instructions first)
+    layouts = {
+        "before": lambda q, c: (f"answer user query base on retrived information{q}+{c} give short and summerized answer"
+                                "do not recomand and medication ask them to fill the form and consult a doc"),
+        "after": lambda q, c: ("give short and summerized answer do not recomand and medication ask them to fill the "
+                               f"form and consult a doc\nanswer user query base on retrived information\n{c}\nUser query: {q}"),
+    }
+    results = {"system_tokens": {"modelfile": count_tokens(full), "compiled": count_tokens(compiled)}}
+    for label, system, layout in (("modelfile", None, "before"), ("compiled", compiled, "after")):
+        for prefix_cache in (False, True):
+            fake = load_test.FakeOllama(load_ms=0, token_ms=args.token_ms, prompt_token_ms=args.prompt_token_ms,
+                                        tokens=args.tokens, system=full, prefix_cache=prefix_cache)
+            client = ollama_client.OllamaClient(base_url=fake.start())
+            evaluated, latencies = [], []
+            for i in range(args.requests):
+                query = queries[i % len(queries)]
+                context, _ = build_context(retriever.invoke(query))
+                start = time.perf_counter()
+                result = client.generate(layouts[layout](query, context), system=system)
+                latencies.append((time.perf_counter() - start) * 1000)
+                evaluated.append(result["prompt_tokens"])
+            client.close()
+            fake.stop()
+            results[f"{label}{'_prefix_cache' if prefix_cache else ''}"] = {
+                "first_prompt_tokens": evaluated[0],
+                "mean_prompt_tokens": round(sum(evaluated[1:]) / len(evaluated[1:]), 1),
+                "mean_ms": round(sum(latencies[1:]) / len(latencies[1:]), 1),
+            }
+    return {"benchmark": "system-prompt", "requests": args.requests, "prompt_token_ms": args.prompt_token_ms,
+            "token_ms": args.token_ms, **results}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Docify micro-benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("embedding-cache", help="Replay logged queries through the query-embedding cache")
+    p.add_argument("--queries", default="query_dataset.csv")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--cache-size", type=int, default=4096)
+    p.add_argument("--fake", action="store_true", help="Use a fake embedder instead of MiniLM")
+    p.add_argument("--fake-ms", type=float, default=5.0, help="Per-query cost of the fake embedder")
+    p.set_defaults(func=bench_embedding_cache)
+
+    p = sub.add_parser("db-projection", help="Full-row vs deferred/projected queries on a seeded database")
+    p.add_argument("--users", type=int, default=500)
+    p.add_argument("--consultations", type=int, default=10, help="Consultations per user")
+    p.add_argument("--text-kb", type=int, default=2, help="Approximate size of each text column")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_db_projection)
+
+    p = sub.add_parser("password-hash", help="Login verification throughput per hash method and pool size")
+    p.add_argument("--methods", nargs="+", default=["pbkdf2:sha256", "pbkdf2:sha256:600000", "scrypt:32768:8:1"])
+    p.add_argument("--workers", type=int, nargs="*", help="Pool sizes to try (default: 1 and cpu_count)")
+    p.add_argument("--pool", choices=["thread", "process"], default="thread")
+    p.add_argument("--logins", type=int, default=20)
+    p.set_defaults(func=bench_password_hash)
+
+    p = sub.add_parser("bulk-update", help="Per-item /update_status calls vs one bulk update")
+    p.add_argument("--items", type=int, default=200)
+    p.set_defaults(func=bench_bulk_update)
+
+    p = sub.add_parser("gunicorn-profiles", help="Req/s and memory of /health, /login, /chatbot per gunicorn profile")
+    p.add_argument("--profiles", nargs="+", default=["sync", "gthread"])
+    p.add_argument("--workers", type=int, default=0, help="Override GUNICORN_WORKERS")
+    p.add_argument("--requests", type=int, default=500)
+    p.add_argument("--login-requests", type=int, default=40)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--fake-llm-ms", type=float, default=200.0, help="Simulated Gemini latency (0 = real app)")
+    p.add_argument("--hash-method", default="pbkdf2:sha256:600000")
+    p.add_argument("--port", type=int, default=5055)
+    p.set_defaults(func=bench_gunicorn_profiles)
+
+    p = sub.add_parser("chatbot-burst", help="Provider calls for a burst of identical /chatbot questions")
+    p.add_argument("--message", default="I have had a fever and body ache since yesterday")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--llm-ms", type=float, default=500.0, help="Simulated Gemini latency")
+    p.set_defaults(func=bench_chatbot_burst)
+
+    p = sub.add_parser("sparse-retriever", help="BM25 retriever startup, latency and recall on labelled queries")
+    p.add_argument("--faq", default="faq.txt")
+    p.add_argument("--labels", default="fastpath_labels.csv")
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_sparse_retriever)
+
+    p = sub.add_parser("spell-correct", help="Typo correction cost and accuracy for the keyword FAQ fallback")
+    p.add_argument("--repeat", type=int, default=100)
+    p.set_defaults(func=bench_spell_correct)
+
+    p = sub.add_parser("ollama-client", help="Per-call vs shared keep-alive Ollama client against a fake server")
+    p.add_argument("--requests", type=int, default=40)
+    p.add_argument("--load-ms", type=float, default=300.0, help="Simulated model load time")
+    p.add_argument("--token-ms", type=float, default=5.0, help="Simulated time per generated token")
+    p.add_argument("--tokens", type=int, default=300, help="Tokens generated without a num_predict cap")
+    p.set_defaults(func=bench_ollama_client)
+
+    p = sub.add_parser("system-prompt", help="Prompt tokens and latency with the full vs compiled system prompt")
+    p.add_argument("--faq", default="faq.txt")
+    p.add_argument("--requests", type=int, default=12)
+    p.add_argument("--prompt-token-ms", type=float, default=2.0, help="Simulated time per prompt token evaluated")
+    p.add_argument("--token-ms", type=float, default=20.0, help="Simulated time per generated token")
+    p.add_argument("--tokens", type=int, default=32, help="Tokens generated per answer")
+    p.set_defaults(func=bench_system_prompt)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = args.func(args)
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -5,10 +5,12 @@ from flask import Flask, request, jsonify
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.llms import HuggingFacePipeline
-from langchain.chains import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
 import torch
+from faq_parser import parse_faq_text
+from faq_fastpath import fast_answer
+from symptom_index import DISEASES_PATH, specialist_phrase, suggest
+from context_builder import build_context, log_prompt_stats
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -29,265 +31,21 @@ You can reach our support team via the chatbot or email at support@docify.online
 
 What should I include in the symptoms field?
 Describe your symptoms in detail, including duration, severity, and any relevant medical history.
-
-=====================================
-Disease: Diabetes
-=====================================
-
-🩺 Description:
-A chronic condition that affects how your body processes blood sugar (glucose).
-
-🔍 Common Symptoms:
-- Frequent urination
-- Excessive thirst
-- Fatigue
-- Blurred vision
-
-👨‍⚕️ Recommended Specialist:
-Endocrinologist
-
-📝 Diagnosis:
-- Fasting Blood Sugar Test
-- HbA1c Test
-- Glucose Tolerance Test
-
-💊 Treatment / Management:
-- Lifestyle changes (diet, exercise)
-- Oral medications (e.g., Metformin)
-- Insulin therapy (for Type 1 or advanced Type 2)
-
----
-
-=====================================
-Disease: Hypertension (High Blood Pressure)
-=====================================
-
-🩺 Description:
-A condition in which the force of the blood against the artery walls is too high.
-
-🔍 Common Symptoms:
-- Often asymptomatic
-- Headaches
-- Dizziness
-- Nosebleeds
-
-👨‍⚕️ Recommended Specialist:
-Cardiologist / General Physician
-
-📝 Diagnosis:
-- Blood Pressure Monitoring
-- ECG, ECHO, and blood tests if needed
-
-💊 Treatment / Management:
-- Lifestyle modification
-- Antihypertensive medications
-- Stress management
-
----
-
-=====================================
-Disease: Asthma
-=====================================
-
-🩺 Description:
-A respiratory condition marked by spasms in the bronchi of the lungs.
-
-🔍 Common Symptoms:
-- Wheezing
-- Shortness of breath
-- Chest tightness
-- Persistent coughing
-
-👨‍⚕️ Recommended Specialist:
-Pulmonologist
-
-📝 Diagnosis:
-- Spirometry
-- Peak flow test
-- Allergy testing
-
-💊 Treatment / Management:
-- Inhalers (bronchodilators, corticosteroids)
-- Avoidance of allergens and irritants
-
----
-
-=====================================
-Disease: Depression
-=====================================
-
-🩺 Description:
-A mental health disorder characterized by persistently low mood and loss of interest.
-
-🔍 Common Symptoms:
-- Persistent sadness
-- Loss of interest
-- Fatigue
-- Sleep/appetite changes
-- Thoughts of self-harm
-
-👨‍⚕️ Recommended Specialist:
-Psychiatrist / Psychologist
-
-📝 Diagnosis:
-- Psychological evaluation
-- DSM-5 criteria
-
-💊 Treatment / Management:
-- Psychotherapy (CBT, talk therapy)
-- Antidepressant medication
-- Lifestyle changes, support systems
-
----
-
-=====================================
-Disease: Migraine
-=====================================
-
-🩺 Description:
-A neurological condition causing intense, throbbing headaches often on one side.
-
-🔍 Common Symptoms:
-- Severe headache
-- Nausea and vomiting
-- Sensitivity to light and sound
-
-👨‍⚕️ Recommended Specialist:
-Neurologist
-
-📝 Diagnosis:
-- Clinical history and symptom pattern
-- MRI/CT scan to rule out other conditions
-
-💊 Treatment / Management:
-- Migraine-specific medications (Triptans)
-- Preventive therapy
-- Trigger management
-
----
-
-=====================================
-Disease: Arthritis
-=====================================
-
-🩺 Description:
-Inflammation of joints that causes pain and stiffness.
-
-🔍 Common Symptoms:
-- Joint pain and swelling
-- Morning stiffness
-- Reduced range of motion
-
-👨‍⚕️ Recommended Specialist:
-Rheumatologist
-
-📝 Diagnosis:
-- Blood tests for inflammation markers
-- X-rays or MRI of joints
-
-💊 Treatment / Management:
-- Anti-inflammatory drugs
-- Physical therapy
-- Joint protection techniques
-
----
-
-=====================================
-Disease: Tuberculosis (TB)
-=====================================
-
-🩺 Description:
-A serious infectious disease that mainly affects the lungs.
-
-🔍 Common Symptoms:
-- Chronic cough with blood
-- Night sweats
-- Weight loss
-- Fever
-
-👨‍⚕️ Recommended Specialist:
-Pulmonologist / Infectious Disease Specialist
-
-📝 Diagnosis:
-- Chest X-ray
-- Sputum test
-- Tuberculin skin test
-
-💊 Treatment / Management:
-- Long-term antibiotics (6 months)
-- Directly Observed Therapy (DOT)
-
----
-
-=====================================
-Disease: PCOS (Polycystic Ovary Syndrome)
-=====================================
-
-🩺 Description:
-A hormonal disorder causing enlarged ovaries with small cysts.
-
-🔍 Common Symptoms:
-- Irregular periods
-- Acne
-- Weight gain
-- Excess facial/body hair
-
-👨‍⚕️ Recommended Specialist:
-Gynecologist / Endocrinologist
-
-📝 Diagnosis:
-- Hormonal blood tests
-- Pelvic ultrasound
-
-💊 Treatment / Management:
-- Hormone therapy
-- Lifestyle modifications
-- Metformin for insulin resistance
-
----
-
-=====================================
-Disease: Thyroid Disorder
-=====================================
-
-🩺 Description:
-Imbalance in thyroid hormone production (hypo or hyperthyroidism).
-
-🔍 Common Symptoms:
-- Weight changes
-- Fatigue
-- Hair thinning
-- Cold or heat intolerance
-
-👨‍⚕️ Recommended Specialist:
-Endocrinologist
-
-📝 Diagnosis:
-- TSH, T3, T4 blood tests
-- Thyroid ultrasound
-
-💊 Treatment / Management:
-- Thyroid hormone replacement
-- Anti-thyroid medications
-- Regular hormone monitoring
-
----
-
 """
 
+# Disease knowledge blocks are shared with symptom_index.py
+with open(DISEASES_PATH, encoding='utf-8') as _file:
+    faq_data += "\n" + _file.read()
+
 
 # Step 1: Data Collection and Preprocessing
 def preprocess_faq_data(faq_text):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=200,
-        chunk_overlap=50,
-        length_function=len,
-    )
-    chunks = text_splitter.split_text(faq_text)
-    return chunks
+    # One chunk per question/answer pair or disease block, tagged with its metadata
+    entries = parse_faq_text(faq_text)
+    return [e["text"] for e in entries], [e["metadata"] for e in entries]
 
 
-faq_chunks = preprocess_faq_data(faq_data)
+faq_chunks, faq_metadatas = preprocess_faq_data(faq_data)
 
 """
 Set up embeddings and a local FAISS vector store. We avoid hard-coded external
@@ -300,7 +58,7 @@ embedding_model = HuggingFaceEmbeddings(
 
 INDEX_PATH = "faiss_index"
 if not os.path.exists(INDEX_PATH):
-    vector_store = FAISS.from_texts(faq_chunks, embedding_model)
+    vector_store = FAISS.from_texts(faq_chunks, embedding_model, metadatas=faq_metadatas)
     vector_store.save_local(INDEX_PATH)
 else:
     vector_store = FAISS.load_local(INDEX_PATH, embedding_model, allow_dangerous_deserialization=True)
@@ -321,18 +79,21 @@ text2text_pipeline = pipeline(
 )
 llm = HuggingFacePipeline(pipeline=text2text_pipeline)
 retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",
-    retriever=retriever,
-    return_source_documents=True
-)
 
 
 # Step 5: Process Query and Generate Structured Response
 def process_query(user_query, symptoms=None):
-    # Retrieve relevant FAQ documents
-    context = qa_chain({"query": user_query,"Symptoms":symptoms})['result']
+    # A confident match to a stored FAQ question is answered verbatim, without generation
+    direct = fast_answer(user_query)
+    if direct:
+        return direct
+    # Likely conditions go first, so they count toward the model's input budget with the retrieved FAQ documents
+    docs = retriever.invoke(user_query)
+    likely = suggest(f"{user_query} {symptoms or ''}")
+    if likely:
+        docs = ["Possibly related conditions: " + "; ".join(
+            f"{c['condition']} (see {specialist_phrase(c['specialists'])})" for c in likely)] + list(docs)
+    context, stats = build_context(docs, tokenizer=tokenizer)
 
     # Construct prompt with symptoms (if provided) and FAQ context
     prompt = f"""
@@ -352,6 +113,7 @@ def process_query(user_query, symptoms=None):
     """
 
     # Generate response
+    log_prompt_stats("chatbot", prompt, stats, tokenizer)
     response = text2text_pipeline(prompt)[0]["generated_text"]
     print(response)
     return response
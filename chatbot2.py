@@ -4,11 +4,12 @@ from flask import Flask, request, jsonify
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.llms import HuggingFacePipeline
-from langchain.chains import RetrievalQA
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
 from peft import PeftModel, PeftConfig
 import torch
+from faq_parser import parse_faq_text
+from faq_fastpath import fast_answer
+from context_builder import build_context, log_prompt_stats
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -167,16 +168,12 @@ Yes, go to 'My Submissions' → 'Edit' → Make changes → Save. The updated fo
 
 # Preprocess FAQ data
 def preprocess_faq_data(faq_text):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=200,
-        chunk_overlap=50,
-        length_function=len,
-    )
-    chunks = text_splitter.split_text(faq_text)
-    return chunks
+    # One chunk per question/answer pair or disease block, tagged with its metadata
+    entries = parse_faq_text(faq_text)
+    return [e["text"] for e in entries], [e["metadata"] for e in entries]
 
 
-faq_chunks = preprocess_faq_data(faq_data)
+faq_chunks, faq_metadatas = preprocess_faq_data(faq_data)
 
 # Embedding and Vector Store
 embedding_model = HuggingFaceEmbeddings(
@@ -185,7 +182,7 @@ embedding_model = HuggingFaceEmbeddings(
 )
 
 if not os.path.exists("../upload_to_cloud/faiss_index"):
-    vector_store = FAISS.from_texts(faq_chunks, embedding_model)
+    vector_store = FAISS.from_texts(faq_chunks, embedding_model, metadatas=faq_metadatas)
     vector_store.save_local("faiss_index")
 else:
     vector_store = FAISS.load_local("../upload_to_cloud/faiss_index", embedding_model, allow_dangerous_deserialization=True)
@@ -209,17 +206,16 @@ llm = HuggingFacePipeline(pipeline=text2text_pipeline)
 # RAG Setup
 retriever = vector_store.as_retriever(search_kwargs={"k": 5})
 print(retriever.metadata)
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    chain_type="stuff",
-    retriever=retriever,
-    return_source_documents=True
-)
 
 
 # Process Query
 def process_query(user_query, symptoms=None):
-    context = qa_chain({"query": user_query})['result']
+    # A confident match to a stored FAQ question is answered verbatim, without generation
+    direct = fast_answer(user_query)
+    if direct:
+        return direct
+    # k=5 overlapping chunks are stitched back together and packed into the input budget
+    context, stats = build_context(retriever.invoke(user_query), tokenizer=tokenizer)
     prompt = f"""
     You are a medical chatbot for Docify Online. Answer the user's query in a structured, clear, and concise manner.
     Use the following FAQ context to inform your response:
@@ -238,6 +234,7 @@ def process_query(user_query, symptoms=None):
     Do not speculate or provide unverified medical advice.
     """
 
+    log_prompt_stats("chatbot2", prompt, stats, tokenizer)
     response = text2text_pipeline(prompt)[0]["generated_text"]
     return response
 
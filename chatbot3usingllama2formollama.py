@@ -1,12 +1,14 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaLLM
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.chains import StuffDocumentsChain
+from faq_parser import parse_faq_text
+from faq_fastpath import fast_answer
+from context_builder import build_context, log_prompt_stats
+from ollama_client import get_client, num_predict_for
+from router import classify
+from prompt_compiler import system_prompt
 
 
 # Suppress TensorFlow and duplicate library issues
@@ -35,10 +37,11 @@ Describe your symptoms in detail, including duration, severity, and any relevant
 
 # ======== Preprocess FAQ into Chunks ========
 def preprocess_faq_data(faq_text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=50)
-    return text_splitter.split_text(faq_text)
+    # One chunk per question/answer pair or disease block, tagged with its metadata
+    entries = parse_faq_text(faq_text)
+    return [e["text"] for e in entries], [e["metadata"] for e in entries]
 
-faq_chunks = preprocess_faq_data(faq_data)
+faq_chunks, faq_metadatas = preprocess_faq_data(faq_data)
 
 # ======== Embeddings & VectorStore ========
 embedding_model = HuggingFaceEmbeddings(
@@ -47,7 +50,7 @@ embedding_model = HuggingFaceEmbeddings(
 )
 
 if not os.path.exists("../upload_to_cloud/faiss_index"):
-    vector_store = FAISS.from_texts(faq_chunks, embedding_model)
+    vector_store = FAISS.from_texts(faq_chunks, embedding_model, metadatas=faq_metadatas)
     vector_store.save_local("faiss_index")
 else:
     vector_store = FAISS.load_local("../upload_to_cloud/faiss_index", embedding_model, allow_dangerous_deserialization=True)
@@ -56,7 +59,9 @@ else:
 retriever = vector_store.as_retriever(search_kwargs={"k": 3})
 
 # ======== LLM & Prompt Setup ========
-llm = OllamaLLM(model="docify", base_url="http://localhost:11434")
+# Shared Ollama client; loading the model now keeps the first request from paying for it
+llm = get_client()
+llm.warm()
 
 prompt_template = PromptTemplate(
     input_variables=["context", "question", "symptoms_section"],
@@ -74,14 +79,8 @@ Question: {question}
 Answer:"""
 )
 
-llm_chain = LLMChain(llm=llm, prompt=prompt_template)
-combine_documents_chain = StuffDocumentsChain(
-    llm_chain=llm_chain,
-    document_variable_name="context"
-)
-
 # ======== Query Processor ========
-def process_query(user_query, symptoms=None):
+def build_prompt(user_query, symptoms=None):
     # Prepare the symptoms section if provided
     symptoms_section = (
         f"User Symptoms: {symptoms}\nIncorporate these symptoms into your response if relevant."
@@ -91,13 +90,23 @@ def process_query(user_query, symptoms=None):
     # Retrieve the top 3 relevant documents
     top_docs = retriever.get_relevant_documents(user_query)[:3]
 
-    # Build context from retrieved documents
-    context = "\n\n".join(doc.page_content for doc in top_docs)
+    # Build context from retrieved documents (merged, de-duplicated, token-budgeted)
+    context, stats = build_context(top_docs)
+    prompt = prompt_template.format(context=context, question=user_query, symptoms_section=symptoms_section)
+    log_prompt_stats("chatbot3", prompt, stats)
+    # Retrieved context stands in for the FAQ copy in the Modelfile's system prompt
+    return prompt, system_prompt(has_context=bool(top_docs))
 
-    # Generate response using the configured LLM chain
-    result = llm_chain.run(context=context, question=user_query, symptoms_section=symptoms_section)
-    print(result)
-    return result
+
+def process_query(user_query, symptoms=None):
+    # A confident match to a stored FAQ question is answered verbatim, without generation
+    direct = fast_answer(user_query)
+    if direct:
+        return direct
+    prompt, system = build_prompt(user_query, symptoms)
+    result = llm.generate(prompt, system=system, num_predict=num_predict_for(classify(user_query)))
+    print(result["text"])
+    return result["text"]
 
 
 # ======== Flask API Route ========
@@ -113,6 +122,23 @@ def chatbot():
     response = process_query(user_query, symptoms)
     return jsonify({"reply": response})
 
+@app.route('/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """Same answer as /chatbot, sent as plain text while the model generates it"""
+    data = request.json
+    user_query = data.get('message')
+    symptoms = data.get('symptoms')
+
+    if not user_query:
+        return jsonify({"reply": "Please provide a query."}), 400
+
+    direct = fast_answer(user_query)
+    if direct:
+        return Response(direct, mimetype='text/plain')
+    prompt, system = build_prompt(user_query, symptoms)
+    tokens = llm.stream(prompt, system=system, num_predict=num_predict_for(classify(user_query)))
+    return Response(stream_with_context(tokens), mimetype='text/plain')
+
 # ======== Manual Evaluation ========
 def manual_evaluation():
     test_queries = [
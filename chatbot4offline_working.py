@@ -1,6 +1,7 @@
 import os
 from flask import Flask, request, jsonify
 from vector_creator import get_vector_store
+from context_builder import assemble_context, log_prompt_stats
 
 # Suppress TensorFlow and duplicate library issues
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
@@ -27,15 +28,17 @@ def process_query(user_query, symptoms=None):
 
     # Retrieve the top 3 relevant documents
     top_docs = retriever.get_relevant_documents(user_query)[:3]
+    passages, stats = assemble_context(top_docs)
 
     # Debug: Print the retrieved documents
     result = ""
     print("--- Retrieved Documents ---")
-    for i, doc in enumerate(top_docs):
-        doc_text = f"Doc {i + 1}: {doc.page_content}\n" + "-" * 50 + "\n"
+    for i, passage in enumerate(passages):
+        doc_text = f"Doc {i + 1}: {passage}\n" + "-" * 50 + "\n"
         print(doc_text)
         result += doc_text
 
+    log_prompt_stats("chatbot4", result, stats)
     return result
 
 
@@ -0,0 +1,191 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Token budget for retrieved context; flan-t5 only sees 512 input tokens, so
+# leave room for the instructions and the user query around the context.
+DEFAULT_MAX_CONTEXT_TOKENS = int(os.getenv('RAG_CONTEXT_TOKENS', '350'))
+# Word-shingle Jaccard similarity above which two chunks count as duplicates
+DUPLICATE_THRESHOLD = float(os.getenv('RAG_DUPLICATE_THRESHOLD', '0.8'))
+# Shortest shared run of characters treated as splitter overlap
+MIN_OVERLAP_CHARS = 12
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_tokenizer_cache = {}
+
+
+def load_tokenizer(model_name):
+    """Load (once) a Hugging Face tokenizer for token counting, or None if unavailable"""
+    if model_name in _tokenizer_cache:
+        return _tokenizer_cache[model_name]
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        logger.warning(f"Tokenizer {model_name} unavailable, approximating token counts: {e}")
+        tokenizer = None
+    _tokenizer_cache[model_name] = tokenizer
+    return tokenizer
+
+
+def count_tokens(text, tokenizer=None):
+    """Count tokens with the model tokenizer when given, else a word/punctuation estimate"""
+    if not text:
+        return 0
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return len(_TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens, tokenizer=None):
+    """Cut text down to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    if tokenizer is not None:
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        return tokenizer.decode(ids[:max_tokens], skip_special_tokens=True).strip()
+    matches = list(_TOKEN_RE.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    return text[:matches[max_tokens - 1].end()].strip()
+
+
+def _doc_text(doc):
+    if isinstance(doc, str):
+        return doc
+    return getattr(doc, 'page_content', str(doc))
+
+
+def _overlap_length(left, right):
+    """Length of the longest suffix of `left` that is also a prefix of `right`"""
+    longest = min(len(left), len(right))
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_overlapping(texts):
+    """Stitch chunks produced by an overlapping splitter back into their source spans.
+
+    Input order is relevance order; each merged span keeps the best rank of its
+    parts so the most relevant material is still packed first.
+    """
+    spans = []  # (text, best rank)
+    for rank, text in enumerate(texts):
+        current, best = text.strip(), rank
+        if not current:
+            continue
+        absorbed = False
+        changed = True
+        while changed and not absorbed:
+            changed = False
+            for i, (span, span_rank) in enumerate(spans):
+                if current in span:
+                    spans[i] = (span, min(span_rank, best))
+                    absorbed = True
+                    break
+                if span in current:
+                    merged = current
+                else:
+                    size = _overlap_length(span, current)
+                    if size:
+                        merged = span + current[size:]
+                    else:
+                        size = _overlap_length(current, span)
+                        if not size:
+                            continue
+                        merged = current + span[size:]
+                current, best = merged, min(span_rank, best)
+                del spans[i]
+                changed = True
+                break
+        if not absorbed:
+            spans.append((current, best))
+    spans.sort(key=lambda s: s[1])
+    return [s[0] for s in spans]
+
+
+def _shingles(text, size=3):
+    words = _TOKEN_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(texts, threshold=None):
+    """Remove texts whose shingle set is too similar to an earlier (more relevant) one"""
+    threshold = DUPLICATE_THRESHOLD if threshold is None else threshold
+    kept, kept_shingles = [], []
+    for text in texts:
+        shingles = _shingles(text)
+        duplicate = False
+        for other in kept_shingles:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(text)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def assemble_context(docs, max_tokens=None, tokenizer=None, separator="\n\n"):
+    """Merge, de-duplicate and pack retrieved docs into a token budget.
+
+    Returns the list of packed passages (most relevant first) and a stats dict
+    describing how much of the retrieved text made it into the prompt.
+    """
+    max_tokens = DEFAULT_MAX_CONTEXT_TOKENS if max_tokens is None else max_tokens
+    texts = [_doc_text(doc) for doc in docs]
+    spans = merge_overlapping(texts)
+    unique = drop_near_duplicates(spans)
+
+    separator_tokens = count_tokens(separator, tokenizer)
+    packed, used, truncated = [], 0, False
+    for text in unique:
+        cost = count_tokens(text, tokenizer) + (separator_tokens if packed else 0)
+        if used + cost <= max_tokens:
+            packed.append(text)
+            used += cost
+            continue
+        remaining = max_tokens - used - (separator_tokens if packed else 0)
+        if remaining > 0:
+            cut = truncate_to_tokens(text, remaining, tokenizer)
+            if cut:
+                packed.append(cut)
+                used += count_tokens(cut, tokenizer) + (separator_tokens if len(packed) > 1 else 0)
+                truncated = True
+        break
+
+    stats = {
+        "docs": len(texts),
+        "merged_spans": len(spans),
+        "duplicates_dropped": len(spans) - len(unique),
+        "passages": len(packed),
+        "tokens_retrieved": sum(count_tokens(t, tokenizer) for t in texts),
+        "tokens_packed": used,
+        "max_tokens": max_tokens,
+        "truncated": truncated,
+    }
+    return packed, stats
+
+
+def build_context(docs, max_tokens=None, tokenizer=None, separator="\n\n"):
+    """Return (context string, stats) for a list of retrieved documents"""
+    packed, stats = assemble_context(docs, max_tokens, tokenizer, separator)
+    return separator.join(packed), stats
+
+
+def log_prompt_stats(label, prompt, stats, tokenizer=None):
+    """Record per-request prompt size alongside the context packing stats"""
+    stats = dict(stats)
+    stats["prompt_tokens"] = count_tokens(prompt, tokenizer)
+    stats["prompt_chars"] = len(prompt)
+    logger.info(f"{label} prompt stats: {stats}")
+    return stats
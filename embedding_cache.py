@@ -0,0 +1,121 @@
+import os
+import json
+import atexit
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+from query_log import normalize_query
+
+try:
+    from langchain_core.embeddings import Embeddings
+except Exception:
+    class Embeddings:  # type: ignore
+        pass
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '4096'))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH')  # unset = in-memory only
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """LRU cache of normalized query -> embedding in front of a LangChain embedder.
+
+    Vectors are held as float32 `array('f')` (4 bytes per dimension instead of a
+    Python float object each). Document embedding is passed straight through;
+    only `embed_query`, which runs on every retrieval, is cached.
+    """
+
+    def __init__(self, embeddings, max_entries=None, persist_path=None, model_name=None):
+        self.embeddings = embeddings
+        self.max_entries = max_entries or EMBEDDING_CACHE_SIZE
+        self.persist_path = persist_path
+        self.model_name = model_name or getattr(embeddings, 'model_name', type(embeddings).__name__)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+        # Embed outside the lock so concurrent misses don't serialize on the model
+        embedding = self.embeddings.embed_query(text)
+        self._store(key, array('f', embedding))
+        return list(embedding)
+
+    def _store(self, key, vector):
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            dims = len(next(iter(self._cache.values()))) if self._cache else 0
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "vector_bytes": len(self._cache) * dims * 4,
+            }
+
+    def save(self, path=None):
+        """Write the cache as a JSON header line followed by the raw float32 vectors"""
+        path = path or self.persist_path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._cache.keys())
+            vectors = list(self._cache.values())
+        dims = len(vectors[0]) if vectors else 0
+        header = {"model": self.model_name, "dims": dims, "keys": keys}
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(json.dumps(header).encode('utf-8') + b"\n")
+                for vector in vectors:
+                    vector.tofile(file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist embedding cache to {path}: {e}")
+
+    def load(self, path=None):
+        path = path or self.persist_path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as file:
+                header = json.loads(file.readline().decode('utf-8'))
+                if header.get("model") != self.model_name:
+                    logger.info("Embedding cache on disk was built with a different model; ignoring it")
+                    return
+                dims = header["dims"]
+                # Keys are saved oldest first, so replaying them restores LRU order
+                for key in header["keys"]:
+                    vector = array('f')
+                    vector.fromfile(file, dims)
+                    self._store(key, vector)
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            logger.warning(f"Could not load embedding cache from {path}: {e}")
@@ -8,10 +8,17 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 os.environ['PYTHONWARNINGS'] = 'ignore::RuntimeWarning'
 
 # Try to import dependencies with error handling
-# Temporarily disable vector_creator to avoid crashes
+# vector_creator is opt-in (VECTOR_STORE_ENABLED=true, set by the full Docker image,
+# which ships a prebuilt index); otherwise it stays disabled to avoid import crashes
 VECTOR_STORE_AVAILABLE = False
 get_vector_store = None
-print("Info: Vector store disabled to prevent import crashes")
+if os.getenv('VECTOR_STORE_ENABLED', 'false').lower() in {'1', 'true', 'yes'}:
+    try:
+        from vector_creator import get_vector_store, IMPORTS_SUCCESSFUL as VECTOR_STORE_AVAILABLE
+    except Exception as e:
+        print(f"Warning: Vector store unavailable: {e}")
+else:
+    print("Info: Vector store disabled to prevent import crashes")
 
 # Temporarily disable transformers to avoid crashes
 TRANSFORMERS_AVAILABLE = False
@@ -64,6 +71,13 @@ class PeftModel:  # type: ignore
     def from_pretrained(*args, **kwargs):
         raise RuntimeError("peft.PeftModel unavailable")
 
+from context_builder import assemble_context, build_context, log_prompt_stats
+from spell_correct import SPELL_CORRECT_ENABLED, get_corrector
+from ollama_client import get_client as get_ollama_client, num_predict_for
+from router import classify
+from prompt_compiler import system_prompt
+from metrics import stage
+
 try:
     import google.generativeai as genai
     GENAI_AVAILABLE = True
@@ -102,13 +116,42 @@ if VECTOR_STORE_AVAILABLE:
         print(f"Error initializing vector store: {e}")
         retriever = None
 else:
-    print("Vector store not available, using simple FAQ responses only")
     retriever = None
 
+# Without the ML stack, retrieve FAQ context lexically so Gemini still gets grounded prompts
+if retriever is None:
+    from faq_fastpath import FAQ_PATH
+    from sparse_retriever import get_retriever
+    retriever = get_retriever(FAQ_PATH, k=3)
+    if retriever is not None:
+        print("Using BM25 retriever over faq.txt")
+    else:
+        print("Vector store not available, using simple FAQ responses only")
+
 # ======== Simple FAQ Response Function ========
+# Words the keyword branches below look for; typos are corrected towards these only
+FALLBACK_KEYWORDS = (
+    "fever", "temperature", "hot", "certificate", "docify", "submit", "consultation", "form", "secure", "data", "privacy",
+    "support", "contact", "help", "symptoms", "hi", "hello", "hey", "morning", "afternoon", "evening",
+    "pain", "headache", "cough", "cold", "sick", "unwell",
+)
+
+
+def _spell_corrector():
+    from faq_fastpath import FAQ_PATH
+    from symptom_index import DISEASES_PATH
+    return get_corrector([FAQ_PATH, DISEASES_PATH], FALLBACK_KEYWORDS)
+
+
 def get_simple_faq_response(user_query):
     """Simple FAQ responses that don't require AI API"""
     query_lower = user_query.lower()
+    if SPELL_CORRECT_ENABLED:
+        # Match on the typo-corrected words as well, so "feverr" or "consulation" still hit a branch
+        with stage('spell_correct'):
+            corrected = _spell_corrector().correct(query_lower)
+        if corrected != query_lower:
+            query_lower = f"{query_lower} {corrected}"
     
     if "fever" in query_lower or "temperature" in query_lower or "hot" in query_lower:
         return """I understand you have a fever. Here's some general guidance:
@@ -128,6 +171,14 @@ def get_simple_faq_response(user_query):
 📋 **Next steps:**
 Please fill out a consultation form on your dashboard with your specific symptoms so our doctors can provide proper medical advice. We cannot provide specific medical treatment through this chat."""
     
+    elif "certificate" in query_lower:
+        return """Yes, Docify offers medical certificates after a genuine consultation:
+- Certificates are issued by licensed, MBBS-qualified doctors and sent to your email as a PDF
+- They are signed and stamped, and valid for workplaces, schools and visa/travel purposes
+- Issuing one can take up to 3 hours
+
+Submit a consultation form from your dashboard to get started."""
+    
     elif "docify" in query_lower or "what is" in query_lower:
         return """Docify Online is a platform for filling out medical certificates and consultation forms, with support from our chatbot. 
         
@@ -211,12 +262,16 @@ def process_query(user_query, symptoms=None):
             return get_simple_faq_response(user_query)
             
         symptoms_section = f"User Symptoms: {symptoms}\nIncorporate these symptoms into your response if relevant." if symptoms else ""
-        top_docs = retriever.invoke(user_query)[:3]  # Fixed deprecated method
+        with stage('retrieval'):
+            top_docs = retriever.invoke(user_query)[:3]  # Fixed deprecated method
+        with stage('prompt'):
+            passages, stats = assemble_context(top_docs)
 
         result = ""
-        for i, doc in enumerate(top_docs):
-            doc_text = f"Doc {i + 1}: {doc.page_content}\n" + "-" * 50 + "\n"
+        for i, passage in enumerate(passages):
+            doc_text = f"Doc {i + 1}: {passage}\n" + "-" * 50 + "\n"
             result += doc_text
+        log_prompt_stats("process_query", result, stats)
         print(result)
         return result if result.strip() else get_simple_faq_response(user_query)
     except Exception as e:
@@ -227,7 +282,8 @@ def process_query2(user_query, symptoms=None):
     symptoms_section = f"User Symptoms: {symptoms}\nIncorporate these symptoms into your response if relevant." if symptoms else ""
 
     # Retrieve the top 3 relevant documents
-    top_docs = retriever.get_relevant_documents(user_query)[:3]
+    with stage('retrieval'):
+        top_docs = retriever.invoke(user_query)[:3] if retriever is not None else []
 
     # Debug: Print the retrieved documents
     print("--- Retrieved Documents ---")
@@ -235,11 +291,17 @@ def process_query2(user_query, symptoms=None):
         print(f"Doc {i+1}: {doc.page_content}")
         print("-" * 50)
 
-    # Pass the relevant documents to the chain for processing
-    from langchain_community.llms import Ollama
-    ollama = Ollama(base_url='http://localhost:11434', model="docify")
-    result=ollama(f"answer user query base on retrived information{user_query}+{top_docs} give short and summerized answer"
-                  f"do not recomand and medication ask them to fill the form and consult a doc")
+    with stage('prompt'):
+        context, stats = build_context(top_docs)
+    # Constant instructions first and the query last, so consecutive prompts share the longest prefix
+    prompt = ("give short and summerized answer do not recomand and medication ask them to fill the form and consult a doc\n"
+              f"answer user query base on retrived information\n{context}\nUser query: {user_query}")
+    log_prompt_stats("process_query2", prompt, stats)
+    # Shared client: pooled connection, model kept loaded, answer length capped by intent;
+    # the compiled system prompt leaves out the Modelfile's FAQ copy when context was retrieved
+    with stage('llm'):
+        result = get_ollama_client().generate(prompt, system=system_prompt(has_context=bool(top_docs)),
+                                              num_predict=num_predict_for(classify(user_query)))["text"]
     print(result)
     return result
 # Optional: Manual evaluation function
@@ -275,11 +337,13 @@ def process_query3(user_query, symptoms=None):
     llm_chain = prompt | llm | StrOutputParser()
     from langchain_core.runnables import RunnablePassthrough
 
-    rag_chain = {"context": retriever, "question": RunnablePassthrough()} | llm_chain
+    packed_context = retriever | (lambda docs: build_context(docs)[0])
+    rag_chain = {"context": packed_context, "question": RunnablePassthrough()} | llm_chain
 
     # Generate and return response
     try:
-        response = rag_chain.invoke(prompt)
+        with stage('llm'):
+            response = rag_chain.invoke(prompt)
         response = response.replace("</s>", "").strip()
         print("Model response:", response)
         return response
@@ -304,17 +368,12 @@ def process_query4(user_query, symptoms=None):
 
     llm = HuggingFacePipeline(pipeline=text2text_pipeline)
 
-    # RAG Setup
+    # RAG Setup: pack retrieved chunks into the flan-t5 input budget
     retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    print(retriever.metadata)
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        return_source_documents=True
-    )
-
-    context = qa_chain({"query": user_query})['result']
+    with stage('retrieval'):
+        top_docs = retriever.invoke(user_query)
+    with stage('prompt'):
+        context, stats = build_context(top_docs, tokenizer=tokenizer)
     prompt = f"""
     You are a medical chatbot for Docify Online. Answer the user's query in a structured, clear, and concise manner.
     Use the following FAQ context to inform your response:
@@ -333,17 +392,21 @@ def process_query4(user_query, symptoms=None):
     Do not speculate or provide unverified medical advice.
     """
 
-    response = text2text_pipeline(prompt)[0]["generated_text"]
+    log_prompt_stats("process_query4", prompt, stats, tokenizer)
+    with stage('llm'):
+        response = text2text_pipeline(prompt)[0]["generated_text"]
     return response
 
 def process_query5(user_query, symptom=None):
-    """Enhanced query processor using Google Gemini with error handling"""
+    """Query processor using Google Gemini.
+
+    Raises when Gemini is not configured or the call fails, so callers (the
+    router) can count the failure and pick their own fallback.
+    """
+    # Check if API key is available and valid
+    if not api_key or api_key.strip() == '' or api_key == 'your_actual_google_api_key_here':
+        raise RuntimeError("No valid Google API key available")
     try:
-        # Check if API key is available and valid
-        if not api_key or api_key.strip() == '' or api_key == 'your_actual_google_api_key_here':
-            print("No valid Google API key available, falling back to simple FAQ response")
-            return get_simple_faq_response(user_query)
-        
         generation_config = {
             "temperature": 1,
             "top_p": 0.95,
@@ -374,37 +437,41 @@ def process_query5(user_query, symptom=None):
             generation_config=generation_config,
         )
         # Generate summary using Gemini model
-        if retriever is not None:
-            top_docs = retriever.invoke(user_query)[:3]  # Use invoke instead of deprecated get_relevant_documents
-        else:
-            top_docs = []
-        
-        summary = model.generate_content(contents=(
-            f"You are a helpful medical assistant chatbot for Docify Online.\n\n"
-            f"**About Docify:**\n"
-            f"Docify is an online platform that allows users to consult certified doctors from the comfort of their home for health concerns and medical certificates.\n\n"
-            f"**Your Role:**\n"
-            f"- Provide general health information and guidance about common symptoms\n"
-            f"- Answer questions about Docify's services and features\n"
-            f"- Help users understand when to seek professional medical consultation\n"
-            f"- Be friendly, informative, and supportive\n\n"
-            f"**Guidelines:**\n"
-            f"- Provide helpful information about common health concerns like fever, cold, cough, headaches, etc.\n"
-            f"- For serious symptoms or diagnosis requests, recommend submitting a consultation form on the dashboard\n"
-            f"- Do NOT prescribe medications or provide specific medical diagnoses\n"
-            f"- Keep responses concise, clear, and friendly (2-4 sentences)\n"
-            f"- For unrelated questions (sports, weather, etc.), politely redirect to health/platform topics\n\n"
-            f"**User Query:** {user_query}\n"
-            f"**Context from FAQ:** {top_docs}\n\n"
-            f"Provide a helpful, friendly response:"
-        ))
+        with stage('retrieval'):
+            if retriever is not None:
+                top_docs = retriever.invoke(user_query)[:3]  # Use invoke instead of deprecated get_relevant_documents
+            else:
+                top_docs = []
+        with stage('prompt'):
+            context, stats = build_context(top_docs)
+            prompt = (
+                f"You are a helpful medical assistant chatbot for Docify Online.\n\n"
+                f"**About Docify:**\n"
+                f"Docify is an online platform that allows users to consult certified doctors from the comfort of their home for health concerns and medical certificates.\n\n"
+                f"**Your Role:**\n"
+                f"- Provide general health information and guidance about common symptoms\n"
+                f"- Answer questions about Docify's services and features\n"
+                f"- Help users understand when to seek professional medical consultation\n"
+                f"- Be friendly, informative, and supportive\n\n"
+                f"**Guidelines:**\n"
+                f"- Provide helpful information about common health concerns like fever, cold, cough, headaches, etc.\n"
+                f"- For serious symptoms or diagnosis requests, recommend submitting a consultation form on the dashboard\n"
+                f"- Do NOT prescribe medications or provide specific medical diagnoses\n"
+                f"- Keep responses concise, clear, and friendly (2-4 sentences)\n"
+                f"- For unrelated questions (sports, weather, etc.), politely redirect to health/platform topics\n\n"
+                f"**User Query:** {user_query}\n"
+                f"**Context from FAQ:** {context}\n\n"
+                f"Provide a helpful, friendly response:"
+            )
+            log_prompt_stats("process_query5", prompt, stats)
+        with stage('llm'):
+            summary = model.generate_content(contents=prompt)
 
         return summary.text
     
     except Exception as e:
         print(f"Error with Google API: {e}")
-        print("Falling back to simple FAQ response")
-        return get_simple_faq_response(user_query)
+        raise
 
 
 def manual_evaluation():
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Direct answers for queries that closely match a stored FAQ question.
+
+When the best faq.txt question scores at least FAQ_FASTPATH_THRESHOLD
+(IDF-weighted cosine over content words), its stored answer is returned as-is
+and no LLM is called. Symptom descriptions and red-flag terms (triage
+keywords) never take the fast path: a stored answer can't account for
+"seizure" or "pregnant" next to "fever". Calibrate the threshold on
+labelled traffic:
+
+  python faq_fastpath.py --labels fastpath_labels.csv
+"""
+import os
+import re
+import sys
+import csv
+import json
+import math
+import argparse
+import threading
+
+import triage
+from faq_parser import parse_faq_file
+from query_log import normalize_query
+from router import classify
+
+FAQ_FASTPATH_ENABLED = os.getenv('FAQ_FASTPATH_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+# Calibrated with `python faq_fastpath.py --labels fastpath_labels.csv`: 0.55 was the lowest
+# threshold with no wrong answers; 0.6 leaves a margin for traffic the label set doesn't cover
+FAQ_FASTPATH_THRESHOLD = float(os.getenv('FAQ_FASTPATH_THRESHOLD', '0.6'))
+FAQ_PATH = os.getenv('FAQ_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faq.txt'))
+
+STOPWORDS = frozenset("""
+a an the and or but if of to in on at for from by with about as into is are was were be been being
+do does did doing have has had i me my we our you your it its this that these those there what which
+who whom how when where why can could should would will shall may might must am any some please
+get give tell want need just also so than too very
+""".split())  # negations ("not", "no") are content: "I do not have fever" is not the fever question
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NEGATION_RE = re.compile(r"n['’]t\b")  # "don't" -> "do not", not the tokens "don" and "t"
+NEGATIONS = frozenset(('no', 'not', 'never', 'without'))
+
+
+def expand_negations(text):
+    """Lowercased text with contracted negations spelled out ("don't" -> "do not")"""
+    return _NEGATION_RE.sub(' not', (text or '').lower())
+
+
+def tokenize(text):
+    """Content words, lowercased, with a naive plural strip so 'certificates' matches 'certificate'"""
+    tokens = []
+    text = expand_negations(text)
+    for word in _WORD_RE.findall(text):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class FaqMatcher:
+    """Scores a query against every FAQ question with IDF-weighted cosine similarity"""
+
+    def __init__(self, entries):
+        self.entries = [e for e in entries if e["metadata"].get("question") and e.get("answer")]
+        token_sets = [set(tokenize(e["metadata"]["question"])) for e in self.entries]
+        df = {}
+        for tokens in token_sets:
+            for token in tokens:
+                df[token] = df.get(token, 0) + 1
+        n = len(token_sets)
+        self.idf = {t: math.log((n + 1) / (count + 1)) + 1.0 for t, count in df.items()}
+        self._default_idf = math.log(n + 1) + 1.0
+        self.vectors = []
+        self.exact = {}
+        for i, (entry, tokens) in enumerate(zip(self.entries, token_sets)):
+            weights = {t: self.idf[t] for t in tokens}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            self.vectors.append({t: w / norm for t, w in weights.items()})
+            self.exact.setdefault(normalize_query(entry["metadata"]["question"]), i)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(parse_faq_file(path))
+
+    def best(self, query):
+        """(entry, score) of the closest FAQ question, or (None, 0.0)"""
+        exact = self.exact.get(normalize_query(query))
+        if exact is not None:
+            return self.entries[exact], 1.0
+        tokens = set(tokenize(query))
+        if not tokens:
+            return None, 0.0
+        weights = {t: self.idf.get(t, self._default_idf) for t in tokens}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        best_index, best_score = None, 0.0
+        for i, vector in enumerate(self.vectors):
+            score = sum(w * vector[t] for t, w in weights.items() if t in vector) / norm
+            if score > best_score:
+                best_index, best_score = i, score
+        if best_index is None:
+            return None, 0.0
+        return self.entries[best_index], best_score
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = FaqMatcher.from_file(FAQ_PATH)
+    return _matcher
+
+
+def needs_clinician(query, score=0.0):
+    """True for red-flag terms or a symptom description; those always go to a model or a doctor"""
+    return triage.auto_priority(query) != 'normal' or classify(query, score) == 'symptom'
+
+
+def match(query, threshold=None):
+    """(stored answer or None, best score); the answer is given only for a confident, safe match"""
+    if not FAQ_FASTPATH_ENABLED or not query:
+        return None, 0.0
+    entry, score = get_matcher().best(query)
+    if entry is None or score < (FAQ_FASTPATH_THRESHOLD if threshold is None else threshold):
+        return None, score
+    if needs_clinician(query, score):
+        return None, score
+    return entry["answer"], score
+
+
+def fast_answer(query, threshold=None):
+    """Stored FAQ answer when the query is a confident match, else None"""
+    return match(query, threshold)[0]
+
+
+def read_labels(path):
+    """CSV with `query,expected_question`; an empty expected_question means no FAQ answer is right"""
+    with open(path, newline='', encoding='utf-8') as file:
+        return [(row["query"], (row.get("expected_question") or "").strip() or None) for row in csv.DictReader(file)]
+
+
+def calibrate(matcher, labels, thresholds):
+    """Share of traffic answered without an LLM, and how often those answers were right, per threshold"""
+    scored = []
+    for query, expected in labels:
+        entry, score = matcher.best(query)
+        matched = entry["metadata"]["question"] if entry else None
+        if needs_clinician(query, score):
+            score = -1.0  # never served, whatever the threshold
+        scored.append((score, matched is not None and normalize_query(matched) == normalize_query(expected or "")))
+    rows = []
+    for threshold in thresholds:
+        served = [correct for score, correct in scored if score >= threshold]
+        rows.append({
+            "threshold": round(threshold, 3),
+            "served_without_llm": round(len(served) / len(scored), 3) if scored else 0.0,
+            "accuracy_when_served": round(sum(served) / len(served), 3) if served else None,
+            "wrong_answers": len(served) - sum(served),
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the FAQ fast-path threshold")
+    parser.add_argument("--labels", default="fastpath_labels.csv")
+    parser.add_argument("--faq", default=FAQ_PATH)
+    parser.add_argument("--min-accuracy", type=float, default=1.0,
+                        help="Recommend the lowest threshold whose served answers are at least this accurate")
+    args = parser.parse_args(argv)
+
+    matcher = FaqMatcher.from_file(args.faq)
+    rows = calibrate(matcher, read_labels(args.labels), [t / 20 for t in range(6, 21)])
+    ok = [r for r in rows if r["accuracy_when_served"] is not None and r["accuracy_when_served"] >= args.min_accuracy]
+    report = {"labels": args.labels, "sweep": rows,
+              "recommended_threshold": ok[0]["threshold"] if ok else None}
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
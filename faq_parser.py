@@ -0,0 +1,94 @@
+import re
+
+# The FAQ sources mix four layouts:
+#   plain     "What is Docify Online?\nanswer"           (faq.txt head, chatbot.py, chatbot3)
+#   numbered  "1. What is Docify?\nanswer"                (faq.txt)
+#   bold      "**1. What should I do ...?**\nanswer"      (faq.txt tail, chatbot2.py)
+#   disease   "=====\nDisease: Asthma\n=====\n...\n---"   (chatbot.py)
+BOLD_RE = re.compile(r"^\*\*\s*(\d+)\.\s*(.+?)\s*\*\*$")
+NUMBERED_RE = re.compile(r"^(\d+)\.\s+(.+\?)$")
+DISEASE_RE = re.compile(r"^Disease:\s*(.+)$")
+RULE_RE = re.compile(r"^(={3,}|-{3,})$")
+
+
+def _new_entry(kind, question, number, section):
+    return {"kind": kind, "question": question, "number": number, "section": section, "lines": []}
+
+
+def _finish(entry):
+    answer = "\n".join(entry["lines"]).strip()
+    if entry["kind"] == "disease":
+        text = f"Disease: {entry['question']}\n{answer}".strip()
+    else:
+        text = f"{entry['question']}\n{answer}".strip()
+    metadata = {
+        "kind": entry["kind"],
+        "section": entry["section"],
+        "question": entry["question"],
+        "number": entry["number"],
+    }
+    return {"text": text, "answer": answer, "metadata": metadata}
+
+
+def parse_faq_text(text):
+    """Split FAQ text into one entry per question/answer pair or disease block.
+
+    Each entry is a dict with the indexed `text` (question plus answer), the bare
+    `answer`, and `metadata` (kind, section, question, number). A new section
+    starts whenever the layout changes or the numbering restarts.
+    """
+    entries = []
+    current = None
+    section = 0
+    last_kind, last_number = None, None
+    previous_blank = True
+
+    def start(kind, question, number):
+        nonlocal current, section, last_kind, last_number
+        if current is not None:
+            entries.append(_finish(current))
+        restarted = number is not None and last_number is not None and number <= last_number
+        if last_kind is not None and (kind != last_kind or restarted):
+            section += 1
+        current = _new_entry(kind, question, number, section)
+        last_kind, last_number = kind, number
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            previous_blank = True
+            if current is not None:
+                current["lines"].append("")
+            continue
+
+        if RULE_RE.match(line):
+            # Disease blocks are framed by ==== rules and closed with ---
+            if line.startswith("-") and current is not None and current["kind"] == "disease":
+                entries.append(_finish(current))
+                current = None
+            previous_blank = True
+            continue
+
+        match = BOLD_RE.match(line)
+        if match:
+            start("bold", match.group(2), int(match.group(1)))
+        elif DISEASE_RE.match(line):
+            start("disease", DISEASE_RE.match(line).group(1), None)
+        elif NUMBERED_RE.match(line) and previous_blank:
+            match = NUMBERED_RE.match(line)
+            start("numbered", match.group(2), int(match.group(1)))
+        elif (line.endswith("?") and previous_blank
+              and (current is None or current["kind"] == "plain")):
+            start("plain", line, None)
+        elif current is not None:
+            current["lines"].append(line)
+        previous_blank = False
+
+    if current is not None:
+        entries.append(_finish(current))
+    return [e for e in entries if e["answer"]]
+
+
+def parse_faq_file(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return parse_faq_text(file.read())
@@ -0,0 +1,63 @@
+"""
+Gunicorn settings for Docify.
+Run: gunicorn -c gunicorn.conf.py app:app
+
+GUNICORN_PROFILE picks the worker model:
+- gthread (default): a few processes with threads each. Threads overlap
+  I/O waits (Gemini, SQLite), and CPU-heavy password hashing runs on
+  passwords.py's pool.
+- sync: one request per process, 2 x cores + 1 processes.
+- gevent: cooperative greenlets for many slow clients (needs `pip install gevent`).
+"""
+import os
+import multiprocessing
+
+_cores = multiprocessing.cpu_count()
+_profile = os.getenv('GUNICORN_PROFILE', 'gthread').lower()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+if _profile == 'sync':
+    worker_class = 'sync'
+    workers = int(os.getenv('GUNICORN_WORKERS', 2 * _cores + 1))
+elif _profile == 'gevent':
+    worker_class = 'gevent'
+    workers = int(os.getenv('GUNICORN_WORKERS', _cores))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))
+else:
+    worker_class = 'gthread'
+    workers = int(os.getenv('GUNICORN_WORKERS', _cores + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Import app.py (models, FAQ data, triage queue) once in the master and share
+# the pages copy-on-write with every worker
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in {'1', 'true', 'yes'}
+
+# An LLM answer may take up to LLM_TIMEOUT_SECONDS; leave headroom before the worker is killed
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '90'))
+graceful_timeout = 30
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers periodically to cap slow memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None  # empty string disables it
+errorlog = '-'
+
+
+def when_ready(server):
+    # The memory backend counts per process, so every worker grants the full limit again
+    from rate_limit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED
+    if workers > 1 and RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == 'memory':
+        server.log.warning(f"RATE_LIMIT_BACKEND=memory with {workers} workers: each worker keeps its own "
+                           f"counters, so rate limits are {workers}x looser. Set RATE_LIMIT_BACKEND=sqlite.")
+
+
+def post_fork(server, worker):
+    # With preload_app the master already opened database connections; a child
+    # must not reuse them, so drop the inherited pool without closing the sockets
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from metrics import Gauge, Counter
+
+logger = logging.getLogger(__name__)
+
+LLM_WORKER_ENABLED = os.getenv('LLM_WORKER_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))  # provider calls in flight
+LLM_MAX_PENDING = int(os.getenv('LLM_MAX_PENDING', '64'))  # in flight + waiting; beyond this, fail fast
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+
+LLM_QUEUE_DEPTH = Gauge('docify_llm_queue_depth', 'LLM calls waiting for a concurrency slot')
+LLM_IN_FLIGHT = Gauge('docify_llm_in_flight', 'LLM calls currently running')
+LLM_REJECTED = Counter('docify_llm_rejected_total', 'LLM calls refused because the worker was saturated')
+
+
+class LLMWorkerBusy(RuntimeError):
+    """Raised by submit() when LLM_MAX_PENDING calls are already outstanding"""
+
+
+class LLMWorker:
+    """Runs LLM calls on one asyncio event loop in a background thread.
+
+    Coroutine functions (e.g. async provider SDKs) are awaited directly, so a
+    single thread multiplexes any number of them; blocking callables run on a
+    thread pool sized to the concurrency limit. Web threads only wait on a
+    future, with a timeout, and are refused immediately when the worker is full.
+    """
+
+    def __init__(self, max_concurrency=None, max_pending=None, enabled=None):
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self.max_pending = max_pending or LLM_MAX_PENDING
+        self.enabled = LLM_WORKER_ENABLED if enabled is None else enabled
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Gunicorn's preload_app forks after import; threads don't survive the fork,
+        # so each worker process starts its own loop on first use
+        if self._loop is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='docify-llm'))
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            threading.Thread(target=run, name='docify-llm-loop', daemon=True).start()
+            started.wait()
+            self._loop, self._pid, self._pending = loop, os.getpid(), 0
+
+    async def _run(self, ctx, fn, args, kwargs):
+        LLM_QUEUE_DEPTH.inc()
+        queued = True
+        try:
+            async with self._semaphore:
+                LLM_QUEUE_DEPTH.dec()
+                queued = False
+                LLM_IN_FLIGHT.inc()
+                try:
+                    if asyncio.iscoroutinefunction(fn):
+                        return await ctx.run(asyncio.ensure_future, fn(*args, **kwargs))
+                    call = functools.partial(ctx.run, fn, *args, **kwargs)
+                    return await asyncio.get_running_loop().run_in_executor(None, call)
+                finally:
+                    LLM_IN_FLIGHT.dec()
+        finally:
+            if queued:
+                LLM_QUEUE_DEPTH.dec()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs); returns a concurrent.futures.Future"""
+        self._ensure_started()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                LLM_REJECTED.inc()
+                raise LLMWorkerBusy(f"{self._pending} LLM calls outstanding")
+            self._pending += 1
+        # Carry the caller's context (Flask request/g) so stage timings still reach Server-Timing
+        ctx = contextvars.copy_context()
+        future = asyncio.run_coroutine_threadsafe(self._run(ctx, fn, args, kwargs), self._loop)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def call(self, fn, *args, timeout=None, on_late=None, **kwargs):
+        """Run fn on the worker and wait for it; inline when the worker is disabled.
+
+        When the wait times out, a coroutine call is cancelled; a blocking call
+        can't be, so it is detached and on_late(result) runs if it later succeeds.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(LLM_TIMEOUT_SECONDS if timeout is None else timeout)
+        except FutureTimeout:
+            # Async calls can be cancelled; a blocking call keeps its slot until it returns
+            if asyncio.iscoroutinefunction(fn):
+                future.cancel()
+            elif on_late is not None:
+                future.add_done_callback(functools.partial(_deliver_late, on_late))
+            raise
+
+    def pending(self):
+        return self._pending
+
+
+def _deliver_late(on_late, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        on_late(future.result())
+    except Exception as e:
+        logger.warning(f"Late LLM result handler failed: {e!r}")
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Replay logged chat traffic (query_dataset.csv) against /chatbot.
+
+Targets are either `app` (app.py in-process via Flask's test client) or the
+URL of a running chatbot service, optionally named: `t5=http://127.0.0.1:5001/chatbot`.
+With --fake-llm the in-process app answers through a fake Gemini call with a
+configurable latency, so the whole run works offline. --fake-ollama starts a
+local stand-in for Ollama's /api/generate (model load cost, keep_alive expiry,
+per-token latency, streaming) and routes symptom questions to it.
+
+Run: python load_test.py --target app --fake-llm --concurrency 8 --requests 500 --output results.json
+"""
+import os
+import sys
+import json
+import re
+import math
+import time
+import random
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from query_log import read_queries
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s["latency_ms"] for s in samples)
+    errors = sum(1 for s in samples if not s["ok"])
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+def install_fake_llm(latency_ms, jitter_ms=0.0):
+    """Swap app.py's Gemini engine for a canned answer with a simulated round trip"""
+    import app as app_module
+
+    def fake_process_query5(query, symptoms=None):
+        time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0)
+        return f"[fake-llm] Thanks for asking about: {query[:80]}"
+
+    app_module.process_query5 = fake_process_query5
+    app_module.ADVANCED_MODULES_AVAILABLE = True
+    return app_module
+
+
+def fake_llm_app(latency_ms=200.0, jitter_ms=0.0):
+    """App factory for servers: gunicorn -c gunicorn.conf.py 'load_test:fake_llm_app(300)'"""
+    return install_fake_llm(latency_ms, jitter_ms).app
+
+
+# Same token estimate as context_builder.count_tokens
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _keep_alive_seconds(value):
+    """Ollama keep_alive ('30m', '45s', '1h', seconds, negative = forever) in seconds"""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        seconds = float(text[:-1]) * units[text[-1]] if text and text[-1] in units else float(text or 300)
+    return float('inf') if seconds < 0 else seconds
+
+
+class FakeOllama:
+    """In-process stand-in for Ollama's /api/generate.
+
+    The first request, and any request after keep_alive has expired, pays
+    load_ms to "load the model". Prompt tokens cost prompt_token_ms each and
+    generated tokens token_ms each; generation stops at options.num_predict.
+    Requests without a system prompt get `system` (the Modelfile's). With
+    prefix_cache, like Ollama's runner with one slot, only the prompt tokens
+    after the prefix shared with the previous request are evaluated.
+    Counts connections, loads and requests so callers can check reuse.
+    """
+
+    def __init__(self, load_ms=1500.0, token_ms=5.0, prompt_token_ms=0.05, tokens=60, system='',
+                 prefix_cache=True):
+        self.load_ms = load_ms
+        self.token_ms = token_ms
+        self.prompt_token_ms = prompt_token_ms
+        self.tokens = tokens
+        self.system = system
+        self.prefix_cache = prefix_cache
+        self._cached = []
+        self.connections = 0
+        self.loads = 0
+        self.requests = []
+        self._loaded_until = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._server = None
+
+    def _load(self):
+        # Loads are serialized like Ollama's: requests arriving mid-load wait for it
+        with self._load_lock:
+            cold = time.monotonic() >= self._loaded_until
+            if cold:
+                self.loads += 1
+                time.sleep(self.load_ms / 1000.0)
+            self._loaded_until = float('inf')
+        return cold
+
+    def _release(self, keep_alive):
+        # The model stays loaded keep_alive past the request (0 unloads it right away)
+        with self._load_lock:
+            self._loaded_until = time.monotonic() + keep_alive
+
+    def handle(self, payload, write_chunk):
+        """Serve one /api/generate payload; write_chunk(dict) sends each streamed or final object"""
+        start = time.perf_counter()
+        keep_alive = _keep_alive_seconds(payload.get("keep_alive", "5m"))
+        self.requests.append(payload)
+        cold = self._load()
+        load_ns = int((time.perf_counter() - start) * 1e9)
+        prompt = _TOKEN_RE.findall(f"{payload.get('system', self.system)} {payload.get('prompt', '')}")
+        reused = 0
+        with self._lock:
+            if self.prefix_cache:
+                while reused < min(len(prompt), len(self._cached)) and prompt[reused] == self._cached[reused]:
+                    reused += 1
+            self._cached = prompt
+        # At least one token is always evaluated, even when the whole prompt was cached
+        prompt_tokens = max(1, len(prompt) - reused) if payload.get("prompt") else 0
+        time.sleep(prompt_tokens * self.prompt_token_ms / 1000.0)
+        limit = (payload.get("options") or {}).get("num_predict", self.tokens)
+        count = 0 if not payload.get("prompt") else min(self.tokens, limit if limit >= 0 else self.tokens)
+        stream = payload.get("stream", True)
+        pieces = []
+        for i in range(count):
+            time.sleep(self.token_ms / 1000.0)
+            piece = f"tok{i} "
+            pieces.append(piece)
+            if stream:
+                write_chunk({"model": payload.get("model"), "response": piece, "done": False})
+        self._release(keep_alive)
+        total_ns = int((time.perf_counter() - start) * 1e9)
+        final = {
+            "model": payload.get("model"), "response": "" if stream else "".join(pieces), "done": True,
+            "context": list(range(len(prompt) + count)),
+            "prompt_eval_count": prompt_tokens, "eval_count": count,
+            "load_duration": load_ns if cold else 0,
+            "prompt_eval_duration": int(prompt_tokens * self.prompt_token_ms * 1e6),
+            "eval_duration": int(count * self.token_ms * 1e6), "total_duration": total_ns,
+        }
+        write_chunk(final)
+
+    def start(self, port=0):
+        """Serve on 127.0.0.1 in a daemon thread; returns the base URL"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if payload.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+
+                    def write_chunk(obj):
+                        data = json.dumps(obj).encode() + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    fake.handle(payload, write_chunk)
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    final = []
+                    fake.handle(payload, final.append)
+                    data = json.dumps(final[-1]).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def install_fake_ollama(load_ms=1500.0, token_ms=5.0):
+    """Start a FakeOllama, point the shared Ollama client at it and let the router use the ollama engine"""
+    import app as app_module
+    import ollama_client
+
+    fake = FakeOllama(load_ms=load_ms, token_ms=token_ms)
+    ollama_client.OLLAMA_BASE_URL = fake.start()
+    ollama_client._client = None
+    app_module.ROUTER.enabled.add('ollama')
+    return fake
+
+
+class AppTarget:
+    """Calls app.py's /chatbot in-process; one test client per worker thread"""
+
+    def __init__(self, name="app"):
+        import app as app_module
+        self.name = name
+        self.app = app_module.app
+        # Don't feed replayed traffic back into the log being replayed
+        app_module.QUERY_LOG_PATH = os.devnull
+        # Every in-process client shares 127.0.0.1; the replay would otherwise measure 429s
+        app_module.RATE_LIMITER.enabled = False
+        self._local = threading.local()
+
+    def send(self, query):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.post("/chatbot", json={"message": query})
+        return resp.status_code
+
+
+class HttpTarget:
+    def __init__(self, name, url, timeout):
+        import requests
+        self._requests = requests
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, query):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        try:
+            resp = session.post(self.url, json={"message": query}, timeout=self.timeout)
+            return resp.status_code
+        except self._requests.RequestException:
+            return None
+
+
+def parse_target(spec, timeout):
+    name, sep, url = spec.partition("=")
+    if not sep:
+        name, url = spec, spec
+    if url == "app":
+        return AppTarget(name)
+    return HttpTarget(name, url, timeout)
+
+
+def _arrival_offsets(count, rate, arrival):
+    """Scheduled send times (seconds from start) for open-loop runs"""
+    offsets, t = [], 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += random.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return offsets
+
+
+def run(targets, queries, total, concurrency, rate=None, arrival="constant"):
+    """Replay `total` requests spread round-robin over targets.
+
+    Closed loop (rate=None): `concurrency` workers send back to back.
+    Open loop: requests are released on a constant or Poisson schedule and
+    latency is measured from the scheduled time, so queueing delay caused by
+    a slow server is counted instead of hidden.
+    """
+    jobs = [(targets[i % len(targets)], queries[i % len(queries)]) for i in range(total)]
+    offsets = _arrival_offsets(total, rate, arrival) if rate else None
+    samples = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def fire(index):
+        target, query = jobs[index]
+        scheduled = start + offsets[index] if offsets else time.perf_counter()
+        if offsets:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        status = target.send(query)
+        latency = (time.perf_counter() - scheduled) * 1000.0
+        with lock:
+            samples.append({
+                "engine": target.name,
+                "status": status,
+                "ok": status is not None and status < 400,
+                "latency_ms": round(latency, 3),
+            })
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, range(total)))
+    elapsed = time.perf_counter() - start
+
+    report = summarize(samples, elapsed)
+    report["duration_seconds"] = round(elapsed, 3)
+    report["engines"] = {}
+    for target in targets:
+        engine_samples = [s for s in samples if s["engine"] == target.name]
+        report["engines"][target.name] = summarize(engine_samples, elapsed)
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay query_dataset.csv against chatbot endpoints")
+    parser.add_argument("--queries", default="query_dataset.csv")
+    parser.add_argument("--target", action="append",
+                        help="'app', a URL, or name=URL; repeat for several engines (default: app)")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate (req/s)")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--timeout", type=float, default=30.0, help="HTTP timeout per request")
+    parser.add_argument("--fake-llm", action="store_true", help="Answer in-process requests with a fake LLM")
+    parser.add_argument("--fake-latency-ms", type=float, default=200.0)
+    parser.add_argument("--fake-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--fake-ollama", action="store_true",
+                        help="Serve the in-process ollama engine from a local fake Ollama server")
+    parser.add_argument("--fake-ollama-load-ms", type=float, default=1500.0)
+    parser.add_argument("--fake-ollama-token-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    queries, _ = read_queries(args.queries)
+    if not queries:
+        raise SystemExit(f"No queries found in {args.queries}")
+    if args.fake_llm:
+        install_fake_llm(args.fake_latency_ms, args.fake_jitter_ms)
+    fake_ollama = install_fake_ollama(args.fake_ollama_load_ms, args.fake_ollama_token_ms) if args.fake_ollama else None
+    targets = [parse_target(spec, args.timeout) for spec in (args.target or ["app"])]
+
+    report = run(targets, queries, args.requests, args.concurrency, args.rate, args.arrival)
+    report["config"] = {
+        "queries_file": args.queries,
+        "distinct_queries": len(set(queries)),
+        "targets": args.target or ["app"],
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "arrival": args.arrival if args.rate else "closed-loop",
+        "fake_llm": args.fake_llm,
+        "fake_latency_ms": args.fake_latency_ms if args.fake_llm else None,
+        "fake_ollama": {"connections": fake_ollama.connections, "model_loads": fake_ollama.loads,
+                        "requests": len(fake_ollama.requests)} if fake_ollama else None,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Precompute answers for the most frequent questions in the chat log.
+
+Logged queries are normalized and clustered: identical normalized text first,
+then token overlap, and optionally MiniLM cosine similarity (--embed). The
+top-N clusters get one canonical answer each, generated once. Every phrasing
+seen in those clusters is written to a lookup file that app.py loads read-only
+at startup.
+
+  python materialize_answers.py --top 50            # offline, incremental
+  python materialize_answers.py --top 50 --embed    # also merge paraphrases by embedding
+
+The job stores its log offset and clusters in the output file, so a rerun only
+reads chat messages logged since the previous run and only generates answers
+for clusters that don't have one yet, or whose answer is older than
+--max-age-days (--regenerate refreshes them all). A cluster whose answer
+can't be generated (Gemini missing or failing, or only the generic fallback)
+is left unanswered rather than storing canned text.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from types import MappingProxyType
+
+from query_log import QUERY_LOG_PATH, normalize_query, read_queries
+
+MATERIALIZED_ANSWERS_ENABLED = os.getenv('MATERIALIZED_ANSWERS_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+MATERIALIZED_ANSWERS_PATH = os.getenv('MATERIALIZED_ANSWERS_PATH', 'materialized_answers.json')
+# Token-set Jaccard at or above which two phrasings are treated as the same question
+LEXICAL_THRESHOLD = 0.75
+# MiniLM cosine at or above which two phrasings are treated as the same question
+EMBEDDING_THRESHOLD = 0.88
+# Answers older than this are regenerated on the next run
+MATERIALIZED_ANSWERS_MAX_AGE_DAYS = float(os.getenv('MATERIALIZED_ANSWERS_MAX_AGE_DAYS', '7'))
+# "should I take aspirin" and "should I not take aspirin" are different questions
+NEGATIONS = frozenset(('not', 'no', 'never', 'without'))
+FORMAT_VERSION = 1
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class QueryClusters:
+    """Incremental leader clustering of normalized queries"""
+
+    def __init__(self, clusters=None, embedder=None):
+        from faq_fastpath import tokenize
+        self._tokenize = tokenize
+        self.clusters = clusters or []
+        self.embedder = embedder
+        self._member_index = {m: c for c in self.clusters for m in c["members"]}
+        self._tokens = [set(tokenize(c["canonical"])) for c in self.clusters]
+
+    def add(self, queries):
+        """Fold raw queries into the clusters; returns the number of new clusters"""
+        counts = {}
+        for query in queries:
+            key = normalize_query(query)
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+        unseen = [q for q in sorted(counts, key=counts.get, reverse=True) if q not in self._member_index]
+        vectors = dict(zip(unseen, self.embedder.embed_documents(unseen))) if self.embedder and unseen else {}
+        created = 0
+        for query, count in sorted(counts.items(), key=lambda item: -item[1]):
+            cluster = self._member_index.get(query)
+            if cluster is None:
+                cluster = self._nearest(query, vectors.get(query))
+                if cluster is None:
+                    cluster = {"canonical": query, "count": 0, "members": {}, "answer": None}
+                    self.clusters.append(cluster)
+                    self._tokens.append(set(self._tokenize(query)))
+                    created += 1
+                self._member_index[query] = cluster
+                if query in vectors:
+                    self._update_centroid(cluster, vectors[query])
+            cluster["members"][query] = cluster["members"].get(query, 0) + count
+            cluster["count"] += count
+            # The most frequent phrasing names the cluster
+            if cluster["members"][query] > cluster["members"].get(cluster["canonical"], 0):
+                cluster["canonical"] = query
+        return created
+
+    def _nearest(self, query, vector):
+        tokens = set(self._tokenize(query))
+        negations = tokens & NEGATIONS
+        best, best_score = None, LEXICAL_THRESHOLD
+        for cluster, cluster_tokens in zip(self.clusters, self._tokens):
+            if cluster_tokens & NEGATIONS != negations:
+                continue
+            score = _jaccard(tokens, cluster_tokens)
+            if score >= best_score:
+                best, best_score = cluster, score
+        if best is not None or vector is None:
+            return best
+        best_score = EMBEDDING_THRESHOLD
+        for cluster, cluster_tokens in zip(self.clusters, self._tokens):
+            # Embeddings barely separate a question from its negation
+            if cluster.get("centroid") and cluster_tokens & NEGATIONS == negations:
+                score = _cosine(vector, cluster["centroid"])
+                if score >= best_score:
+                    best, best_score = cluster, score
+        return best
+
+    @staticmethod
+    def _update_centroid(cluster, vector):
+        centroid = cluster.get("centroid")
+        n = cluster.get("embedded", 0)
+        if centroid is None:
+            cluster["centroid"] = [round(float(x), 6) for x in vector]
+        else:
+            cluster["centroid"] = [round((c * n + float(x)) / (n + 1), 6) for c, x in zip(centroid, vector)]
+        cluster["embedded"] = n + 1
+
+    def ranked(self):
+        return sorted(self.clusters, key=lambda c: -c["count"])
+
+
+def default_answerer(engine):
+    """Answer generator for the offline job; returns None (or raises) when it has no real answer"""
+    from evaluate_different_modules import get_simple_faq_response, process_query5
+
+    if engine == "faq":
+        generic = get_simple_faq_response("")
+
+        def answer(query):
+            # The keyword fallback's catch-all reply is not an answer to this question
+            reply = get_simple_faq_response(query)
+            return None if reply == generic else reply
+        return answer
+    # Gemini raises when it is not configured or fails; the cluster is then skipped
+    return process_query5
+
+
+def _stale(cluster, max_age, now):
+    return max_age is not None and now - cluster.get("answered_at", 0) > max_age
+
+
+def materialize(log_path, output_path, top_n, answer_fn, embedder=None, skip=None, min_count=2,
+                max_age=None, regenerate=False, now=None):
+    """One incremental run: read new log lines, update clusters, answer the top-N, write the lookup file.
+
+    Answers older than max_age seconds (or all, with regenerate) are generated
+    again; if that fails the previous answer is kept.
+    """
+    now = time.time() if now is None else now
+    state = {}
+    if os.path.exists(output_path):
+        with open(output_path, encoding='utf-8') as file:
+            state = json.load(file)
+    offset = state.get("offset", 0) if state.get("log_path") == os.path.abspath(log_path) else 0
+    if os.path.exists(log_path) and os.path.getsize(log_path) < offset:
+        offset = 0  # the log was rotated or truncated
+
+    clusters = QueryClusters(state.get("clusters", []), embedder)
+    queries, end = read_queries(log_path, offset)
+    created = clusters.add(queries)
+
+    generated = failed = 0
+    answers = {}
+    answered = 0
+    for cluster in clusters.ranked():
+        if answered >= top_n or cluster["count"] < min_count:
+            break
+        if skip is not None and skip(cluster["canonical"]):
+            continue
+        answered += 1
+        if not cluster.get("answer") or regenerate or _stale(cluster, max_age, now):
+            try:
+                answer = answer_fn(cluster["canonical"])
+            except Exception as e:
+                print(f"Warning: no answer for {cluster['canonical']!r}: {e}")
+                answer = None
+            if answer:
+                cluster["answer"], cluster["answered_at"] = answer, now
+                generated += 1
+            else:
+                failed += 1
+        if cluster.get("answer"):
+            for member in cluster["members"]:
+                answers[member] = cluster["answer"]
+
+    state = {
+        "version": FORMAT_VERSION,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "log_path": os.path.abspath(log_path),
+        "offset": end,
+        "answers": answers,
+        "clusters": clusters.clusters,
+    }
+    tmp = f"{output_path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(tmp, output_path)
+    return {
+        "new_queries": len(queries),
+        "new_clusters": created,
+        "clusters": len(clusters.clusters),
+        "answers_generated": generated,
+        "answers_failed": failed,
+        "phrasings_served": len(answers),
+        "offset": end,
+    }
+
+
+def load_answers(path=None):
+    """Read-only normalized-query -> answer mapping; empty when disabled or not yet built"""
+    path = path or MATERIALIZED_ANSWERS_PATH
+    if not MATERIALIZED_ANSWERS_ENABLED or not os.path.exists(path):
+        return MappingProxyType({})
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: could not load materialized answers from {path}: {e}")
+        return MappingProxyType({})
+    return MappingProxyType(dict(data.get("answers", {})))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute answers for the most frequent logged questions")
+    parser.add_argument("--log", default=QUERY_LOG_PATH)
+    parser.add_argument("--output", default=MATERIALIZED_ANSWERS_PATH)
+    parser.add_argument("--top", type=int, default=50, help="Number of clusters to answer")
+    parser.add_argument("--min-count", type=int, default=2, help="Ignore questions asked fewer times than this")
+    parser.add_argument("--engine", choices=["gemini", "faq"], default="gemini")
+    parser.add_argument("--embed", action="store_true", help="Also cluster by MiniLM embeddings (full ML stack)")
+    parser.add_argument("--max-age-days", type=float, default=MATERIALIZED_ANSWERS_MAX_AGE_DAYS,
+                        help="Regenerate answers older than this (0 = never)")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate every answer in the top-N")
+    args = parser.parse_args(argv)
+
+    embedder = None
+    if args.embed:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from vector_creator import EMBEDDING_MODEL_NAME
+        embedder = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={"device": "cpu"})
+
+    from faq_fastpath import fast_answer
+    start = time.perf_counter()
+    # Questions the FAQ fast path already answers need no stored copy
+    result = materialize(args.log, args.output, args.top, default_answerer(args.engine), embedder,
+                         skip=lambda q: fast_answer(q) is not None, min_count=args.min_count,
+                         max_age=args.max_age_days * 86400 if args.max_age_days else None,
+                         regenerate=args.regenerate)
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    from flask import g, has_request_context, request
+    FLASK_AVAILABLE = True
+except ImportError:
+    FLASK_AVAILABLE = False
+
+# Prometheus default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Minimal thread-safe Prometheus histogram keyed by label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(float(bound))))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return "\n".join(lines)
+
+
+class Gauge:
+    """Thread-safe Prometheus gauge keyed by label values"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # An unlabelled series is exported as 0 from the start rather than missing
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Gauge):
+    kind = 'counter'
+
+
+REQUEST_SECONDS = Histogram('docify_request_duration_seconds',
+                            'End-to-end request latency by endpoint', ['endpoint'])
+STAGE_SECONDS = Histogram('docify_stage_duration_seconds',
+                          'Latency of individual request stages', ['endpoint', 'stage'])
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def _endpoint():
+    if FLASK_AVAILABLE and has_request_context():
+        return request.endpoint or "unknown"
+    return "offline"
+
+
+def record_stage(name, seconds):
+    """Record a stage duration in the histogram and, inside a request, for Server-Timing"""
+    STAGE_SECONDS.observe(seconds, endpoint=_endpoint(), stage=name)
+    if FLASK_AVAILABLE and has_request_context():
+        timings = g.setdefault('stage_timings', [])
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time a block of code as a named stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+
+
+def finish_request(response):
+    """Observe total latency and attach a Server-Timing header to the response"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    REQUEST_SECONDS.observe(total, endpoint=request.endpoint or "unknown")
+    if SERVER_TIMING_ENABLED:
+        merged = {}
+        for name, seconds in g.get('stage_timings', []):
+            merged[name] = merged.get(name, 0.0) + seconds
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        response.headers['Server-Timing'] = ", ".join(parts)
+    return response
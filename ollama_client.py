@@ -0,0 +1,140 @@
+import os
+import json
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from router import parse_rules
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'docify')  # built from model_file.py: `ollama create docify -f ...`
+# How long Ollama keeps the model in memory after a request; each request renews it
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv('OLLAMA_TIMEOUT_SECONDS', '120'))
+OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', os.getenv('LLM_MAX_CONCURRENCY', '16')))
+# Generated-token cap per router intent (router.classify); short intents get short answers
+OLLAMA_NUM_PREDICT = os.getenv('OLLAMA_NUM_PREDICT', 'greeting=32;off_topic=64;platform_faq=128;symptom=256')
+OLLAMA_DEFAULT_NUM_PREDICT = 192
+
+
+def num_predict_for(intent):
+    """Token cap for an intent from OLLAMA_NUM_PREDICT"""
+    return parse_rules(OLLAMA_NUM_PREDICT, int).get(intent, OLLAMA_DEFAULT_NUM_PREDICT)
+
+
+def _ns_to_ms(value):
+    return round(value / 1e6, 1) if value else 0.0
+
+
+class OllamaClient:
+    """Thin client for Ollama's /api/generate that keeps its connections and the model warm.
+
+    One requests.Session (with a connection pool sized to the LLM concurrency
+    limit) is shared by all callers, and every request passes keep_alive so
+    the model stays resident between requests instead of reloading.
+    """
+
+    def __init__(self, base_url=None, model=None, keep_alive=None, timeout=None, pool_size=None):
+        self.base_url = (base_url or OLLAMA_BASE_URL).rstrip('/')
+        self.model = model or OLLAMA_MODEL
+        self.keep_alive = OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+        self.timeout = timeout or OLLAMA_TIMEOUT_SECONDS
+        self.session = requests.Session()
+        self._pid = os.getpid()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or OLLAMA_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _payload(self, prompt, system, num_predict, options, context, stream):
+        payload = {"model": self.model, "prompt": prompt, "stream": stream, "keep_alive": self.keep_alive}
+        if system is not None:
+            payload["system"] = system
+        if context:
+            payload["context"] = context
+        merged = dict(options or {})
+        if num_predict is not None:
+            merged["num_predict"] = num_predict
+        if merged:
+            payload["options"] = merged
+        return payload
+
+    @staticmethod
+    def _result(text, final):
+        return {
+            "text": text,
+            "context": final.get("context"),
+            "prompt_tokens": final.get("prompt_eval_count", 0),
+            "completion_tokens": final.get("eval_count", 0),
+            "load_ms": _ns_to_ms(final.get("load_duration")),
+            "prompt_eval_ms": _ns_to_ms(final.get("prompt_eval_duration")),
+            "eval_ms": _ns_to_ms(final.get("eval_duration")),
+            "total_ms": _ns_to_ms(final.get("total_duration")),
+        }
+
+    def _chunks(self, payload):
+        with self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout,
+                               stream=True) as response:
+            response.raise_for_status()
+            # Read to the end of the body (not just the done chunk) so the connection goes back to the pool
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def generate(self, prompt, system=None, num_predict=None, options=None, context=None, on_token=None):
+        """Run one generation; returns a dict with the text, Ollama's context and timing stats.
+
+        With on_token the response is streamed and on_token(piece) is called as
+        each piece arrives; the return value is the same either way.
+        """
+        if on_token is None:
+            payload = self._payload(prompt, system, num_predict, options, context, False)
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            final = response.json()
+            return self._result(final.get("response", ""), final)
+        pieces, final = [], {}
+        for chunk in self._chunks(self._payload(prompt, system, num_predict, options, context, True)):
+            if chunk.get("response"):
+                pieces.append(chunk["response"])
+                on_token(chunk["response"])
+            if chunk.get("done"):
+                final = chunk
+        return self._result("".join(pieces), final)
+
+    def stream(self, prompt, system=None, num_predict=None, options=None, context=None):
+        """Yield response pieces as Ollama produces them (for streaming HTTP responses)"""
+        for chunk in self._chunks(self._payload(prompt, system, num_predict, options, context, True)):
+            if chunk.get("response"):
+                yield chunk["response"]
+
+    def warm(self):
+        """Load the model now (an empty prompt only loads it) so the first user request doesn't pay for it"""
+        try:
+            self.session.post(f"{self.base_url}/api/generate",
+                              json={"model": self.model, "keep_alive": self.keep_alive},
+                              timeout=self.timeout).raise_for_status()
+            return True
+        except requests.RequestException as e:
+            logger.warning(f"Could not preload Ollama model {self.model}: {e}")
+            return False
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client; built per process so forked gunicorn workers don't share sockets"""
+    global _client
+    if _client is None or _client._pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client._pid != os.getpid():
+                _client = OllamaClient()
+    return _client
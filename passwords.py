@@ -0,0 +1,116 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+# Werkzeug method string: "pbkdf2:sha256[:iterations]" or the memory-hard "scrypt[:n:r:p]"
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+PASSWORD_HASH_POOL = os.getenv('PASSWORD_HASH_POOL', 'thread').lower()  # thread | process
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '0')) or (os.cpu_count() or 1)
+# Hash/verify jobs allowed to wait for a worker before callers get PasswordHasherBusy
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '64'))
+PASSWORD_HASH_WAIT = float(os.getenv('PASSWORD_HASH_WAIT', '10'))
+# Retry-After (seconds) sent with the 503 when the pool is saturated
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', '5'))
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the hashing pool is saturated for longer than PASSWORD_HASH_WAIT"""
+
+
+def _method_prefix(stored):
+    return stored.split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Runs Werkzeug hashing on a bounded pool so bursts queue instead of pinning request threads.
+
+    pbkdf2 and scrypt release the GIL inside hashlib, so a thread pool scales
+    across cores; `pool='process'` is there for interpreters where they don't.
+    """
+
+    def __init__(self, method=None, workers=None, pool=None, queue_size=None, wait=None):
+        self.method = method or PASSWORD_HASH_METHOD
+        self.workers = workers or PASSWORD_HASH_WORKERS
+        self.pool_kind = (pool or PASSWORD_HASH_POOL).lower()
+        self.wait = PASSWORD_HASH_WAIT if wait is None else wait
+        self._slots = threading.BoundedSemaphore(self.workers + (PASSWORD_HASH_QUEUE if queue_size is None else queue_size))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._prefix = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    executor_cls = ProcessPoolExecutor if self.pool_kind == 'process' else ThreadPoolExecutor
+                    kwargs = {} if self.pool_kind == 'process' else {'thread_name_prefix': 'docify-hash'}
+                    self._executor = executor_cls(max_workers=self.workers, **kwargs)
+        return self._executor
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.wait):
+            raise PasswordHasherBusy("Password hashing pool is saturated")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    # Futures, for callers that want to overlap hashing with other work
+    def submit_hash(self, password):
+        return self._submit(generate_password_hash, password, self.method)
+
+    def submit_verify(self, stored, password):
+        return self._submit(check_password_hash, stored, password)
+
+    # Blocking helpers used by the sync Flask views
+    def hash(self, password):
+        return self.submit_hash(password).result()
+
+    def verify(self, stored, password):
+        return self.submit_verify(stored, password).result()
+
+    # Awaitables for async deployments; the event loop is never blocked on the hash
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self.submit_hash(password))
+
+    async def verify_async(self, stored, password):
+        return await asyncio.wrap_future(self.submit_verify(stored, password))
+
+    def current_prefix(self):
+        """Method string with Werkzeug's defaults filled in, e.g. 'pbkdf2:sha256:1000000'"""
+        if self._prefix is None:
+            # Werkzeug only exposes its default cost through a generated hash; pay for it once
+            self._prefix = _method_prefix(generate_password_hash('', self.method))
+        return self._prefix
+
+    def needs_rehash(self, stored):
+        return _method_prefix(stored) != self.current_prefix()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+HASHER = PasswordHasher()
+
+
+def hash_password(password):
+    return HASHER.hash(password)
+
+
+def verify_password(stored, password):
+    return HASHER.verify(stored, password)
+
+
+def needs_rehash(stored):
+    return HASHER.needs_rehash(stored)
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# A request is profiled only when it sends PROFILE_HEADER and either the header
+# value matches PROFILE_TOKEN or the client IP is in PROFILE_ALLOWED_IPS.
+PROFILE_HEADER = 'X-Docify-Profile'
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_ALLOWED_IPS = [ip for ip in os.getenv('PROFILE_ALLOWED_IPS', '').split(',') if ip]
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')  # sample | cprofile
+PROFILE_DIR = os.getenv('PROFILE_DIR')  # defaults to <instance>/profiles
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000.0
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and aggregates folded stacks.
+
+    The output is the "folded" format (`frame;frame;frame count`) read by
+    flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id, interval=None):
+        self.thread_id = thread_id
+        self.interval = interval or PROFILE_INTERVAL
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docify-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+# cProfile hooks the whole interpreter on Python 3.12+ (a second enable() raises
+# ValueError), so only one cProfile session runs at a time
+_cprofile_lock = threading.Lock()
+
+
+class CProfileSession:
+    def __init__(self, thread_id=None):
+        self.profiler = cProfile.Profile()
+        self._running = False
+
+    def start(self):
+        if not _cprofile_lock.acquire(blocking=False):
+            raise RuntimeError("another cProfile session is running")
+        try:
+            self.profiler.enable()
+        except BaseException:
+            _cprofile_lock.release()
+            raise
+        self._running = True
+
+    def stop(self):
+        """Disable the profiler and free the lock; later calls do nothing"""
+        if not self._running:
+            return
+        self._running = False
+        try:
+            self.profiler.disable()
+        finally:
+            _cprofile_lock.release()
+
+    def dump(self, path):
+        self.profiler.dump_stats(path)
+
+
+def wants_profile(headers, client_ip, is_ip_allowed):
+    """Cheap gate evaluated on every request; a header lookup when profiling is not requested"""
+    value = headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    if PROFILE_TOKEN and value == PROFILE_TOKEN:
+        return True
+    return bool(PROFILE_ALLOWED_IPS) and is_ip_allowed(client_ip, PROFILE_ALLOWED_IPS)
+
+
+def start_profile(mode=None):
+    """Started profiling session, or None when one can't start (the request is then served unprofiled)"""
+    mode = mode or PROFILE_MODE
+    session_cls = CProfileSession if mode == 'cprofile' else StackSampler
+    session = session_cls(threading.get_ident())
+    try:
+        session.start()
+    except (RuntimeError, ValueError) as e:
+        logger.info(f"Serving request without a profile: {e}")
+        return None
+    return session
+
+
+def _enforce_retention(directory, max_files):
+    files = [os.path.join(directory, name) for name in os.listdir(directory)
+             if name.endswith(('.folded', '.prof'))]
+    files.sort(key=os.path.getmtime)
+    for path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def finish_profile(session, directory, label):
+    """Stop the profiler, write its output and prune old files; returns the file name"""
+    session.stop()
+    os.makedirs(directory, exist_ok=True)
+    suffix = '.prof' if isinstance(session, CProfileSession) else '.folded'
+    safe_label = "".join(c if c.isalnum() or c in '-_' else '_' for c in label)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{safe_label}{suffix}"
+    try:
+        session.dump(os.path.join(directory, name))
+        _enforce_retention(directory, PROFILE_MAX_FILES)
+    except OSError as e:
+        logger.warning(f"Could not write profile {name}: {e}")
+        return None
+    logger.info(f"Profile written to {name}")
+    return name
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compile the Modelfile's SYSTEM prompt (model_file.py) into the one sent per request.
+
+The Modelfile embeds all 15 FAQ entries, and a copy of the RAG template
+({context}, {question}, {symptoms_section}) that Ollama never fills in, in
+its SYSTEM prompt. When retrieval already puts the relevant FAQ chunks in
+the prompt, the embedded FAQ is dead weight the model re-reads on every
+request. The compiled prompt keeps the instructions and format rules, drops
+the unfilled template, and drops the FAQ unless no context was retrieved.
+
+The compiled prompt is identical from request to request and comes first,
+so Ollama's runner reuses its KV cache for it instead of evaluating it again.
+
+  python prompt_compiler.py                           # token counts, full vs compiled
+  python prompt_compiler.py --output Modelfile.docify # Modelfile with the compiled SYSTEM
+  ollama create docify -f Modelfile.docify
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+from context_builder import count_tokens
+
+PROMPT_COMPILER_ENABLED = os.getenv('PROMPT_COMPILER_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+MODELFILE_PATH = os.getenv('MODELFILE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_file.py'))
+
+_SYSTEM_RE = re.compile(r'^SYSTEM\s+"""(.*?)"""', re.S | re.M)
+# The embedded FAQ runs from "faq =1." up to the template copy
+_FAQ_RE = re.compile(r'^faq\s*=\s*1\..*?(?=^FAQ Context:|\Z)', re.S | re.M | re.I)
+# The RAG template copy; per-request data belongs in the prompt, not the system prompt
+_SLOTS_RE = re.compile(r'^FAQ Context:.*?\{symptoms_section\}[ \t]*\n?', re.S | re.M)
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+_cache = {}
+
+
+def read_system(text):
+    """The SYSTEM prompt of a Modelfile, or '' when it has none"""
+    match = _SYSTEM_RE.search(text)
+    return match.group(1).strip() if match else ''
+
+
+def compile_system(system, has_context=True):
+    """Per-request system prompt: no unfilled template, and no embedded FAQ when context is retrieved"""
+    if has_context:
+        system = _FAQ_RE.sub('', system)
+    system = _SLOTS_RE.sub('', system)
+    return _BLANK_LINES_RE.sub('\n\n', system).strip()
+
+
+def compile_modelfile(text, has_context=True):
+    """The Modelfile with its SYSTEM prompt replaced by the compiled one"""
+    system = compile_system(read_system(text), has_context)
+    return _SYSTEM_RE.sub(lambda _: f'SYSTEM """\n{system}\n"""', text, count=1)
+
+
+def system_prompt(has_context=True, path=None):
+    """Compiled SYSTEM prompt of the Modelfile, read once; None when disabled or the file is missing.
+
+    The same string is returned on every call, so the prompt prefix stays
+    byte-identical and cacheable.
+    """
+    if not PROMPT_COMPILER_ENABLED:
+        return None
+    key = (path or MODELFILE_PATH, has_context)
+    if key not in _cache:
+        try:
+            with open(key[0], encoding='utf-8') as file:
+                _cache[key] = compile_system(read_system(file.read()), has_context) or None
+        except OSError:
+            _cache[key] = None
+    return _cache[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the Modelfile SYSTEM prompt for retrieval-backed requests")
+    parser.add_argument("--modelfile", default=MODELFILE_PATH)
+    parser.add_argument("--keep-faq", action="store_true", help="Keep the embedded FAQ (no retrieval)")
+    parser.add_argument("--output", help="Write a Modelfile with the compiled SYSTEM prompt here")
+    args = parser.parse_args(argv)
+
+    with open(args.modelfile, encoding='utf-8') as file:
+        text = file.read()
+    full = read_system(text)
+    compiled = compile_system(full, has_context=not args.keep_faq)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(compile_modelfile(text, has_context=not args.keep_faq))
+    result = {
+        "system_tokens": count_tokens(full),
+        "compiled_tokens": count_tokens(compiled),
+        "system_chars": len(full),
+        "compiled_chars": len(compiled),
+        "output": args.output,
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,31 @@
+import os
+import re
+
+# app.py appends one chat message per line to this file (newlines flattened)
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', 'query_dataset.csv')
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    """Canonical form used as a cache/coalescing key: lowercase, single spaces, no trailing punctuation"""
+    text = _SPACE_RE.sub(" ", (text or "").lower()).strip()
+    return text.rstrip("?!. ")
+
+
+def read_queries(path=None, offset=0):
+    """Return (queries, end_offset) for the log lines written after byte `offset`.
+
+    Passing the returned offset back in reads only new traffic, which lets
+    offline jobs process the log incrementally.
+    """
+    path = path or QUERY_LOG_PATH
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        data = file.read()
+    # Ignore a trailing partial line that is still being written
+    cut = data.rfind(b"\n") + 1
+    lines = data[:cut].decode('utf-8', errors='ignore').splitlines()
+    return [line.strip() for line in lines if line.strip()], offset + cut
@@ -0,0 +1,141 @@
+import os
+import math
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()  # memory | sqlite
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH')  # defaults to <instance>/ratelimit.db
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+# endpoint=requests/seconds, applied separately to the client IP and to the user;
+# login_failed counts only failed logins, per account and client
+RATE_LIMITS = os.getenv('RATE_LIMITS', 'login=10/60,login_failed=5/300,register=5/60,chatbot=30/60')
+
+
+def parse_limits(spec):
+    """'login=10/60,chatbot=30/60' -> {'login': (10, 60.0), 'chatbot': (30, 60.0)}"""
+    limits = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        endpoint, _, rule = item.partition('=')
+        count, _, seconds = rule.partition('/')
+        limits[endpoint.strip()] = (int(count), float(seconds or 60))
+    return limits
+
+
+class MemoryBucketStore:
+    """Token buckets in a bounded LRU dict: key -> [tokens, last refill time]"""
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or RATE_LIMIT_MAX_KEYS
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, keys, capacity, rate, now, consume=True):
+        with self._lock:
+            buckets = []
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = [float(capacity), now]
+                    if len(self._buckets) > self.max_keys:
+                        # The oldest idle key has refilled long ago; forgetting it loses nothing
+                        self._buckets.popitem(last=False)
+                else:
+                    self._buckets.move_to_end(key)
+                buckets.append(bucket)
+            return _take_all(buckets, capacity, rate, now, consume)
+
+
+class SQLiteBucketStore:
+    """Buckets shared by all workers on a host through one WAL-mode SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread, and never one inherited from a pre-fork parent
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def take(self, keys, capacity, rate, now, consume=True):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            buckets = []
+            for key in keys:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                buckets.append([float(capacity), now] if row is None else list(row))
+            result = _take_all(buckets, capacity, rate, now, consume)
+            conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                             [(key, b[0], b[1]) for key, b in zip(keys, buckets)])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+
+def _take_all(buckets, capacity, rate, now, consume=True):
+    """Refill `buckets` in place and, only if every one has a token, take one from each.
+
+    Returns seconds to wait, 0 when allowed. A rejected request costs no
+    tokens, so one exhausted key doesn't drain the others.
+    """
+    wait = 0.0
+    for bucket in buckets:
+        bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            wait = max(wait, (1.0 - bucket[0]) / rate)
+    if consume and wait == 0.0:
+        for bucket in buckets:
+            bucket[0] -= 1.0
+    return wait
+
+
+class RateLimiter:
+    def __init__(self, store=None, limits=None, enabled=None):
+        self.store = store or MemoryBucketStore()
+        self.limits = parse_limits(RATE_LIMITS) if limits is None else limits
+        self.enabled = RATE_LIMIT_ENABLED if enabled is None else enabled
+
+    def check(self, endpoint, keys, now=None, consume=True):
+        """Take a token for each key under the endpoint's limit, if all of them have one.
+
+        Returns None when the request may proceed, otherwise the number of
+        seconds (rounded up) the client should wait before retrying. With
+        consume=False the buckets are only checked.
+        """
+        if not self.enabled or endpoint not in self.limits:
+            return None
+        keys = [f"{endpoint}:{key}" for key in keys if key]
+        if not keys:
+            return None
+        count, seconds = self.limits[endpoint]
+        now = time.time() if now is None else now
+        wait = self.store.take(keys, count, count / seconds, now, consume)
+        return math.ceil(wait) if wait > 0 else None
+
+
+def create_limiter(instance_path, backend=None):
+    backend = (backend or RATE_LIMIT_BACKEND).lower()
+    if backend == 'sqlite':
+        path = RATE_LIMIT_SQLITE_PATH or os.path.join(instance_path, 'ratelimit.db')
+        return RateLimiter(SQLiteBucketStore(path))
+    if backend != 'memory':
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return RateLimiter(MemoryBucketStore())
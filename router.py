@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import logging
+import threading
+
+from metrics import Counter, Histogram, stage
+
+logger = logging.getLogger(__name__)
+
+# general: nothing matched either way, so it may still be a health question the keyword lists miss
+INTENTS = ('greeting', 'platform_faq', 'symptom', 'general', 'off_topic')
+
+# Engines allowed to serve traffic; local-model engines need their own infrastructure
+# (Ollama server, GPU, LoRA weights) and are opt-in
+ROUTER_ENGINES = [e for e in os.getenv('ROUTER_ENGINES', 'faq_fallback,retrieval,gemini').split(',') if e]
+# intent=engine,engine,...: the engines good enough for each intent; they are tried cheapest first
+ROUTER_POLICY = os.getenv(
+    'ROUTER_POLICY',
+    'greeting=faq_fallback;off_topic=faq_fallback;platform_faq=gemini;symptom=ollama,lora_t5,gemini;general=gemini')
+# Last resort after every policy engine failed or was skipped; not subject to budgets
+ROUTER_FALLBACK = os.getenv('ROUTER_FALLBACK', 'faq_fallback')
+# intent=milliseconds and intent=cost units; engines over either budget are skipped for that intent
+ROUTER_LATENCY_BUDGETS = os.getenv('ROUTER_LATENCY_BUDGETS',
+                                   'greeting=100;off_topic=100;platform_faq=5000;symptom=15000;general=5000')
+ROUTER_COST_BUDGETS = os.getenv('ROUTER_COST_BUDGETS', 'greeting=0;off_topic=0;platform_faq=3;symptom=3;general=3')
+ROUTER_FAILURES_BEFORE_COOLDOWN = int(os.getenv('ROUTER_FAILURES_BEFORE_COOLDOWN', '3'))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv('ROUTER_COOLDOWN_SECONDS', '30'))
+
+ROUTE_DECISIONS = Counter('docify_router_decisions_total', 'Chatbot queries by intent and answering engine',
+                          ['intent', 'engine'])
+ENGINE_FAILURES = Counter('docify_router_engine_failures_total', 'Engine calls that raised or returned nothing',
+                          ['engine'])
+ENGINE_SECONDS = Histogram('docify_router_engine_seconds', 'Latency of each engine call', ['engine'])
+
+_GREETING_RE = re.compile(r"^\s*(hi+|hello+|hey+|hiya|yo|namaste|good (morning|afternoon|evening|night)|"
+                          r"thanks?( you)?|thank u|ok(ay)?|bye|goodbye|how are you)\b[\s!.?,]*", re.I)
+_WORD_RE = re.compile(r"[a-z0-9']+")
+PLATFORM_TERMS = frozenset("""
+docify platform website site account login log register sign password email dashboard form forms submit
+submission certificate certificates consultation consultations appointment book booking doctor doctors
+fee fees cost price charge charges refund cancel invoice insurance prescription prescriptions support
+contact data privacy secure safe app available availability reply response specialist
+""".split())
+SYMPTOM_TERMS = frozenset("""
+pain ache aches aching hurts hurt hurting fever temperature cough coughing cold flu headache migraine
+sore throat rash itch itchy itching vomit vomiting nausea diarrhea diarrhoea motion dizzy dizziness
+bleeding blood breath breathing wheezing swelling swollen infection burn fatigue tired weakness weak
+sick unwell ill anxious anxiety depressed depression stress insomnia sleep chest stomach back joint
+knee acidity gas constipation allergy allergic diabetes sugar thyroid asthma pregnant pregnancy period
+periods urine urinating symptom symptoms
+""".split())
+# Positive evidence that a query has nothing to do with health or the platform
+OFF_TOPIC_TERMS = frozenset("""
+cricket football soccer match score ipl movie movies film song songs music lyrics weather capital president
+election politics recipe joke jokes game games stock stocks bitcoin crypto celebrity actor actress homework
+""".split())
+
+
+def parse_rules(spec, convert):
+    """'key=value;key=value' -> {key: convert(value)}"""
+    rules = {}
+    for item in spec.split(';'):
+        key, _, value = item.strip().partition('=')
+        if key and value:
+            rules[key.strip()] = convert(value.strip())
+    return rules
+
+
+def classify(query, faq_score=0.0):
+    """Cheap local intent classifier: greeting, platform_faq, symptom or off_topic"""
+    text = (query or '').lower()
+    words = _WORD_RE.findall(text)
+    if _GREETING_RE.match(text) and len(words) <= 5:
+        return 'greeting'
+    symptom_hits = sum(1 for w in words if w in SYMPTOM_TERMS)
+    platform_hits = sum(1 for w in words if w in PLATFORM_TERMS)
+    if platform_hits and platform_hits >= symptom_hits:
+        return 'platform_faq'
+    if symptom_hits or re.search(r"\bi (have|had|feel|am feeling|got)\b|\bmy \w+ (hurts|aches)\b", text):
+        return 'symptom'
+    # faq.txt also covers common complaints, so FAQ similarity only decides between the leftovers
+    if faq_score >= 0.35:
+        return 'platform_faq'
+    # Only a query that is clearly about something else is kept away from the LLM
+    return 'off_topic' if any(w in OFF_TOPIC_TERMS for w in words) else 'general'
+
+
+class Engine:
+    """One answering backend with its expected cost and observed latency"""
+
+    def __init__(self, name, fn, cost, latency_ms, available=None, offload=False, stage_name=None):
+        self.name = name
+        self.fn = fn
+        self.cost = cost
+        self.latency_ms = float(latency_ms)  # EWMA of observed latency, seeded with the estimate
+        self.available = available or (lambda: True)
+        self.offload = offload  # run through the LLM worker instead of inline
+        self.stage_name = stage_name or f"engine_{name}"
+        self.failures = 0
+        self.down_until = 0.0
+
+    def observe(self, seconds, ok):
+        self.latency_ms = 0.8 * self.latency_ms + 0.2 * seconds * 1000.0
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= ROUTER_FAILURES_BEFORE_COOLDOWN:
+            logger.warning(f"Engine {self.name} failed {self.failures} times; cooling down")
+            self.down_until = time.monotonic() + ROUTER_COOLDOWN_SECONDS
+            self.failures = 0
+
+
+class QueryRouter:
+    """Sends each query to the cheapest engine that is good enough for its intent.
+
+    The policy lists, per intent, the engines expected to answer it well. Those
+    that are enabled, available, not cooling down after repeated failures and
+    within the intent's latency and cost budgets are tried cheapest first; the
+    fallback engine comes last.
+    """
+
+    def __init__(self, engines, policy=None, latency_budgets=None, cost_budgets=None, enabled=None, fallback=None):
+        self.engines = {engine.name: engine for engine in engines}
+        self.policy = policy or parse_rules(ROUTER_POLICY, lambda v: [e.strip() for e in v.split(',') if e.strip()])
+        self.latency_budgets = latency_budgets or parse_rules(ROUTER_LATENCY_BUDGETS, float)
+        self.cost_budgets = cost_budgets or parse_rules(ROUTER_COST_BUDGETS, float)
+        self.enabled = set(ROUTER_ENGINES if enabled is None else enabled)
+        self.fallback = ROUTER_FALLBACK if fallback is None else fallback
+        self._lock = threading.Lock()
+
+    def _usable(self, engine, now):
+        return (engine is not None and engine.name in self.enabled and engine.down_until <= now
+                and engine.available())
+
+    def plan(self, intent):
+        """Engines to try for an intent: cheapest good-enough engine first, fallback last"""
+        now = time.monotonic()
+        max_latency = self.latency_budgets.get(intent)
+        max_cost = self.cost_budgets.get(intent)
+        candidates = []
+        for name in self.policy.get(intent, self.policy.get('general', [])):
+            engine = self.engines.get(name)
+            if not self._usable(engine, now) or name == self.fallback:
+                continue
+            if max_latency is not None and engine.latency_ms > max_latency:
+                # Decay the estimate so a once-slow engine gets retried instead of being skipped forever
+                with self._lock:
+                    engine.latency_ms *= 0.95
+                continue
+            if max_cost is not None and engine.cost > max_cost:
+                continue
+            candidates.append(engine)
+        candidates.sort(key=lambda e: (e.cost, e.latency_ms))
+        fallback = self.engines.get(self.fallback)
+        if fallback is not None and fallback.name in self.enabled and fallback.available():
+            candidates.append(fallback)
+        return candidates
+
+    def route(self, query, symptoms=None, intent=None, call=None):
+        """Returns (reply, intent, engine name); reply is None when every candidate failed"""
+        intent = intent or classify(query)
+        for engine in self.plan(intent):
+            start = time.perf_counter()
+            try:
+                with stage(engine.stage_name):
+                    if engine.offload and call is not None:
+                        reply = call(engine.fn, query, symptoms)
+                    else:
+                        reply = engine.fn(query, symptoms)
+            except Exception as e:
+                logger.warning(f"Engine {engine.name} failed: {e!r}")
+                reply = None
+            elapsed = time.perf_counter() - start
+            ok = bool(reply and reply.strip())
+            with self._lock:
+                engine.observe(elapsed, ok)
+            ENGINE_SECONDS.observe(elapsed, engine=engine.name)
+            if ok:
+                ROUTE_DECISIONS.inc(intent=intent, engine=engine.name)
+                return reply, intent, engine.name
+            ENGINE_FAILURES.inc(engine=engine.name)
+        ROUTE_DECISIONS.inc(intent=intent, engine='none')
+        return None, intent, None
@@ -0,0 +1,184 @@
+import os
+import time
+import secrets
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie').lower()  # cookie | memory | sqlite
+SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH')  # defaults to <instance>/sessions.db
+USER_CONTEXT_TTL = int(os.getenv('USER_CONTEXT_TTL', '300'))
+
+# -------------------- Slim user projection --------------------
+UserContext = namedtuple('UserContext', ['id', 'name', 'email'])
+
+
+def cache_user_context(session, user):
+    """Keep id/name/email in the session so protected pages skip the users table"""
+    session['user_ctx'] = {'id': user.id, 'name': user.name, 'email': user.email, 'at': time.time()}
+
+
+def cached_user_context(session, user_id):
+    ctx = session.get('user_ctx')
+    if not ctx or ctx.get('id') != user_id:
+        return None
+    if time.time() - ctx.get('at', 0) > USER_CONTEXT_TTL:
+        return None
+    return UserContext(ctx['id'], ctx['name'], ctx['email'])
+
+
+def clear_user_context(session):
+    session.pop('user_ctx', None)
+
+
+# -------------------- Server-side session backends --------------------
+class MemorySessionBackend:
+    """Per-process store; fine for a single worker or tests"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            expires, payload = item
+            if expires < time.time():
+                del self._data[sid]
+                return None
+            return payload
+
+    def set(self, sid, payload, expires):
+        with self._lock:
+            self._data[sid] = (expires, payload)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SQLiteSessionBackend:
+    """Store shared by all workers on one host through a WAL-mode SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                     '(sid TEXT PRIMARY KEY, payload BLOB NOT NULL, expires REAL NOT NULL)')
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread, and never one inherited from a pre-fork parent
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=5)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, sid):
+        row = self._conn().execute('SELECT payload, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(sid)
+            return None
+        return row[0]
+
+    def set(self, sid, payload, expires):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO sessions (sid, payload, expires) VALUES (?, ?, ?)',
+                     (sid, payload, expires))
+        # Opportunistically drop a few expired rows so the table doesn't grow forever
+        conn.execute('DELETE FROM sessions WHERE sid IN '
+                     '(SELECT sid FROM sessions WHERE expires < ? LIMIT 20)', (time.time(),))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        """Issue a new session id on the next save (call on login to prevent fixation)"""
+        self.rotate = True
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a backend; the cookie only carries a random session id"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            payload = self.backend.get(sid)
+            if payload is not None:
+                try:
+                    return ServerSideSession(self.serializer.loads(payload), sid=sid)
+                except ValueError:
+                    logger.warning("Discarding unreadable session payload")
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+        if session.rotate:
+            self.backend.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.rotate = False
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        self.backend.set(session.sid, self.serializer.dumps(dict(session)), time.time() + lifetime)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def init_session_backend(app, backend=None):
+    """Install the configured session backend; `cookie` keeps Flask's signed cookies"""
+    backend = (backend or SESSION_BACKEND).lower()
+    if backend == 'memory':
+        app.session_interface = ServerSideSessionInterface(MemorySessionBackend())
+    elif backend == 'sqlite':
+        path = SESSION_SQLITE_PATH or os.path.join(app.instance_path, 'sessions.db')
+        app.session_interface = ServerSideSessionInterface(SQLiteSessionBackend(path))
+    elif backend != 'cookie':
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return app.session_interface
@@ -0,0 +1,88 @@
+import os
+import threading
+
+from metrics import Counter
+
+SINGLEFLIGHT_ENABLED = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+# Requests allowed to wait on one in-flight computation; later ones compute on their own
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv('SINGLEFLIGHT_MAX_WAITERS', '256'))
+
+SINGLEFLIGHT_TOTAL = Counter('docify_singleflight_total',
+                             'Coalescing outcomes: leader (computed), coalesced (shared a result), '
+                             'overflow (too many waiters) and timeout', ['result'])
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised to a waiter whose leader didn't finish within the timeout"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for it and receive the same result or
+    exception. Nothing is cached: once the leader finishes, the next call
+    computes again.
+    """
+
+    def __init__(self, max_waiters=None, enabled=None):
+        self.max_waiters = SINGLEFLIGHT_MAX_WAITERS if max_waiters is None else max_waiters
+        self.enabled = SINGLEFLIGHT_ENABLED if enabled is None else enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """Returns (result, shared); shared is True when another caller computed it"""
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            elif call.waiters >= self.max_waiters:
+                call, leader = None, False
+            else:
+                call.waiters += 1
+                leader = False
+
+        if call is None:
+            SINGLEFLIGHT_TOTAL.inc(result='overflow')
+            return fn(), False
+
+        if leader:
+            SINGLEFLIGHT_TOTAL.inc(result='leader')
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result, False
+
+        finished = call.done.wait(timeout)
+        with self._lock:
+            call.waiters -= 1
+        if not finished:
+            SINGLEFLIGHT_TOTAL.inc(result='timeout')
+            raise SingleFlightTimeout(f"In-flight call for {key!r} did not finish within {timeout}s")
+        SINGLEFLIGHT_TOTAL.inc(result='coalesced')
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def in_flight(self):
+        return len(self._calls)
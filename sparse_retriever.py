@@ -0,0 +1,82 @@
+import os
+import math
+import heapq
+
+from faq_parser import parse_faq_file
+from faq_fastpath import tokenize
+
+# Lexical retriever for images without langchain/sentence-transformers/faiss
+SPARSE_RETRIEVER_ENABLED = os.getenv('SPARSE_RETRIEVER_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+SPARSE_RETRIEVER_K = int(os.getenv('SPARSE_RETRIEVER_K', '3'))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class Document:
+    """Minimal stand-in for langchain's Document"""
+
+    __slots__ = ('page_content', 'metadata')
+
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+    def __repr__(self):
+        return f"Document(page_content={self.page_content[:40]!r}, metadata={self.metadata!r})"
+
+
+class BM25Retriever:
+    """Okapi BM25 over FAQ chunks, stored as an inverted index of precomputed term weights.
+
+    Each posting holds the full BM25 contribution of a term to a chunk, so a
+    query costs one dictionary lookup per term plus one addition per matching
+    chunk. Exposes the same `invoke(query)` interface as a langchain retriever.
+    """
+
+    def __init__(self, entries, k=None, k1=BM25_K1, b=BM25_B):
+        self.k = SPARSE_RETRIEVER_K if k is None else k
+        self.documents = [Document(e["text"], dict(e["metadata"])) for e in entries]
+        term_counts = []
+        for doc in self.documents:
+            counts = {}
+            for token in tokenize(doc.page_content):
+                counts[token] = counts.get(token, 0) + 1
+            term_counts.append(counts)
+        n = len(term_counts)
+        avg_len = sum(sum(c.values()) for c in term_counts) / n if n else 0.0
+        df = {}
+        for counts in term_counts:
+            for token in counts:
+                df[token] = df.get(token, 0) + 1
+        self.postings = {}
+        for i, counts in enumerate(term_counts):
+            norm = k1 * (1 - b + b * sum(counts.values()) / avg_len) if avg_len else k1
+            for token, tf in counts.items():
+                idf = math.log(1 + (n - df[token] + 0.5) / (df[token] + 0.5))
+                self.postings.setdefault(token, []).append((i, idf * tf * (k1 + 1) / (tf + norm)))
+
+    @classmethod
+    def from_faq_file(cls, path, k=None):
+        return cls(parse_faq_file(path), k=k)
+
+    def scores(self, query):
+        """{chunk index: BM25 score} for chunks sharing at least one term with the query"""
+        scores = {}
+        for token in set(tokenize(query)):
+            for i, weight in self.postings.get(token, ()):
+                scores[i] = scores.get(i, 0.0) + weight
+        return scores
+
+    def invoke(self, query, k=None):
+        """Top-k chunks as Documents, best first, with the score in metadata"""
+        scores = self.scores(query)
+        top = heapq.nlargest(self.k if k is None else k, scores.items(), key=lambda item: item[1])
+        return [Document(self.documents[i].page_content, dict(self.documents[i].metadata, score=round(score, 4)))
+                for i, score in top]
+
+
+def get_retriever(faq_path, k=None):
+    """BM25 retriever over faq_path, or None when disabled or the file is missing"""
+    if not SPARSE_RETRIEVER_ENABLED or not os.path.exists(faq_path):
+        return None
+    return BM25Retriever.from_faq_file(faq_path, k=k)
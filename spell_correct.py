@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+
+# Symmetric-delete spelling correction (SymSpell) for the keyword FAQ fallback
+SPELL_CORRECT_ENABLED = os.getenv('SPELL_CORRECT_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+SPELL_MAX_DISTANCE = int(os.getenv('SPELL_MAX_DISTANCE', '2'))
+# General English word list; a word found here is never rewritten
+SPELL_WORDS_PATH = os.getenv('SPELL_WORDS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'english_words.txt'))
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def _deletes(word, max_distance):
+    """Every string reachable from word by removing up to max_distance characters"""
+    results, frontier = set(), {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                next_frontier.add(item[:i] + item[i + 1:])
+        next_frontier -= results
+        results |= next_frontier
+        frontier = next_frontier
+    return results
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it is known to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def allowed_distance(word, max_distance=None):
+    """Edits tolerated for a word of this length: none up to 4 letters, one up to 8, then two"""
+    max_distance = SPELL_MAX_DISTANCE if max_distance is None else max_distance
+    if len(word) <= 4:
+        return 0
+    return min(max_distance, 1 if len(word) <= 8 else 2)
+
+
+def read_words(path):
+    """Words listed one per line ('#' starts a comment); empty when the file is missing"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as file:
+        return {line.strip().lower() for line in file if line.strip() and not line.startswith('#')}
+
+
+class SpellCorrector:
+    """Maps misspelled words onto a few target words in near-constant time per word.
+
+    Only targets (the fallback keywords) are corrected towards, and a word that
+    is already a target or in `known` (an English word list plus the FAQ and
+    disease vocabulary) is left alone, so "never" isn't turned into "fever".
+
+    At build time every target is stored under each of its deletes (up to
+    max_distance characters removed). A lookup generates the deletes of the
+    input word and verifies only the few targets sharing one of them.
+    """
+
+    def __init__(self, counts, known=(), max_distance=None):
+        self.max_distance = SPELL_MAX_DISTANCE if max_distance is None else max_distance
+        self.counts = dict(counts)
+        self.known = frozenset(known)
+        self.index = {}
+        for word in self.counts:
+            for variant in _deletes(word, allowed_distance(word, self.max_distance)) | {word}:
+                self.index.setdefault(variant, []).append(word)
+        self._cache = {}
+
+    @classmethod
+    def from_texts(cls, texts, targets, words=(), max_distance=None):
+        """Targets weighted by how often texts use them (to break ties); every word in texts or words is known"""
+        known = set(words)
+        counts = dict.fromkeys(targets, 1)
+        for text in texts:
+            for word in _WORD_RE.findall(text.lower()):
+                known.add(word)
+                if word in counts:
+                    counts[word] += 1
+        return cls(counts, known, max_distance)
+
+    @classmethod
+    def from_files(cls, paths, targets, words_path=None, max_distance=None):
+        texts = []
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as file:
+                    texts.append(file.read())
+        words = read_words(SPELL_WORDS_PATH if words_path is None else words_path)
+        return cls.from_texts(texts, targets, words, max_distance=max_distance)
+
+    def correct_word(self, word):
+        """Closest target (fewest edits, then most frequent) for an unknown word, or the word itself"""
+        if word in self.counts or word in self.known:
+            return word
+        cached = self._cache.get(word)
+        if cached is not None:
+            return cached
+        limit = allowed_distance(word, self.max_distance)
+        best, best_key = word, None
+        if limit:
+            seen = set()
+            for variant in _deletes(word, limit) | {word}:
+                for candidate in self.index.get(variant, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = edit_distance(word, candidate, limit)
+                    if distance > limit:
+                        continue
+                    key = (distance, -self.counts[candidate])
+                    if best_key is None or key < best_key:
+                        best, best_key = candidate, key
+        if len(self._cache) < 50000:
+            self._cache[word] = best
+        return best
+
+    def correct(self, text):
+        """text with every alphabetic word corrected; everything else is kept as written"""
+        return _WORD_RE.sub(lambda m: self.correct_word(m.group(0)), (text or '').lower())
+
+
+_corrector = None
+_corrector_lock = threading.Lock()
+
+
+def get_corrector(paths, targets):
+    """Process-wide corrector, built on first use"""
+    global _corrector
+    if _corrector is None:
+        with _corrector_lock:
+            if _corrector is None:
+                _corrector = SpellCorrector.from_files(paths, targets)
+    return _corrector
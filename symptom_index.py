@@ -0,0 +1,190 @@
+import os
+import re
+import math
+import threading
+
+from faq_parser import parse_faq_text
+from faq_fastpath import NEGATIONS, STOPWORDS, expand_negations
+
+DISEASES_PATH = os.getenv('DISEASES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diseases.txt'))
+# Share of a symptom's words that must appear in the text for it to count as present
+SYMPTOM_MATCH_FRACTION = 0.5
+# Symptoms with at most this many words (besides qualifiers) must appear in full: "loss" alone is not "Weight loss"
+SYMPTOM_FULL_MATCH_TERMS = 2
+# Stemmed words that only qualify a symptom ("Frequent urination"); the rest of a short symptom must be present
+QUALIFIERS = frozenset(('frequent', 'excessiv', 'persistent', 'chronic', 'sever', 'often'))
+# Symptoms that must match before a condition is reported, unless the text names it
+SYMPTOM_MIN_MATCHES = 2
+# Lowest score reported as a likely condition
+SYMPTOM_MIN_SCORE = float(os.getenv('SYMPTOM_MIN_SCORE', '0.15'))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SECTION_RE = re.compile(r"^\W*(description|common symptoms|recommended specialist|diagnosis|treatment[^:]*):\s*$", re.I)
+_SUFFIXES = ('ations', 'ation', 'ness', 'ing', 'ed', 'ly', 'es', 's', 'ate')
+_CLAUSE_RE = re.compile(r"[,.;:!?\n]+")
+# Words that end a negated span early: "no fever but a cough"
+_NEGATION_END = frozenset(('but', 'however', 'though', 'although', 'except', 'yet'))
+# Everyday words mapped onto the vocabulary of the disease blocks (after stemming)
+SYNONYMS = {
+    'tire': 'fatigu', 'tired': 'fatigu', 'exhaust': 'fatigu', 'pee': 'urin', 'peeing': 'urin',
+    'thirsti': 'thirst', 'breathles': 'breath', 'wheezi': 'wheez', 'sad': 'sadnes', 'puk': 'vomit',
+    'sweati': 'sweat', 'menstrual': 'period', 'blurri': 'blur', 'blurr': 'blur', 'stiff': 'stiffnes',
+}
+
+
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 4 and word.endswith('e'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('y'):
+        word = word[:-1] + 'i'
+    return SYNONYMS.get(word, word)
+
+
+def terms(text):
+    """Stemmed content words of a symptom description"""
+    return [_stem(w) for w in _WORD_RE.findall((text or '').lower()) if w not in STOPWORDS and len(w) > 2]
+
+
+def affirmed(text):
+    """text without its negated spans: "no fever or chills, but a cough" -> "but a cough".
+
+    A span runs from a negation to the end of its clause, or to a word such as "but".
+    """
+    kept = []
+    for clause in _CLAUSE_RE.split(expand_negations(text)):
+        negated = False
+        for word in _WORD_RE.findall(clause):
+            if word in NEGATIONS:
+                negated = True
+            elif word in _NEGATION_END:
+                negated = False
+            if not negated:
+                kept.append(word)
+    return ' '.join(kept)
+
+
+def specialist_phrase(specialists):
+    """'an Endocrinologist', 'a Gynecologist or Endocrinologist'"""
+    names = ' or '.join(specialists)
+    return f"{'an' if names[:1].lower() in ('a', 'e', 'i', 'o', 'u') else 'a'} {names}"
+
+
+def parse_disease_blocks(text):
+    """[{condition, aliases, symptoms, specialists}] from the `Disease:` blocks of a knowledge file"""
+    diseases = []
+    for entry in parse_faq_text(text):
+        if entry["metadata"]["kind"] != "disease":
+            continue
+        sections, current = {}, None
+        for line in entry["answer"].splitlines():
+            header = _SECTION_RE.match(line.strip())
+            if header:
+                current = header.group(1).lower()
+                sections[current] = []
+            elif current and line.strip():
+                sections[current].append(line.strip().lstrip('-•').strip())
+        name = entry["metadata"]["question"]
+        aliases = [a.strip() for a in re.split(r"[()]", name) if a.strip()]
+        specialists = [s.strip() for line in sections.get("recommended specialist", []) for s in line.split('/')]
+        diseases.append({
+            "condition": aliases[0],
+            "aliases": aliases,
+            "symptoms": sections.get("common symptoms", []),
+            "specialists": [s for s in specialists if s],
+        })
+    return diseases
+
+
+class SymptomIndex:
+    """Disease x symptom index for ranking likely conditions from free-text symptoms.
+
+    Every listed symptom of every disease is a row of stemmed terms, weighted
+    by how specific it is (symptoms shared by many diseases, like fatigue, weigh
+    less). An inverted index maps each term to the (disease, symptom) cells it
+    occurs in, so matching a text is a single pass over the postings of its
+    terms. A disease scores the weighted share of its symptoms present in the
+    text; naming the disease itself counts as one more, fully matched symptom.
+    Negated spans of the text ("no cough") are ignored, and a short symptom
+    counts only when all of its words, qualifiers aside, are present.
+    """
+
+    def __init__(self, diseases):
+        self.diseases = diseases
+        rows = []  # (disease index, term set, label, is the disease's name)
+        for d, disease in enumerate(diseases):
+            for label in disease["symptoms"]:
+                rows.append((d, frozenset(terms(label)), label, False))
+            for label in disease["aliases"]:
+                rows.append((d, frozenset(terms(label)), label, True))
+        rows = [row for row in rows if row[1]]
+        # Symptom specificity: inverse frequency of each distinct symptom across diseases
+        seen_in = {}
+        for d, row_terms, _, _ in rows:
+            seen_in.setdefault(row_terms, set()).add(d)
+        n = len(diseases)
+        self.rows = [(d, row_terms, row_terms - QUALIFIERS or row_terms, label, is_name,
+                      math.log(1 + n / len(seen_in[row_terms])))
+                     for d, row_terms, label, is_name in rows]
+        self.totals = [0.0] * n
+        self.postings = {}
+        for r, (d, row_terms, _, _, _, weight) in enumerate(self.rows):
+            self.totals[d] += weight
+            for term in row_terms:
+                self.postings.setdefault(term, []).append(r)
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or DISEASES_PATH, encoding='utf-8') as file:
+            return cls(parse_disease_blocks(file.read()))
+
+    def match(self, text, limit=3, min_score=None):
+        """Ranked [{condition, specialists, score, matched}] for a symptom description"""
+        text_terms = set(terms(affirmed(text)))
+        hits = {r for term in text_terms for r in self.postings.get(term, ())}
+        scores, matched, named = {}, {}, set()
+        for r in sorted(hits):
+            d, row_terms, core, label, is_name, weight = self.rows[r]
+            fraction = len(row_terms & text_terms) / len(row_terms)
+            if len(core) <= SYMPTOM_FULL_MATCH_TERMS:
+                present = core <= text_terms
+            else:
+                present = fraction >= SYMPTOM_MATCH_FRACTION
+            if present:
+                # A partly described symptom earns part of its weight; naming the disease earns all of it
+                scores[d] = scores.get(d, 0.0) + (weight if is_name else weight * fraction)
+                matched.setdefault(d, []).append(label)
+                if is_name:
+                    named.add(d)
+        threshold = SYMPTOM_MIN_SCORE if min_score is None else min_score
+        ranked = sorted(((s / self.totals[d], d) for d, s in scores.items()
+                         if d in named or len(matched[d]) >= SYMPTOM_MIN_MATCHES), reverse=True)
+        return [{
+            "condition": self.diseases[d]["condition"],
+            "specialists": self.diseases[d]["specialists"],
+            "score": round(score, 3),
+            "matched": matched[d],
+        } for score, d in ranked[:limit] if score >= threshold]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SymptomIndex.from_file(DISEASES_PATH)
+    return _index
+
+
+def suggest(text, limit=3):
+    """Likely conditions and specialists for a symptom description; [] when nothing matches"""
+    if not text or not text.strip():
+        return []
+    return get_index().match(text, limit=limit)
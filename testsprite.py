@@ -14,6 +14,7 @@ from datetime import datetime
 
 # Import app and DB models from the application
 from app import app, db, User, Consultation
+import passwords
 app_module = importlib.import_module('app')
 
 
@@ -23,6 +24,8 @@ class AppEndpointTests(unittest.TestCase):
         app.config["TESTING"] = True
         # Ensure 127.0.0.1 is allowed; default is already '127.0.0.1/32'
         app.config["SECRET_KEY"] = "test-secret-key"
+        # Every test shares 127.0.0.1; test_rate_limit_returns_429 turns limiting back on
+        app_module.RATE_LIMITER.enabled = False
         cls.client = app.test_client()
         with app.app_context():
             # Reset database to a clean state for tests
@@ -371,6 +374,366 @@ class AppEndpointTests(unittest.TestCase):
             self.assertEqual(cons2.created_at, created_at_before)
             self.assertGreaterEqual(cons2.updated_at, updated_at_before)
 
+    def test_chatbot_stage_timings_exported(self):
+        # Not an FAQ question, so the request runs every stage instead of the fast path
+        r = self.client.post("/chatbot", json={"message": "My knee hurts after running"})
+        self.assertEqual(r.status_code, 200)
+        timing = r.headers.get("Server-Timing", "")
+        self.assertIn("ip_filter;dur=", timing)
+        self.assertIn("consultation_lookup;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+        r_metrics = self.client.get("/metrics")
+        self.assertEqual(r_metrics.status_code, 200)
+        self.assertTrue(r_metrics.content_type.startswith("text/plain"))
+        body = r_metrics.get_data(as_text=True)
+        self.assertIn('docify_stage_duration_seconds_count{endpoint="chatbot",stage="consultation_lookup"}', body)
+        self.assertIn('docify_request_duration_seconds_bucket{endpoint="chatbot",le="+Inf"}', body)
+
+    def test_chatbot_faq_fast_path_skips_llm(self):
+        calls = []
+        prev = (app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE)
+        app_module.process_query5 = lambda query, symptoms=None: calls.append(query) or "llm answer"
+        app_module.ADVANCED_MODULES_AVAILABLE = True
+        try:
+            r = self.client.post("/chatbot", json={"message": "can i get a backdated certificate?"})
+            self.assertIn("Backdated certificates may be issued", r.get_json()["reply"])
+            self.assertIn("faq_fastpath;dur=", r.headers["Server-Timing"])
+            self.assertNotIn("consultation_lookup", r.headers["Server-Timing"])
+            self.assertEqual(calls, [])
+            r = self.client.post("/chatbot", json={"message": "My knee hurts after running"})
+            self.assertEqual(r.get_json()["reply"], "llm answer")
+            self.assertEqual(len(calls), 1)
+        finally:
+            app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE = prev
+
+    def test_chatbot_routes_by_intent(self):
+        calls = []
+        prev = (app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE)
+        app_module.process_query5 = lambda query, symptoms=None: calls.append(query) or "llm answer"
+        app_module.ADVANCED_MODULES_AVAILABLE = True
+        try:
+            r = self.client.post("/chatbot", json={"message": "hello there"})
+            self.assertEqual(r.headers["X-Docify-Route"], "greeting/faq_fallback")
+            self.assertEqual(calls, [])
+            r = self.client.post("/chatbot", json={"message": "I have had a fever and cough since monday"})
+            self.assertEqual(r.headers["X-Docify-Route"], "symptom/gemini")
+            self.assertEqual(r.get_json()["reply"], "llm answer")
+        finally:
+            app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE = prev
+
+    def test_dashboard_submit_suggests_specialist(self):
+        email = f"spec_{int(time.time())}@example.com"
+        password = "SpecPass!123"
+        self.client.post("/register", data={"name": "Spec User", "phone": "4545454545", "email": email,
+                                            "password": password}, follow_redirects=True)
+        self.client.post("/login", data={"email": email, "password": password}, follow_redirects=True)
+        r = self.client.post("/dashboard", data={"symptoms": "Wheezing at night and shortness of breath"},
+                             follow_redirects=True)
+        self.assertIn(b"Consultation form submitted successfully", r.data)
+        self.assertIn(b"Pulmonologist", r.data)
+
+    def test_chatbot_deadline_answers_locally_and_caches_late_result(self):
+        calls = []
+
+        def slow_gemini(query, symptoms=None):
+            calls.append(query)
+            time.sleep(0.5)
+            return "late llm answer"
+
+        prev = (app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE, app_module.CHATBOT_DEADLINE_SECONDS)
+        app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE = slow_gemini, True
+        app_module.CHATBOT_DEADLINE_SECONDS = 0.1
+        try:
+            start = time.perf_counter()
+            r = self.client.post("/chatbot", json={"message": "My ankle is swollen after a fall"})
+            self.assertLess(time.perf_counter() - start, 0.4)
+            self.assertEqual(r.headers["X-Docify-Route"], "symptom/faq_fallback")
+            time.sleep(0.6)
+            r = self.client.post("/chatbot", json={"message": "my ankle is swollen after a fall!"})
+            self.assertEqual(r.get_json()["reply"], "late llm answer")
+            self.assertEqual(r.headers["X-Docify-Route"], "late/cache")
+            self.assertEqual(len(calls), 1)
+        finally:
+            (app_module.process_query5, app_module.ADVANCED_MODULES_AVAILABLE,
+             app_module.CHATBOT_DEADLINE_SECONDS) = prev
+
+    def test_profiling_hook_gated_and_retention_capped(self):
+        import tempfile
+        profiling = app_module.profiling
+        prev = (profiling.PROFILE_TOKEN, profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES, profiling.PROFILE_MODE)
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                profiling.PROFILE_TOKEN, profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES = "tok", tmp, 2
+                r_plain = self.client.get("/faq")
+                self.assertNotIn("X-Profile-File", r_plain.headers)
+                r_bad = self.client.get("/faq", headers={"X-Docify-Profile": "nope"})
+                self.assertNotIn("X-Profile-File", r_bad.headers)
+                for _ in range(3):
+                    r = self.client.get("/faq", headers={"X-Docify-Profile": "tok"})
+                    self.assertEqual(r.status_code, 200)
+                    self.assertTrue(r.headers["X-Profile-File"].endswith(".folded"))
+                    time.sleep(0.01)
+                self.assertEqual(len(os.listdir(tmp)), 2)
+
+                # A second concurrent cProfile session can't start; the request is served unprofiled
+                held = profiling.start_profile('cprofile')
+                self.assertIsNotNone(held)
+                try:
+                    self.assertIsNone(profiling.start_profile('cprofile'))
+                    profiling.PROFILE_MODE = 'cprofile'
+                    r = self.client.get("/faq", headers={"X-Docify-Profile": "tok"})
+                    self.assertEqual(r.status_code, 200)
+                    self.assertNotIn("X-Profile-File", r.headers)
+                finally:
+                    held.stop()
+                r = self.client.get("/faq", headers={"X-Docify-Profile": "tok"})
+                self.assertTrue(r.headers["X-Profile-File"].endswith(".prof"))
+
+                # A failing after_request hook skips stop_profiler; teardown still frees the lock
+                finish_request = app_module.metrics.finish_request
+                app_module.metrics.finish_request = lambda response: 1 / 0
+                try:
+                    with self.assertRaises(ZeroDivisionError):
+                        self.client.get("/faq", headers={"X-Docify-Profile": "tok"})
+                finally:
+                    app_module.metrics.finish_request = finish_request
+                self.assertFalse(profiling._cprofile_lock.locked())
+                r = self.client.get("/faq", headers={"X-Docify-Profile": "tok"})
+                self.assertTrue(r.headers["X-Profile-File"].endswith(".prof"))
+            finally:
+                (profiling.PROFILE_TOKEN, profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES,
+                 profiling.PROFILE_MODE) = prev
+
+    def test_busy_pool_returns_503_with_retry_after(self):
+        client = self.client
+        email = f"busy_{time.time()}@example.com"
+        client.post("/register", data={"name": "Busy", "phone": "1", "email": email, "password": "BusyPass!1"})
+
+        def busy(*args):
+            raise passwords.PasswordHasherBusy("saturated")
+        for name in ("hash_password", "verify_password"):
+            self.addCleanup(setattr, passwords, name, getattr(passwords, name))
+            setattr(passwords, name, busy)
+        login = client.post("/login", data={"email": email, "password": "BusyPass!1"})
+        register = client.post("/register", data={"name": "Busy", "phone": "1",
+                                                  "email": f"busy2_{time.time()}@example.com", "password": "x"})
+        for r in (login, register):
+            self.assertEqual(r.status_code, 503)
+            self.assertEqual(r.headers["Retry-After"], str(passwords.PASSWORD_HASH_RETRY_AFTER))
+
+    def test_dashboard_uses_cached_user_context(self):
+        email = f"ctx_{int(time.time())}@example.com"
+        password = "CtxPass!123"
+        self.client.post("/register", data={"name": "Ctx User", "phone": "3030303030",
+                                            "email": email, "password": password})
+        self.client.post("/login", data={"email": email, "password": password})
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["user_ctx"]["email"], email)
+            self.assertNotIn("medical_history", sess["user_ctx"])
+        r = self.client.get("/dashboard")
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(b"Welcome back, Ctx User", r.data)
+
+    def test_login_rehashes_outdated_password(self):
+        from werkzeug.security import generate_password_hash
+        email = f"rehash_{time.time()}@example.com"
+        with app.app_context():
+            db.session.add(User(name="Rehash User", phone="6060606060", email=email,
+                                password=generate_password_hash("RehashPass!123", "pbkdf2:sha256:1000")))
+            db.session.commit()
+        r = self.client.post("/login", data={"email": email, "password": "RehashPass!123"})
+        self.assertIn(r.status_code, (301, 302))
+        with app.app_context():
+            stored = User.query.filter_by(email=email).first().password
+        self.assertFalse(stored.startswith("pbkdf2:sha256:1000$"))
+        self.assertFalse(passwords.needs_rehash(stored))
+
+    def test_rate_limit_returns_429(self):
+        import rate_limit
+        prev = app_module.RATE_LIMITER
+        app_module.RATE_LIMITER = rate_limit.RateLimiter(limits={"chatbot": (2, 60)}, enabled=True)
+        try:
+            client = app.test_client()
+            codes = [client.post("/chatbot", json={"message": "hello"}).status_code for _ in range(3)]
+            self.assertEqual(codes, [200, 200, 429])
+            r = client.post("/chatbot", json={"message": "hello"})
+            self.assertEqual(r.get_json()["error"], "Too Many Requests")
+            self.assertGreaterEqual(int(r.headers["Retry-After"]), 1)
+            # Other routes are unaffected
+            self.assertEqual(client.get("/faq").status_code, 200)
+            # The bucket follows the first X-Forwarded-For hop, like the IP filter
+            other = client.post("/chatbot", json={"message": "hello"},
+                                environ_base={"HTTP_X_FORWARDED_FOR": "127.0.0.1, 10.0.0.1"})
+            self.assertEqual(other.status_code, 429)
+        finally:
+            app_module.RATE_LIMITER = prev
+
+    def test_failed_logins_throttled_per_account_and_client(self):
+        import rate_limit
+        email = f"lock_{int(time.time() * 1000)}@example.com"
+        self.client.post("/register", data={"name": "Lock User", "phone": "4040404040",
+                                            "email": email, "password": "LockPass!123"})
+        prev = app_module.RATE_LIMITER
+        app_module.RATE_LIMITER = rate_limit.RateLimiter(limits={"login": (10, 60), "login_failed": (2, 300)},
+                                                         enabled=True)
+        try:
+            client = app.test_client()
+            # Successful logins don't count against the account
+            for _ in range(3):
+                client.post("/login", data={"email": email, "password": "LockPass!123"})
+                client.get("/logout")
+            for _ in range(2):
+                r = client.post("/login", data={"email": email, "password": "wrong"})
+                self.assertEqual(r.status_code, 302)
+            r = client.post("/login", data={"email": email, "password": "LockPass!123"})
+            self.assertEqual(r.status_code, 429)
+            # Only this client is throttled for this account; the owner elsewhere is not
+            self.assertIsNone(app_module.RATE_LIMITER.check("login_failed", [f"{email}|10.0.0.7"], consume=False))
+        finally:
+            app_module.RATE_LIMITER = prev
+
+    def test_bulk_queue_and_update(self):
+        client = app.test_client()
+        with app.app_context():
+            email = f"Bulk_{time.time()}@example.com"
+            user = User(name="Bulk Doc", phone="7070707070", email=email, password="x")
+            db.session.add(user)
+            db.session.commit()
+            rows = [Consultation(user_id=user.id, symptoms=f"case {i}", priority=p)
+                    for i, p in enumerate(["low", "urgent", "normal", "urgent"])]
+            db.session.add_all(rows)
+            db.session.commit()
+            ids = [c.id for c in rows]
+            uid = user.id
+        self.assertEqual(client.get("/consultations/queue").status_code, 401)
+        with client.session_transaction() as sess:
+            sess["user_id"] = uid
+        # Patients can't list or edit other patients' consultations
+        self.assertEqual(client.get("/consultations/queue").status_code, 403)
+        self.assertEqual(client.get("/consultations/next").status_code, 403)
+        self.assertEqual(client.post("/consultations/bulk_update",
+                                     json={"updates": [{"id": ids[0], "status": "completed"}]}).status_code, 403)
+        self.addCleanup(setattr, app_module, "STAFF_EMAILS", app_module.STAFF_EMAILS)
+        app_module.STAFF_EMAILS = {email.lower()}
+
+        r = client.get("/consultations/queue?priority=urgent,normal,low")
+        queue = [c["id"] for c in r.get_json()["consultations"] if c["id"] in ids]
+        self.assertEqual(queue, [ids[1], ids[3], ids[2], ids[0]])
+        self.assertNotIn("symptoms", r.get_json()["consultations"][0])
+
+        r = client.post("/consultations/bulk_update", json={"updates": [
+            {"id": ids[1], "status": "reviewed", "doctor_notes": "See a cardiologist"},
+            {"id": ids[3], "status": "completed"},
+            {"id": ids[0], "status": "bogus"},
+            {"id": 999999, "status": "reviewed"},
+        ]})
+        data = r.get_json()
+        self.assertEqual(data["updated"], 2)
+        self.assertEqual([x["success"] for x in data["results"]], [True, True, False, False])
+        with app.app_context():
+            self.assertEqual(db.session.get(Consultation, ids[1]).doctor_notes, "See a cardiologist")
+            self.assertEqual(db.session.get(Consultation, ids[3]).status, "completed")
+            self.assertEqual(db.session.get(Consultation, ids[0]).status, "pending")
+        pending = [c["id"] for c in client.get("/consultations/queue").get_json()["consultations"]]
+        self.assertNotIn(ids[1], pending)
+
+        # Ids must be real integers; anything else rejects the whole request
+        for bad in ([1], True, "1", None):
+            r = client.post("/consultations/bulk_update", json={"updates": [{"id": bad, "status": "completed"}]})
+            self.assertEqual(r.status_code, 400)
+        self.assertEqual(client.post("/consultations/bulk_update", json=[1]).status_code, 400)
+        # Non-string notes fail only their own item instead of the whole write
+        r = client.post("/consultations/bulk_update", json={"updates": [
+            {"id": ids[0], "doctor_notes": {"a": 1}}, {"id": ids[2], "doctor_notes": ["x"]},
+            {"id": ids[3], "doctor_notes": "Follow up in a week"}]})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([x["success"] for x in r.get_json()["results"]], [False, False, True])
+        # limit and offset are clamped, so a negative limit can't lift the page cap
+        self.addCleanup(setattr, app_module, "BULK_MAX_ITEMS", app_module.BULK_MAX_ITEMS)
+        app_module.BULK_MAX_ITEMS = 1
+        self.assertEqual(client.get("/consultations/queue?priority=low&limit=-1").get_json()["count"], 1)
+        r = client.get("/consultations/queue?priority=low&offset=-5")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json()["count"], 1)
+
+    def test_triage_next_consultations(self):
+        client = app.test_client()
+        email = f"triage_{time.time()}@example.com"
+        with app.app_context():
+            user = User(name="Triage User", phone="8080808080", email=email, password="x")
+            db.session.add(user)
+            db.session.commit()
+            uid = user.id
+        with client.session_transaction() as sess:
+            sess["user_id"] = uid
+        self.addCleanup(setattr, app_module, "STAFF_EMAILS", app_module.STAFF_EMAILS)
+        app_module.STAFF_EMAILS = {email}
+        client.post("/dashboard", data={"symptoms": "Mild cough for a week"})
+        client.post("/dashboard", data={"symptoms": "Sudden chest pain and sweating"})
+        with app.app_context():
+            mine = {c.symptoms: c for c in Consultation.query.filter_by(user_id=uid)}
+            cough_id = mine["Mild cough for a week"].id
+            chest_id = mine["Sudden chest pain and sweating"].id
+            self.assertEqual(mine["Sudden chest pain and sweating"].priority, "urgent")
+
+        order = [c["id"] for c in client.get("/consultations/next?n=500").get_json()["consultations"]]
+        self.assertLess(order.index(chest_id), order.index(cough_id))
+        client.post(f"/update_status/{chest_id}", json={"status": "reviewed"})
+        client.post(f"/delete_consultation/{cough_id}")
+        order = [c["id"] for c in client.get("/consultations/next?n=500").get_json()["consultations"]]
+        self.assertNotIn(chest_id, order)
+        self.assertNotIn(cough_id, order)
+
+    def test_server_side_session_backends(self):
+        import tempfile
+        import session_store
+        prev = app.session_interface
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend in ("memory", "sqlite"):
+                try:
+                    prev_path = session_store.SESSION_SQLITE_PATH
+                    session_store.SESSION_SQLITE_PATH = os.path.join(tmp, "sessions.db")
+                    session_store.init_session_backend(app, backend)
+                    client = app.test_client()
+                    email = f"sss_{backend}_{int(time.time())}@example.com"
+                    client.post("/register", data={"name": "SSS User", "phone": "4040404040",
+                                                   "email": email, "password": "SssPass!123"})
+                    client.post("/login", data={"email": email, "password": "SssPass!123"})
+                    cookie = client.get_cookie("session")
+                    self.assertIsNotNone(cookie)
+                    # The cookie carries only an opaque id, not the session payload
+                    self.assertNotIn(".", cookie.value)
+                    r = client.get("/dashboard")
+                    self.assertEqual(r.status_code, 200, backend)
+                    client.get("/logout")
+                    r_after = client.get("/dashboard", follow_redirects=False)
+                    self.assertIn(r_after.status_code, (301, 302))
+                finally:
+                    session_store.SESSION_SQLITE_PATH = prev_path
+                    app.session_interface = prev
+
+    def test_large_text_columns_deferred(self):
+        from sqlalchemy.orm import load_only
+        with app.app_context():
+            user = User(name="Defer User", phone="5050505050", email=f"defer_{time.time()}@example.com",
+                        password="x", medical_history="long history", allergies="dust")
+            db.session.add(user)
+            db.session.commit()
+            db.session.add(Consultation(user_id=user.id, symptoms="big text", doctor_notes="notes"))
+            db.session.commit()
+            uid = user.id
+            db.session.expunge_all()
+
+            loaded = db.session.get(User, uid)
+            self.assertNotIn("medical_history", loaded.__dict__)
+            self.assertNotIn("allergies", loaded.__dict__)
+            listed = (Consultation.query.options(load_only(*app_module.CONSULTATION_LIST_COLUMNS))
+                      .filter_by(user_id=uid).one())
+            self.assertIn("status", listed.__dict__)
+            self.assertNotIn("symptoms", listed.__dict__)
+            self.assertNotIn("doctor_notes", listed.__dict__)
+
     def test_404_error_page(self):
         r = self.client.get("/this-route-does-not-exist")
         self.assertEqual(r.status_code, 404)
@@ -487,8 +850,567 @@ class AppEndpointTests(unittest.TestCase):
         self.assertGreater(len(data["reply"]), 0)
 
 
+class ContextBuilderTests(unittest.TestCase):
+    SOURCE = ("Stay hydrated, rest, and take paracetamol if necessary. If fever persists "
+              "for more than 3 days, consult a doctor. (Recommended doctor: General Physician)")
+
+    def test_overlapping_chunks_are_merged_into_source_span(self):
+        from context_builder import merge_overlapping
+        chunks = [self.SOURCE[40:120], self.SOURCE[:60], self.SOURCE[100:]]
+        self.assertEqual(merge_overlapping(chunks), [self.SOURCE])
+
+    def test_duplicates_dropped_and_budget_respected(self):
+        from context_builder import build_context, count_tokens
+        other = "You can reach our support team via the chatbot or email at support@docify.online."
+        context, stats = build_context([self.SOURCE, self.SOURCE + " ", other], max_tokens=30)
+        self.assertLessEqual(count_tokens(context), 30)
+        self.assertEqual(stats["docs"], 3)
+        self.assertTrue(stats["truncated"])
+        self.assertTrue(context.startswith("Stay hydrated"))
+
+
+class FaqFastPathTests(unittest.TestCase):
+    def test_red_flags_symptoms_and_negations_skip_the_stored_answer(self):
+        import faq_fastpath
+        for query in ("fever and seizure", "overdose fever", "I am pregnant and have fever", "fever with rash",
+                      "what should i do for a fever"):
+            answer, score = faq_fastpath.match(query)
+            self.assertIsNone(answer, query)
+        self.assertIn("not", faq_fastpath.tokenize("I don't have fever"))
+        self.assertIsNone(faq_fastpath.fast_answer("I don't want a prescription"))
+        self.assertIsNotNone(faq_fastpath.fast_answer("how do I submit a consultation form"))
+
+
+class FaqParserTests(unittest.TestCase):
+    def test_faq_file_parsed_into_one_entry_per_question(self):
+        from faq_parser import parse_faq_file
+        entries = parse_faq_file(Path(__file__).with_name("faq.txt"))
+        kinds = [e["metadata"]["kind"] for e in entries]
+        self.assertEqual((kinds.count("plain"), kinds.count("numbered"), kinds.count("bold")), (5, 15, 48))
+        bold = [e for e in entries if e["metadata"]["kind"] == "bold"]
+        self.assertEqual(bold[0]["metadata"]["number"], 1)
+        self.assertEqual(bold[0]["metadata"]["question"], "What should I do if I have a fever?")
+        self.assertIn("paracetamol", bold[0]["answer"])
+
+    def test_disease_blocks_kept_whole(self):
+        from faq_parser import parse_faq_text
+        text = ("How can I contact support?\nEmail support@docify.online.\n\n"
+                "=====\nDisease: Asthma\n=====\n\n🔍 Common Symptoms:\n- Wheezing\n\n"
+                "👨‍⚕️ Recommended Specialist:\nPulmonologist\n\n---\n")
+        entries = parse_faq_text(text)
+        self.assertEqual([e["metadata"]["kind"] for e in entries], ["plain", "disease"])
+        self.assertEqual(entries[1]["metadata"]["question"], "Asthma")
+        self.assertIn("Pulmonologist", entries[1]["text"])
+
+    def test_prebuilt_index_invalidated_by_faq_changes(self):
+        import tempfile
+        import vector_creator
+        with tempfile.TemporaryDirectory() as tmp:
+            faq = os.path.join(tmp, "faq.txt")
+            Path(faq).write_text("How can I contact support?\nEmail us.\n", encoding="utf-8")
+            self.assertFalse(vector_creator.index_is_current(tmp, faq))
+            Path(tmp, "chunker.txt").write_text(vector_creator.index_signature(faq), encoding="utf-8")
+            self.assertTrue(vector_creator.index_is_current(tmp, faq))
+            Path(faq).write_text("How can I contact support?\nCall us.\n", encoding="utf-8")
+            self.assertFalse(vector_creator.index_is_current(tmp, faq))
+
+
+class EmbeddingCacheTests(unittest.TestCase):
+    def test_repeated_queries_hit_cache_and_survive_restart(self):
+        import atexit
+        import tempfile
+        from benchmarks import FakeEmbeddings
+        from embedding_cache import CachedQueryEmbeddings
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "query_embeddings.bin")
+            cache = CachedQueryEmbeddings(FakeEmbeddings(dims=8, latency_ms=0), persist_path=path)
+            atexit.unregister(cache.save)
+            first = cache.embed_query("What is Docify?")
+            again = cache.embed_query("  what is   docify ")
+            self.assertEqual(len(first), 8)
+            self.assertEqual([round(x, 5) for x in first], [round(x, 5) for x in again])
+            self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 1))
+            cache.save()
+
+            restored = CachedQueryEmbeddings(FakeEmbeddings(dims=8, latency_ms=0), persist_path=path)
+            atexit.unregister(restored.save)
+            restored.embed_query("what is docify?")
+            self.assertEqual(restored.stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        from benchmarks import FakeEmbeddings
+        from embedding_cache import CachedQueryEmbeddings
+        cache = CachedQueryEmbeddings(FakeEmbeddings(dims=4, latency_ms=0), max_entries=2)
+        for query in ("fever", "cough", "fever", "rash"):
+            cache.embed_query(query)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["evictions"], stats["hits"]), (2, 1, 1))
+
+
+class LoadTestHarnessTests(unittest.TestCase):
+    def test_percentiles_and_per_engine_report(self):
+        import load_test
+
+        class StubTarget:
+            def __init__(self, name, status):
+                self.name, self.status = name, status
+
+            def send(self, query):
+                return self.status
+
+        self.assertEqual(load_test.percentile(list(range(1, 101)), 95), 95)
+        report = load_test.run([StubTarget("ok", 200), StubTarget("broken", 500)],
+                               ["hello", "fever"], total=10, concurrency=2)
+        self.assertEqual(report["requests"], 10)
+        self.assertEqual(report["errors"], 5)
+        self.assertEqual(report["engines"]["ok"]["error_rate"], 0.0)
+        self.assertEqual(report["engines"]["broken"]["error_rate"], 1.0)
+
+
+class RateLimitTests(unittest.TestCase):
+    def test_token_bucket_refills(self):
+        import rate_limit
+        limiter = rate_limit.RateLimiter(limits=rate_limit.parse_limits("login=2/10"), enabled=True)
+        self.assertIsNone(limiter.check("login", ["ip:1"], now=100.0))
+        self.assertIsNone(limiter.check("login", ["ip:1"], now=100.0))
+        self.assertEqual(limiter.check("login", ["ip:1"], now=100.0), 5)
+        self.assertIsNone(limiter.check("login", ["ip:2"], now=100.0))
+        self.assertIsNone(limiter.check("login", ["ip:1"], now=105.0))
+        self.assertIsNone(limiter.check("register", ["ip:1"], now=105.0))
+
+    def test_rejected_request_takes_no_tokens(self):
+        import rate_limit
+        limiter = rate_limit.RateLimiter(limits=rate_limit.parse_limits("chatbot=1/60"), enabled=True)
+        self.assertIsNone(limiter.check("chatbot", ["ip:1", "user:1"], now=0.0))
+        # ip:1 is exhausted, so user:2 keeps its token
+        self.assertEqual(limiter.check("chatbot", ["ip:1", "user:2"], now=0.0), 60)
+        self.assertIsNone(limiter.check("chatbot", ["ip:2", "user:2"], now=0.0))
+        self.assertIsNone(limiter.check("chatbot", ["ip:3"], now=0.0, consume=False))
+        self.assertIsNone(limiter.check("chatbot", ["ip:3"], now=0.0))
+
+    def test_sqlite_store_is_shared(self):
+        import tempfile
+        import rate_limit
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rl.db")
+            a = rate_limit.RateLimiter(rate_limit.SQLiteBucketStore(path), {"chatbot": (1, 60)}, True)
+            b = rate_limit.RateLimiter(rate_limit.SQLiteBucketStore(path), {"chatbot": (1, 60)}, True)
+            self.assertIsNone(a.check("chatbot", ["ip:1"], now=0.0))
+            self.assertEqual(b.check("chatbot", ["ip:1"], now=0.0), 60)
+
+
+class TriageQueueTests(unittest.TestCase):
+    def test_orders_by_priority_then_age_with_lazy_updates(self):
+        import triage
+        q = triage.TriageQueue()
+        q.rebuild([(1, "normal", datetime(2024, 1, 1)), (2, "low", datetime(2023, 1, 1))])
+        q.upsert(3, "urgent", datetime(2024, 6, 1))
+        q.upsert(4, "normal", datetime(2023, 6, 1))
+        self.assertEqual([i for i, _, _ in q.next(10)], [3, 4, 1, 2])
+        q.upsert(2, "high", datetime(2023, 1, 1))
+        q.upsert(3, "urgent", datetime(2024, 6, 1), status="completed")
+        q.discard(4)
+        self.assertEqual([i for i, _, _ in q.next(2)], [2, 1])
+        self.assertEqual(len(q), 2)
+
+    def test_auto_priority_only_escalates(self):
+        import triage
+        self.assertEqual(triage.auto_priority("I have thoughts of self-harm"), "urgent")
+        self.assertEqual(triage.auto_priority("High fever since yesterday"), "high")
+        self.assertEqual(triage.auto_priority("Itchy skin"), "normal")
+        self.assertEqual(triage.auto_priority("Itchy skin", "urgent"), "urgent")
+
+
+class LLMWorkerTests(unittest.TestCase):
+    def test_concurrency_limit_and_fail_fast(self):
+        import threading
+        import llm_worker
+        worker = llm_worker.LLMWorker(max_concurrency=2, max_pending=3, enabled=True)
+        release = threading.Event()
+        running = []
+
+        def slow_call(i):
+            running.append(i)
+            release.wait(5)
+            return i * 10
+
+        futures = [worker.submit(slow_call, i) for i in range(3)]
+        time.sleep(0.1)
+        self.assertEqual(len(running), 2)
+        self.assertEqual(llm_worker.LLM_QUEUE_DEPTH.value(), 1)
+        with self.assertRaises(llm_worker.LLMWorkerBusy):
+            worker.submit(slow_call, 99)
+        release.set()
+        self.assertEqual([f.result(5) for f in futures], [0, 10, 20])
+        self.assertEqual(worker.pending(), 0)
+
+    def test_coroutines_multiplexed_and_timeouts(self):
+        import asyncio
+        import llm_worker
+        from concurrent.futures import TimeoutError as FutureTimeout
+        worker = llm_worker.LLMWorker(max_concurrency=50, max_pending=100, enabled=True)
+
+        async def remote_call(i, delay=0.2):
+            await asyncio.sleep(delay)
+            return i
+
+        start = time.perf_counter()
+        futures = [worker.submit(remote_call, i) for i in range(50)]
+        self.assertEqual([f.result(5) for f in futures], list(range(50)))
+        self.assertLess(time.perf_counter() - start, 1.5)
+        with self.assertRaises(FutureTimeout):
+            worker.call(remote_call, 1, 5, timeout=0.05)
+
+
+class RouterTests(unittest.TestCase):
+    def test_classify_intents(self):
+        import router
+        self.assertEqual(router.classify("Hi!"), "greeting")
+        self.assertEqual(router.classify("How do I cancel my consultation booking?"), "platform_faq")
+        self.assertEqual(router.classify("I have a sore throat and mild fever"), "symptom")
+        self.assertEqual(router.classify("Who won the cricket match?"), "off_topic")
+        self.assertEqual(router.classify("Who won the cricket match?", faq_score=0.5), "platform_faq")
+        # Without positive off-topic evidence a query still reaches an LLM
+        for query in ("my mother is having a heart attack", "I twisted my ankle", "my son swallowed a battery",
+                      "what are side effects of metformin", "what should I do about a bee sting"):
+            self.assertEqual(router.classify(query), "general", query)
+        self.assertIn("gemini", router.QueryRouter([]).policy["general"])
+
+    def test_gemini_errors_count_as_failures(self):
+        import router
+        import evaluate_different_modules as edm
+        prev = edm.api_key
+        edm.api_key = None
+        self.addCleanup(setattr, edm, "api_key", prev)
+        with self.assertRaises(RuntimeError):
+            edm.process_query5("what is the fee")
+        qr = router.QueryRouter(
+            [router.Engine("gemini", lambda q, s: edm.process_query5(q, s), cost=3, latency_ms=10),
+             router.Engine("faq", lambda q, s: "faq answer", cost=0, latency_ms=1)],
+            policy={"general": ["gemini"]}, latency_budgets={}, cost_budgets={}, enabled=["gemini", "faq"],
+            fallback="faq")
+        for _ in range(router.ROUTER_FAILURES_BEFORE_COOLDOWN):
+            self.assertEqual(qr.route("bee sting", intent="general")[2], "faq")
+        self.assertEqual([e.name for e in qr.plan("general")], ["faq"])
+
+    def test_cheapest_engine_first_with_cooldown_and_fallback(self):
+        import router
+        calls = []
+
+        def engine(name, cost, reply):
+            return router.Engine(name, lambda q, s: calls.append(name) or reply, cost=cost, latency_ms=10)
+
+        qr = router.QueryRouter(
+            [engine("faq", 0, "faq answer"), engine("local", 1, None), engine("remote", 3, "remote answer"),
+             engine("premium", 9, "premium answer")],
+            policy={"symptom": ["remote", "premium", "local"]}, latency_budgets={}, cost_budgets={"symptom": 5},
+            enabled=["faq", "local", "remote", "premium"], fallback="faq")
+        self.assertEqual([e.name for e in qr.plan("symptom")], ["local", "remote", "faq"])
+        self.assertEqual(qr.route("fever", intent="symptom"), ("remote answer", "symptom", "remote"))
+        for _ in range(router.ROUTER_FAILURES_BEFORE_COOLDOWN - 1):
+            qr.route("fever", intent="symptom")
+        # The failing local engine is cooling down and no longer tried
+        self.assertEqual([e.name for e in qr.plan("symptom")], ["remote", "faq"])
+        self.assertNotIn("premium", calls)
+
+
+class SpellCorrectTests(unittest.TestCase):
+    def test_symmetric_delete_corrections_feed_keyword_fallback(self):
+        import spell_correct
+        corrector = spell_correct.SpellCorrector.from_texts(
+            ["Submit a consultation form. Get a medical certificate. Fever and headache."],
+            targets=["consultation", "certificate", "fever", "headache", "form"])
+        self.assertEqual(corrector.correct_word("consulation"), "consultation")
+        self.assertEqual(corrector.correct_word("certificat"), "certificate")
+        self.assertEqual(corrector.correct_word("feverr"), "fever")
+        self.assertEqual(corrector.correct_word("headahce"), "headache")
+        # Only targets are corrected towards; short words and words too far away are left alone
+        self.assertEqual(corrector.correct_word("medicl"), "medicl")
+        self.assertEqual(corrector.correct("fom ankle"), "fom ankle")
+
+        import evaluate_different_modules as edm
+        # Real words one edit from a keyword ("never"/"fever", "shot"/"hot") are in the word list
+        self.assertEqual(edm._spell_corrector().correct("never heart mother shot lost"), "never heart mother shot lost")
+        self.assertIn("support team", edm.get_simple_faq_response("I never had any allergy, how do I contact support?"))
+        self.assertIn("fever", edm.get_simple_faq_response("I have a feverr"))
+        self.assertIn("medical certificates", edm.get_simple_faq_response("can I get a medical certificat"))
+        self.assertIn("To submit a consultation form", edm.get_simple_faq_response("how to submitt consulation"))
+
+
+class SymptomIndexTests(unittest.TestCase):
+    def test_disease_blocks_parsed_and_ranked(self):
+        import symptom_index
+        index = symptom_index.get_index()
+        self.assertEqual(len(index.diseases), 9)
+        pcos = next(d for d in index.diseases if d["condition"] == "PCOS")
+        self.assertEqual(pcos["specialists"], ["Gynecologist", "Endocrinologist"])
+        self.assertIn("Irregular periods", pcos["symptoms"])
+
+        likely = symptom_index.suggest("I pee a lot, I'm always thirsty and my vision is blurry")
+        self.assertEqual(likely[0]["condition"], "Diabetes")
+        self.assertEqual(likely[0]["specialists"], ["Endocrinologist"])
+        self.assertIn("Frequent urination", likely[0]["matched"])
+        self.assertEqual(symptom_index.suggest("coughing blood, night sweats")[0]["condition"], "Tuberculosis")
+        self.assertEqual(symptom_index.suggest("Fever for 2 days"), [])
+        # Negated symptoms don't count, and one generic word doesn't make a two-word symptom
+        self.assertEqual(symptom_index.suggest(
+            "I do not have fever or night sweats or weight loss, but cough lasting weeks"), [])
+        self.assertEqual(symptom_index.suggest("no cough, no wheezing, just a headache"), [])
+        self.assertEqual(symptom_index.suggest("loss of appetite and fatigue"), [])
+        likely = symptom_index.suggest("I don't have a headache but I feel dizzy and get nosebleeds")
+        self.assertEqual([c["matched"] for c in likely], [["Dizziness", "Nosebleeds"]])
+        self.assertEqual(symptom_index.specialist_phrase(["Endocrinologist"]), "an Endocrinologist")
+
+
+class SparseRetrieverTests(unittest.TestCase):
+    def test_bm25_ranks_faq_chunks_and_feeds_prompt_context(self):
+        import sparse_retriever
+        from context_builder import build_context
+        retriever = sparse_retriever.BM25Retriever([
+            {"text": "What is the refund policy?\nRefunds are issued within 7 days.", "metadata": {"question": "refund"}},
+            {"text": "Can I cancel a consultation?\nYes, before a doctor is assigned.", "metadata": {"question": "cancel"}},
+            {"text": "What should I do for a fever?\nRest and drink fluids.", "metadata": {"question": "fever"}},
+        ], k=2)
+        docs = retriever.invoke("refund after I cancel")
+        self.assertEqual([d.metadata["question"] for d in docs], ["refund", "cancel"])
+        self.assertGreater(docs[0].metadata["score"], docs[1].metadata["score"])
+        self.assertEqual(retriever.invoke("capital of france"), [])
+        context, _ = build_context(docs)
+        self.assertIn("Refunds are issued", context)
+
+        import evaluate_different_modules
+        self.assertIsNotNone(evaluate_different_modules.retriever)
+
+
+class OllamaClientTests(unittest.TestCase):
+    def test_shared_client_keeps_model_and_connection_and_streams(self):
+        import load_test
+        import ollama_client
+        fake = load_test.FakeOllama(load_ms=50, token_ms=0, tokens=20)
+        client = ollama_client.OllamaClient(base_url=fake.start())
+        self.addCleanup(fake.stop)
+        self.addCleanup(client.close)
+
+        result = client.generate("hello there", num_predict=ollama_client.num_predict_for("greeting"))
+        self.assertEqual(result["completion_tokens"], 20)
+        self.assertEqual(result["prompt_tokens"], 2)
+        self.assertGreater(result["load_ms"], 0)
+        pieces = list(client.stream("I have a fever", num_predict=3))
+        self.assertEqual(pieces, ["tok0 ", "tok1 ", "tok2 "])
+        seen = []
+        self.assertEqual(client.generate("fever", num_predict=2, on_token=seen.append)["text"], "".join(seen))
+        # One model load and one pooled connection for every request
+        self.assertEqual((fake.loads, fake.connections), (1, 1))
+        self.assertEqual(fake.requests[0]["keep_alive"], ollama_client.OLLAMA_KEEP_ALIVE)
+        self.assertEqual(fake.requests[0]["options"]["num_predict"], 32)
+        self.assertEqual(ollama_client.num_predict_for("unknown"), ollama_client.OLLAMA_DEFAULT_NUM_PREDICT)
+
+        cold = ollama_client.OllamaClient(base_url=client.base_url, keep_alive="0")
+        cold.generate("a", num_predict=1)
+        cold.generate("a", num_predict=1)
+        cold.close()
+        # keep_alive=0 unloads the model after each request, so the next one reloads it
+        self.assertEqual(fake.loads, 2)
+
+
+class PromptCompilerTests(unittest.TestCase):
+    def test_faq_stripped_from_system_prompt_and_prefix_reused(self):
+        import prompt_compiler
+        from context_builder import count_tokens
+        with open(prompt_compiler.MODELFILE_PATH, encoding='utf-8') as file:
+            full = prompt_compiler.read_system(file.read())
+        compiled = prompt_compiler.system_prompt(has_context=True)
+        self.assertIn("15. Do Docfiy doctors", full)
+        self.assertNotIn("Docfiy doctors", compiled)
+        self.assertNotIn("{context}", compiled)
+        self.assertIn("**Answer**", compiled)
+        self.assertLess(count_tokens(compiled), count_tokens(full) / 4)
+        self.assertIn("15. Do Docfiy doctors", prompt_compiler.system_prompt(has_context=False))
+        self.assertIs(prompt_compiler.system_prompt(has_context=True), compiled)
+
+        import load_test
+        import ollama_client
+        import evaluate_different_modules as edm
+        fake = load_test.FakeOllama(load_ms=0, token_ms=0, prompt_token_ms=0, tokens=5, system=full)
+        self.addCleanup(fake.stop)
+        self.addCleanup(setattr, ollama_client, 'OLLAMA_BASE_URL', ollama_client.OLLAMA_BASE_URL)
+        self.addCleanup(setattr, ollama_client, '_client', None)
+        ollama_client.OLLAMA_BASE_URL, ollama_client._client = fake.start(), None
+        edm.process_query2("how do I get a medical certificate")
+        first = ollama_client.get_client().generate("what is the fee", system=compiled)
+        second = ollama_client.get_client().generate("what is the fee for a certificate", system=compiled)
+        self.assertEqual(fake.requests[0]["system"], compiled)
+        self.assertEqual(fake.requests[0]["options"]["num_predict"], ollama_client.num_predict_for("platform_faq"))
+        # Only the tokens after the shared system prompt and question prefix are evaluated again
+        self.assertEqual(second["prompt_tokens"], 3)
+        self.assertGreater(first["prompt_tokens"], second["prompt_tokens"])
+
+
+class MaterializedAnswersTests(unittest.TestCase):
+    def test_incremental_clustering_and_lookup(self):
+        import tempfile
+        import materialize_answers
+        with tempfile.TemporaryDirectory() as tmp:
+            log, out = os.path.join(tmp, "queries.csv"), os.path.join(tmp, "answers.json")
+            with open(log, "w", encoding="utf-8") as f:
+                f.write("Is paracetamol safe in pregnancy?\nis paracetamol safe in pregnancy\n"
+                        "paracetamol safe during pregnancy?\nwhat is the capital of France\n")
+            asked = []
+            answer = lambda q: asked.append(q) or f"answer to {q}"
+            first = materialize_answers.materialize(log, out, top_n=5, answer_fn=answer)
+            self.assertEqual(first["clusters"], 2)
+            self.assertEqual(asked, ["is paracetamol safe in pregnancy"])
+            with open(log, "a", encoding="utf-8") as f:
+                f.write("Is paracetamol safe in pregnancy\n")
+            second = materialize_answers.materialize(log, out, top_n=5, answer_fn=answer)
+            # Only the new line is read and the existing answer is reused
+            self.assertEqual((second["new_queries"], second["answers_generated"]), (1, 0))
+            lookup = materialize_answers.load_answers(out)
+            self.assertEqual(lookup["paracetamol safe during pregnancy"], "answer to is paracetamol safe in pregnancy")
+            self.assertNotIn("what is the capital of france", lookup)
+            with self.assertRaises(TypeError):
+                lookup["new"] = "x"
+
+    def test_negations_failures_and_refresh(self):
+        import tempfile
+        import materialize_answers
+        with tempfile.TemporaryDirectory() as tmp:
+            log, out = os.path.join(tmp, "queries.csv"), os.path.join(tmp, "answers.json")
+            with open(log, "w", encoding="utf-8") as f:
+                f.write("can I take aspirin with ibuprofen daily\n" * 3
+                        + "can I not take aspirin with ibuprofen daily\n" * 2
+                        + "how do I reset my password\n" * 2)
+            answers = {"can i take aspirin with ibuprofen daily": "v1"}
+
+            def answer(q):
+                if q == "how do i reset my password":
+                    raise RuntimeError("Gemini unavailable")
+                return answers.get(q)
+            first = materialize_answers.materialize(log, out, top_n=5, answer_fn=answer, now=0)
+            # Negated phrasings keep their own cluster; failed or empty answers are not stored
+            self.assertEqual(first["clusters"], 3)
+            self.assertEqual((first["answers_generated"], first["answers_failed"]), (1, 2))
+            self.assertEqual(materialize_answers.load_answers(out),
+                             {"can i take aspirin with ibuprofen daily": "v1"})
+
+            answers["can i take aspirin with ibuprofen daily"] = "v2"
+            fresh = materialize_answers.materialize(log, out, top_n=5, answer_fn=answer, max_age=100, now=50)
+            self.assertEqual(fresh["answers_generated"], 0)
+            stale = materialize_answers.materialize(log, out, top_n=5, answer_fn=answer, max_age=100, now=200)
+            self.assertEqual(stale["answers_generated"], 1)
+            self.assertEqual(materialize_answers.load_answers(out)["can i take aspirin with ibuprofen daily"], "v2")
+            # A failed refresh keeps the previous answer
+            answers.clear()
+            materialize_answers.materialize(log, out, top_n=5, answer_fn=answer, regenerate=True, now=300)
+            self.assertEqual(materialize_answers.load_answers(out)["can i take aspirin with ibuprofen daily"], "v2")
+
+        faq_answer = materialize_answers.default_answerer("faq")
+        self.assertIsNone(faq_answer("capital of France"))
+        self.assertIsNotNone(faq_answer("how do I book a consultation"))
+
+        prev = app_module.MATERIALIZED_ANSWERS
+        app_module.MATERIALIZED_ANSWERS = {"is paracetamol safe in pregnancy": "stored answer"}
+        try:
+            r = app_module.app.test_client().post("/chatbot", json={"message": "Is paracetamol safe in pregnancy?"})
+            self.assertEqual(r.get_json()["reply"], "stored answer")
+            self.assertEqual(r.headers["X-Docify-Route"], "materialized/cache")
+        finally:
+            app_module.MATERIALIZED_ANSWERS = prev
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_identical_calls_share_one_computation(self):
+        import threading
+        import singleflight
+        flight = singleflight.SingleFlight(max_waiters=3, enabled=True)
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", compute, timeout=5)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+        release.set()
+        for t in threads:
+            t.join(5)
+        # One leader and three waiters share a call; the fifth caller is over the waiter bound
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sorted(shared for _, shared in results), [False, False, True, True, True])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_waiter_timeout_and_leader_errors(self):
+        import threading
+        import singleflight
+        flight = singleflight.SingleFlight(enabled=True)
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise ValueError("provider down")
+
+        errors = []
+
+        def lead():
+            try:
+                flight.do("k", failing)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        time.sleep(0.1)
+        with self.assertRaises(singleflight.SingleFlightTimeout):
+            flight.do("k", failing, timeout=0.05)
+        waiter = threading.Thread(target=lead)
+        waiter.start()
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+
+class PasswordHasherTests(unittest.TestCase):
+    def setUp(self):
+        self.hasher = passwords.PasswordHasher(method="pbkdf2:sha256:1000", workers=2)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_hash_and_verify_on_pool(self):
+        stored = self.hasher.hash("s3cret")
+        self.assertTrue(stored.startswith("pbkdf2:sha256:1000$"))
+        futures = [self.hasher.submit_verify(stored, pw) for pw in ("s3cret", "wrong")]
+        self.assertEqual([f.result() for f in futures], [True, False])
+        self.assertFalse(self.hasher.needs_rehash(stored))
+        self.assertTrue(passwords.PasswordHasher(method="pbkdf2:sha256:2000").needs_rehash(stored))
+
+    def test_async_verify(self):
+        import asyncio
+        stored = self.hasher.hash("s3cret")
+        self.assertTrue(asyncio.run(self.hasher.verify_async(stored, "s3cret")))
+
+    def test_saturated_pool_raises_busy(self):
+        hasher = passwords.PasswordHasher(method="pbkdf2:sha256:1000", workers=1, queue_size=0, wait=0)
+        hasher._slots.acquire()
+        try:
+            with self.assertRaises(passwords.PasswordHasherBusy):
+                hasher.submit_hash("x")
+        finally:
+            hasher._slots.release()
+            hasher.shutdown()
+
+
 if __name__ == "__main__":
-    suite = unittest.defaultTestLoader.loadTestsFromTestCase(AppEndpointTests)
+    suite = unittest.defaultTestLoader.loadTestsFromModule(importlib.import_module(__name__))
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
     # Exit with non-zero on failure for CI friendliness
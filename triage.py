@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+# Seconds after which a worker reloads its queue from the database, picking up
+# changes made by other Gunicorn workers
+TRIAGE_RESYNC_SECONDS = float(os.getenv('TRIAGE_RESYNC_SECONDS', '60'))
+
+# Least to most urgent (also app.CONSULTATION_PRIORITIES)
+PRIORITIES = ('low', 'normal', 'high', 'urgent')
+PRIORITY_RANK = {p: len(PRIORITIES) - 1 - i for i, p in enumerate(PRIORITIES)}  # urgent=0 ... low=3
+
+# Symptom phrases that raise a new consultation's priority; checked most severe first
+PRIORITY_KEYWORDS = (
+    ('urgent', ('chest pain', 'self-harm', 'self harm', 'suicid', 'kill myself', 'unconscious',
+                'fainted', 'seizure', 'stroke', 'difficulty breathing', "can't breathe", 'cannot breathe',
+                'shortness of breath', 'severe bleeding', 'heavy bleeding', 'overdose', 'anaphyla')),
+    ('high', ('high fever', 'blood in', 'coughing blood', 'vomiting blood', 'severe pain', 'fracture',
+              'pregnan', 'dehydrat', 'confusion', 'palpitation', 'swelling of face')),
+)
+_KEYWORD_PATTERNS = [(level, re.compile('|'.join(re.escape(k) for k in words)))
+                     for level, words in PRIORITY_KEYWORDS]
+
+
+def auto_priority(symptoms, current='normal'):
+    """Raise `current` to the level implied by keywords in the symptoms text; never lowers it"""
+    text = (symptoms or '').lower()
+    for level, pattern in _KEYWORD_PATTERNS:
+        if PRIORITY_RANK[level] < PRIORITY_RANK.get(current, PRIORITY_RANK['normal']) and pattern.search(text):
+            return level
+    return current if current in PRIORITY_RANK else 'normal'
+
+
+class TriageQueue:
+    """Pending consultations ordered by priority, then age.
+
+    A binary heap with lazy deletion: updates push a fresh entry and the
+    superseded one is skipped when it surfaces, so create/update/delete are
+    O(log n) and the heap is compacted once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._live = {}  # consultation id -> its current heap entry
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self._live)
+
+    def upsert(self, consultation_id, priority, created_at, status='pending'):
+        """Add or reorder a consultation; anything no longer pending leaves the queue"""
+        if status != 'pending':
+            self.discard(consultation_id)
+            return
+        entry = (PRIORITY_RANK.get(priority, PRIORITY_RANK['normal']), created_at or datetime.min,
+                 next(self._counter), consultation_id, priority)
+        with self._lock:
+            self._live[consultation_id] = entry
+            heapq.heappush(self._heap, entry)
+            self._maybe_compact()
+
+    def discard(self, consultation_id):
+        with self._lock:
+            self._live.pop(consultation_id, None)
+            self._maybe_compact()
+
+    def next(self, n=10):
+        """The n most urgent pending consultations as (id, priority, created_at), without removing them"""
+        with self._lock:
+            taken = []
+            while self._heap and len(taken) < n:
+                entry = heapq.heappop(self._heap)
+                if self._live.get(entry[3]) is entry:
+                    taken.append(entry)
+            for entry in taken:
+                heapq.heappush(self._heap, entry)
+        return [(e[3], e[4], None if e[1] == datetime.min else e[1]) for e in taken]
+
+    def rebuild(self, rows):
+        """Replace the contents with (id, priority, created_at) rows, e.g. all pending consultations"""
+        with self._lock:
+            self._live = {}
+            for consultation_id, priority, created_at in rows:
+                self._live[consultation_id] = (PRIORITY_RANK.get(priority, PRIORITY_RANK['normal']),
+                                               created_at or datetime.min, next(self._counter),
+                                               consultation_id, priority)
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
+            self.synced_at = time.monotonic()
+
+    def is_stale(self, max_age=None):
+        max_age = TRIAGE_RESYNC_SECONDS if max_age is None else max_age
+        return self.synced_at is None or time.monotonic() - self.synced_at > max_age
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
@@ -1,5 +1,6 @@
 import os
 import sys
+import hashlib
 import warnings
 
 # Suppress all warnings before any other imports
@@ -22,30 +23,76 @@ except Exception as e:
     class RecursiveCharacterTextSplitter:
         pass
 
+from faq_parser import parse_faq_text
+from embedding_cache import CachedQueryEmbeddings, EMBEDDING_CACHE_PATH
+
+# Bump when the chunking changes so stale indexes on disk get rebuilt
+CHUNKER_VERSION = "faq-entries-v1"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+FAISS_INDEX_PATH = os.getenv('FAISS_INDEX_PATH', 'faiss_index')
+
 
 def preprocess_faq_data(file_path, chunk_size=200, chunk_overlap=50):
-    if not IMPORTS_SUCCESSFUL:
-        raise RuntimeError("Vector creator dependencies not available")
-    
+    """Return (texts, metadatas) with one chunk per FAQ entry or disease block.
+
+    Falls back to the generic character splitter for files that contain no
+    recognisable question/answer structure.
+    """
     with open(file_path, 'r', encoding='utf-8') as file:
         faq_text = file.read()
+    entries = parse_faq_text(faq_text)
+    if entries:
+        return [e["text"] for e in entries], [e["metadata"] for e in entries]
+
+    if not IMPORTS_SUCCESSFUL:
+        raise RuntimeError("Vector creator dependencies not available")
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    return text_splitter.split_text(faq_text)
+    chunks = text_splitter.split_text(faq_text)
+    return chunks, [{"kind": "chunk", "section": 0, "question": None, "number": None} for _ in chunks]
+
+
+def index_signature(faq_file_path):
+    """Chunker version plus a hash of the FAQ file; an index is reusable only if both match"""
+    with open(faq_file_path, 'rb') as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    return f"{CHUNKER_VERSION} {EMBEDDING_MODEL_NAME} {digest}"
+
 
+def index_is_current(index_path, faq_file_path):
+    marker = os.path.join(index_path, "chunker.txt")
+    try:
+        with open(marker, 'r', encoding='utf-8') as file:
+            return file.read().strip() == index_signature(faq_file_path)
+    except OSError:
+        return False
 
-def get_vector_store(faq_file_path, index_path="faiss_index"):
+
+def get_vector_store(faq_file_path, index_path=None, build=True):
+    """Load the FAISS index for faq_file_path, (re)building it when stale.
+
+    With build=False a missing or stale index raises instead of embedding the FAQ,
+    which lets warm_cache.py prove that a prebuilt image does no embedding work.
+    """
     if not IMPORTS_SUCCESSFUL:
         raise RuntimeError("Vector creator dependencies not available")
-    
+    index_path = index_path or FAISS_INDEX_PATH
+    current = index_is_current(index_path, faq_file_path)
+    if not current and not build:
+        raise RuntimeError(f"FAISS index at {index_path} is missing or stale for {faq_file_path}")
+
     embedding_model = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_name=EMBEDDING_MODEL_NAME,
         model_kwargs={"device": "cpu"}
     )
+    # Repeated user queries skip the MiniLM forward pass
+    embedding_model = CachedQueryEmbeddings(embedding_model, persist_path=EMBEDDING_CACHE_PATH)
 
-    if not os.path.exists(index_path):
-        faq_chunks = preprocess_faq_data(faq_file_path)
-        vector_store = FAISS.from_texts(faq_chunks, embedding_model)
+    if not current:
+        faq_chunks, metadatas = preprocess_faq_data(faq_file_path)
+        vector_store = FAISS.from_texts(faq_chunks, embedding_model, metadatas=metadatas)
         vector_store.save_local(index_path)
+        with open(os.path.join(index_path, "chunker.txt"), 'w', encoding='utf-8') as file:
+            file.write(index_signature(faq_file_path))
     else:
         vector_store = FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
 
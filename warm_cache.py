@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pre-download model weights and pre-build the FAISS index so a container starts
+without network access or embedding work.
+
+  python warm_cache.py build   # at image build time: fetch weights, embed faq.txt
+  python warm_cache.py check   # prove a cold start is offline and embeds nothing
+
+Weights go to the Hugging Face cache (HF_HOME); the index goes to FAISS_INDEX_PATH.
+Both can live in the image or on a mounted volume.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+
+WARM_MODELS = [m for m in os.getenv(
+    'WARM_MODELS',
+    'sentence-transformers/all-MiniLM-L6-v2,google/flan-t5-small,google/flan-t5-base').split(',') if m]
+FAQ_PATH = os.getenv('FAQ_PATH', 'faq.txt')
+
+
+def build(args):
+    from huggingface_hub import snapshot_download
+    import vector_creator
+
+    timings = {}
+    for model in args.models:
+        start = time.perf_counter()
+        snapshot_download(model)
+        timings[model] = round(time.perf_counter() - start, 2)
+    start = time.perf_counter()
+    vector_creator.get_vector_store(args.faq, args.index)
+    return {
+        "step": "build",
+        "download_seconds": timings,
+        "index_seconds": round(time.perf_counter() - start, 2),
+        "index_path": args.index or vector_creator.FAISS_INDEX_PATH,
+    }
+
+
+class _NetworkGuard:
+    """Refuses and records every outbound connection while active"""
+
+    def __init__(self):
+        self.attempts = []
+        self._connect = socket.socket.connect
+
+    def __enter__(self):
+        guard = self
+
+        def connect(sock, address):
+            guard.attempts.append(str(address))
+            raise OSError(f"network access during warm start: {address}")
+
+        socket.socket.connect = connect
+        return self
+
+    def __exit__(self, *exc):
+        socket.socket.connect = self._connect
+
+
+def check(args):
+    # Offline mode makes Hugging Face read only the local cache; the guard catches anything else
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    os.environ['TRANSFORMERS_OFFLINE'] = '1'
+    errors = []
+    with _NetworkGuard() as guard:
+        start = time.perf_counter()
+        import vector_creator
+        try:
+            from huggingface_hub import snapshot_download
+            for model in args.models:
+                try:
+                    snapshot_download(model, local_files_only=True)
+                except Exception as e:
+                    errors.append(f"{model}: {e}")
+        except ImportError as e:
+            errors.append(f"Full ML stack not installed: {e}")
+        try:
+            # build=False: a missing or stale index is an error, never a silent re-embed
+            store = vector_creator.get_vector_store(args.faq, args.index, build=False)
+            startup = time.perf_counter() - start
+            start = time.perf_counter()
+            store.similarity_search("How do I get a medical certificate?", k=1)
+            first_query = time.perf_counter() - start
+        except Exception as e:
+            errors.append(str(e))
+            startup = first_query = None
+    result = {
+        "step": "check",
+        "ok": not errors and not guard.attempts,
+        "network_attempts": guard.attempts,
+        "errors": errors,
+        "startup_seconds": round(startup, 3) if startup is not None else None,
+        "first_query_seconds": round(first_query, 3) if first_query is not None else None,
+    }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm or verify the model/index cache")
+    parser.add_argument("step", choices=["build", "check"])
+    parser.add_argument("--faq", default=FAQ_PATH)
+    parser.add_argument("--index", default=None, help="Index directory (default: FAISS_INDEX_PATH)")
+    parser.add_argument("--models", nargs="+", default=WARM_MODELS)
+    args = parser.parse_args(argv)
+    result = build(args) if args.step == "build" else check(args)
+    print(json.dumps(result, indent=2))
+    if result.get("ok") is False:
+        sys.exit(1)
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])